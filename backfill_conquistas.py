@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Script para retomar as concessões retroativas de conquistas do MinasLê
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.minasle_models import db
+from src.services.backfill_conquistas import backfills_pendentes, executar_backfill, reiniciar_backfill
+
+def mostrar(progresso):
+    print(f"  atividade {progresso['atividade_id']}: {progresso['progresso']}% "
+          f"({progresso['concedidas']} conquistas concedidas)", end='\r')
+
+def main():
+    """Retoma as concessões interrompidas; com ids de atividades, refaz a concessão delas"""
+
+    with app.app_context():
+        if len(sys.argv) > 1:
+            atividade_ids = [int(valor) for valor in sys.argv[1:]]
+            for atividade_id in atividade_ids:
+                reiniciar_backfill(atividade_id)
+            db.session.commit()
+        else:
+            atividade_ids = backfills_pendentes()
+
+        if not atividade_ids:
+            print("✓ Nenhuma concessão retroativa pendente")
+            return
+
+        for atividade_id in atividade_ids:
+            progresso = executar_backfill(atividade_id, ao_progredir=mostrar)
+            if progresso is None:
+                print(f"• Atividade {atividade_id} já está sendo processada")
+            elif progresso['status'] == 'concluido':
+                print(f"✓ Atividade {atividade_id}: {progresso['concedidas']} conquistas concedidas")
+            else:
+                print(f"✗ Atividade {atividade_id}: {progresso['erro']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Script para importar livros em lote para o MinasLê a partir de um arquivo CSV ou JSONL
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.services.importacao import FORMATOS, TAMANHO_LOTE_PADRAO, detectar_formato, importar_catalogo
+
+def main():
+    """Importa o arquivo informado na linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('arquivo', help='arquivo CSV (com cabeçalho) ou JSONL')
+    parser.add_argument('--formato', choices=FORMATOS, help='padrão: deduzido pela extensão')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='livros por transação')
+    parser.add_argument('--semelhantes', action='store_true',
+                        help='relata livros parecidos com os já cadastrados (mais lento)')
+    args = parser.parse_args()
+    
+    formato = args.formato or detectar_formato(args.arquivo)
+    
+    with app.app_context():
+        with open(args.arquivo, encoding='utf-8-sig', newline='') as arquivo:
+            relatorio = importar_catalogo(arquivo, formato, args.lote, args.semelhantes)
+        
+        print(f"✓ {relatorio['inseridos']} livros importados de {relatorio['linhas']} linhas")
+        print(f"   • {relatorio['duplicados']} duplicados ignorados")
+        if args.semelhantes:
+            print(f"   • {relatorio['total_semelhantes']} parecidos com livros já cadastrados")
+        print(f"   • {relatorio['total_erros']} linhas com erro")
+        for erro in relatorio['erros']:
+            print(f"     linha {erro['linha']}: {erro['erro']}")
+        
+        if relatorio['total_erros'] > len(relatorio['erros']):
+            print(f"     ... e mais {relatorio['total_erros'] - len(relatorio['erros'])} erros")
+    
+    return 0 if not relatorio['total_erros'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -145,13 +145,15 @@ def populate_database():
                 nome="Leitor Assíduo",
                 descricao="Complete 5 leituras",
                 pontos=200,
-                tipo="leitura_multipla"
+                tipo="leitura_multipla",
+                limite=5
             ),
             AtividadeGamificacao(
                 nome="Explorador Regional",
                 descricao="Leia 3 obras regionais de Minas Gerais",
                 pontos=150,
-                tipo="obra_regional"
+                tipo="obra_regional",
+                limite=3
             ),
             AtividadeGamificacao(
                 nome="Participação Ativa",
@@ -163,13 +165,15 @@ def populate_database():
                 nome="Leitor Dedicado",
                 descricao="Mantenha uma sequência de 7 dias lendo",
                 pontos=100,
-                tipo="sequencia_leitura"
+                tipo="sequencia_leitura",
+                limite=7
             ),
             AtividadeGamificacao(
                 nome="Mestre dos Livros",
                 descricao="Complete 10 leituras",
                 pontos=500,
-                tipo="leitura_multipla"
+                tipo="leitura_multipla",
+                limite=10
             )
         ]
         
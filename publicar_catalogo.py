@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Script para publicar os instantâneos estáticos do catálogo do MinasLê
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.services.publicacao_catalogo import publicar_catalogo
+
+def main():
+    """Gera os arquivos JSON do catálogo na pasta static"""
+    
+    with app.app_context():
+        manifesto = publicar_catalogo(app.static_folder)
+        print(f"✓ Catálogo publicado na versão {manifesto['versao']}")
+        print(f"   • {manifesto['livros']['arquivo']} ({manifesto['livros']['total']} livros)")
+        print(f"   • {manifesto['regionais']['arquivo']} ({manifesto['regionais']['total']} obras regionais)")
+
+if __name__ == "__main__":
+    main()
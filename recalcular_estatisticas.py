@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Script para recalcular as estatísticas do MinasLê mantidas a cada leitura:
+
+- contadores de popularidade dos livros
+- resumo de leituras dos usuários
+- pontos por período
+- contadores das conquistas
+- totais da rede por escola, cidade e estado
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.services.conquistas import reparar_contadores
+from src.services.estatisticas_livros import reparar_estatisticas_livros
+from src.services.estatisticas_usuarios import reparar_estatisticas_usuarios
+from src.services.pontuacao_periodo import reparar_pontuacoes_periodo
+from src.services.resumos_rede import reparar_resumos_rede
+
+def main():
+    """Recalcula as estatísticas mantidas incrementalmente a partir das leituras"""
+    
+    with app.app_context():
+        total = reparar_estatisticas_livros()
+        print(f"✓ Contadores recalculados para {total} livros")
+        total = reparar_estatisticas_usuarios()
+        print(f"✓ Estatísticas de leitura recalculadas para {total} usuários")
+        total = reparar_pontuacoes_periodo()
+        print(f"✓ {total} períodos de pontuação recalculados")
+        total = reparar_contadores()
+        print(f"✓ Contadores de conquistas recalculados para {total} usuários")
+        total = reparar_resumos_rede()
+        print(f"✓ Totais da rede recalculados para {total} escolas")
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,6 @@ from flask_cors import CORS
 from src.models.minasle_models import db
 from src.routes.auth import auth_bp
 from src.routes.livros import livros_bp
-from src.routes.biblioteca import biblioteca_bp
 from src.routes.admin import admin_bp
 from src.routes.leituras import leituras_bp
 from src.routes.gamificacao import gamificacao_bp
@@ -20,13 +19,10 @@ app.config['SECRET_KEY'] = 'minasle_secret_key_2024'
 CORS(app, supports_credentials=True)
 
 # Registrar blueprints
-app.register_blueprint(auth_bp, url_prefix='/api')
-ap    app.register_blueprint(auth_bp)
-    app.register_blueprint(livros_bp)
-    app.register_blueprint(biblioteca_bp)
-    app.register_blueprint(admin_bp)
-    app.register_blueprint(leituras_bp)
-    app.register_blueprint(gamificacao_bp)bp, url_prefix='/api')
+for blueprint in (auth_bp, livros_bp, leituras_bp, gamificacao_bp):
+    app.register_blueprint(blueprint, url_prefix='/api')
+# A interface de administração chama /admin/... direto da raiz
+app.register_blueprint(admin_bp)
 
 # Configuração do banco de dados
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
@@ -1,14 +1,21 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, select
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Data e hora atuais em UTC no mesmo texto que o SQLAlchemy grava no SQLite
+# (microssegundos inclusive), para que valores do banco e do Python se
+# comparem e ordenem como datas
+AGORA = db.text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))")
+
 class Escola(db.Model):
     __tablename__ = 'escolas'
     
     id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(200), nullable=False)
+    nome = db.Column(db.String(200), nullable=False, index=True)
     cidade = db.Column(db.String(100), nullable=False)
     estado = db.Column(db.String(50), nullable=False, default='Minas Gerais')
     
@@ -25,14 +32,18 @@ class Escola(db.Model):
 
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
+    __table_args__ = (
+        db.Index('ix_usuarios_escola_tipo', 'escola_id', 'tipo_usuario'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(200), nullable=False)
+    nome = db.Column(db.String(200), nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     senha_hash = db.Column(db.String(255), nullable=False)
     tipo_usuario = db.Column(db.Enum('aluno', 'pedagogo', name='tipo_usuario_enum'), nullable=False)
     escola_id = db.Column(db.Integer, db.ForeignKey('escolas.id'), nullable=False)
-    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                             server_default=AGORA, index=True)
     
     # Relacionamentos
     leituras = db.relationship('Leitura', backref='usuario', lazy=True)
@@ -64,14 +75,15 @@ class Livro(db.Model):
     __tablename__ = 'livros'
     
     id = db.Column(db.Integer, primary_key=True)
-    titulo = db.Column(db.String(300), nullable=False)
+    titulo = db.Column(db.String(300), nullable=False, index=True)
     autor = db.Column(db.String(200), nullable=False)
     genero = db.Column(db.String(100))
     url_conteudo = db.Column(db.String(500))  # URL para PDF/ePub
     capa_url = db.Column(db.String(500))     # URL para imagem da capa
-    obra_regional = db.Column(db.Boolean, default=False)
+    obra_regional = db.Column(db.Boolean, default=False, index=True)
     descricao = db.Column(db.Text)
-    data_adicao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_adicao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                            server_default=AGORA, index=True)
     
     # Relacionamentos
     leituras = db.relationship('Leitura', backref='livro', lazy=True)
@@ -91,12 +103,19 @@ class Livro(db.Model):
 
 class Leitura(db.Model):
     __tablename__ = 'leituras'
+    __table_args__ = (
+        db.Index('ix_leituras_usuario_livro', 'usuario_id', 'livro_id'),
+        db.Index('ix_leituras_usuario_data_inicio', 'usuario_id', 'data_inicio'),
+        # A listagem do aluno pagina pelo id; os dois acima obrigariam a ordenar
+        db.Index('ix_leituras_usuario_id_leitura', 'usuario_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
-    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False, index=True)
     progresso = db.Column(db.Integer, default=0)  # Porcentagem de 0 a 100
-    data_inicio = db.Column(db.DateTime, default=datetime.utcnow)
+    data_inicio = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                            server_default=AGORA)
     data_conclusao = db.Column(db.DateTime)
     pontuacao = db.Column(db.Integer, default=0)
     
@@ -136,7 +155,7 @@ class MembroClube(db.Model):
     __tablename__ = 'membros_clube'
     
     clube_id = db.Column(db.Integer, db.ForeignKey('clubes_leitura.id'), primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True, index=True)
     data_entrada = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -153,7 +172,9 @@ class AtividadeGamificacao(db.Model):
     nome = db.Column(db.String(200), nullable=False)
     descricao = db.Column(db.Text)
     pontos = db.Column(db.Integer, default=0)
-    tipo = db.Column(db.String(50))  # 'leitura_completa', 'tempo_leitura', 'participacao_clube', etc.
+    tipo = db.Column(db.String(50), index=True)  # 'leitura_completa', 'tempo_leitura', 'participacao_clube', etc.
+    # Valor que o contador do tipo precisa alcançar: leituras, dias seguidos, minutos...
+    limite = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relacionamentos
     conquistas = db.relationship('ConquistaUsuario', backref='atividade', lazy=True)
@@ -164,7 +185,8 @@ class AtividadeGamificacao(db.Model):
             'nome': self.nome,
             'descricao': self.descricao,
             'pontos': self.pontos,
-            'tipo': self.tipo
+            'tipo': self.tipo,
+            'limite': self.limite
         }
 
 class ConquistaUsuario(db.Model):
@@ -183,6 +205,9 @@ class ConquistaUsuario(db.Model):
 
 class AcompanhamentoPedagogico(db.Model):
     __tablename__ = 'acompanhamento_pedagogico'
+    __table_args__ = (
+        db.Index('ix_acompanhamento_aluno_data', 'aluno_id', 'data'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     aluno_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -201,3 +226,280 @@ class AcompanhamentoPedagogico(db.Model):
             'nota_engajamento': self.nota_engajamento
         }
 
+
+class LivroNormalizado(db.Model):
+    __tablename__ = 'livros_normalizados'
+    __table_args__ = (
+        db.Index('ix_livros_normalizados_titulo_autor', 'titulo', 'autor'),
+    )
+    
+    # Representação sem acentos e em minúsculas de título e autor, usada
+    # pelas buscas tolerantes a acentos e erros de digitação
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), primary_key=True)
+    titulo = db.Column(db.String(300), nullable=False)
+    autor = db.Column(db.String(200), nullable=False)
+    total_trigramas = db.Column(db.Integer, nullable=False, default=0)
+
+class TrigramaLivro(db.Model):
+    __tablename__ = 'livros_trigramas'
+    __table_args__ = (
+        db.Index('ix_livros_trigramas_livro_id', 'livro_id'),
+        {'sqlite_with_rowid': False},
+    )
+    
+    # Listas invertidas: a chave primária agrupa os livros de cada trigrama
+    trigrama = db.Column(db.String(3), primary_key=True)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), primary_key=True)
+
+class FrequenciaTrigrama(db.Model):
+    __tablename__ = 'trigramas_frequencia'
+    
+    # Quantos livros contêm cada trigrama; a busca aproximada começa pelos
+    # trigramas mais raros para não percorrer listas invertidas enormes
+    trigrama = db.Column(db.String(3), primary_key=True)
+    livros = db.Column(db.Integer, nullable=False, default=0)
+
+class EstatisticaLivro(db.Model):
+    __tablename__ = 'livros_estatisticas'
+    __table_args__ = (
+        db.Index('ix_livros_estatisticas_populares', 'leitores', 'conclusoes', 'livro_id'),
+    )
+    
+    # Contadores mantidos a cada leitura iniciada ou progresso atualizado,
+    # para ordenar o catálogo por popularidade sem agregar a tabela leituras
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), primary_key=True)
+    leitores = db.Column(db.Integer, nullable=False, default=0)
+    conclusoes = db.Column(db.Integer, nullable=False, default=0)
+    soma_progresso = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def progresso_medio(self):
+        return round(self.soma_progresso / self.leitores, 2) if self.leitores else 0
+    
+    def to_dict(self):
+        return {
+            'leitores': self.leitores,
+            'conclusoes': self.conclusoes,
+            'progresso_medio': self.progresso_medio
+        }
+
+class SincronizacaoLeitura(db.Model):
+    __tablename__ = 'leituras_sincronizacao'
+    
+    # Momento (no relógio do cliente, em UTC) da última atualização aplicada
+    # a cada leitura; a sincronização descarta operações mais antigas que ele
+    leitura_id = db.Column(db.Integer, db.ForeignKey('leituras.id'), primary_key=True)
+    atualizado_em = db.Column(db.DateTime, nullable=False)
+
+class EventoLeitura(db.Model):
+    __tablename__ = 'leituras_eventos'
+    __table_args__ = (
+        db.Index('ix_leituras_eventos_usuario_momento', 'usuario_id', 'momento'),
+    )
+    
+    # Registro só de inclusão: cada sessão de leitura ou atualização de
+    # progresso vira uma linha, nunca alterada depois
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False)
+    momento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    paginas = db.Column(db.Integer, nullable=False, default=0)
+    segundos = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'usuario_id': self.usuario_id,
+            'livro_id': self.livro_id,
+            'momento': self.momento.isoformat() if self.momento else None,
+            'paginas': self.paginas,
+            'segundos': self.segundos
+        }
+
+class AtividadeDiaria(db.Model):
+    __tablename__ = 'atividade_diaria'
+    
+    # Totais de leitura por usuário e dia, atualizados junto com cada lote de
+    # eventos; sequências e calendários são lidos daqui, não dos eventos
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    paginas = db.Column(db.Integer, nullable=False, default=0)
+    segundos = db.Column(db.Integer, nullable=False, default=0)
+    eventos = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'dia': self.dia.isoformat() if self.dia else None,
+            'paginas': self.paginas,
+            'segundos': self.segundos,
+            'eventos': self.eventos
+        }
+
+class EstatisticaUsuario(db.Model):
+    __tablename__ = 'usuarios_estatisticas'
+    
+    # Resumo das leituras de cada usuário, atualizado na mesma transação que
+    # as leituras; o painel de estatísticas lê só esta linha
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    total_leituras = db.Column(db.Integer, nullable=False, default=0)
+    leituras_completas = db.Column(db.Integer, nullable=False, default=0)
+    pontuacao_total = db.Column(db.Integer, nullable=False, default=0)
+    soma_progresso = db.Column(db.Integer, nullable=False, default=0)
+    livros_regionais_completos = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        total = self.total_leituras
+        return {
+            'total_leituras': total,
+            'leituras_completas': self.leituras_completas,
+            'pontuacao_total': self.pontuacao_total,
+            'progresso_medio': round(self.soma_progresso / total, 2) if total > 0 else 0.0,
+            'livros_regionais_completos': self.livros_regionais_completos,
+            'taxa_conclusao': round((self.leituras_completas / total * 100), 2) if total > 0 else 0
+        }
+
+class ResumoRede(db.Model):
+    __tablename__ = 'resumos_rede'
+
+    # Totais dos alunos por estado, cidade e escola, atualizados na mesma
+    # transação que as leituras. Nos níveis de cima, cidade fica '' e
+    # escola_id 0, de modo que os filhos de cada nó são um prefixo da chave
+    nivel = db.Column(db.Enum('estado', 'cidade', 'escola', name='nivel_rede_enum'), primary_key=True)
+    estado = db.Column(db.String(50), primary_key=True)
+    cidade = db.Column(db.String(100), primary_key=True, default='')
+    escola_id = db.Column(db.Integer, primary_key=True, default=0)
+    total_escolas = db.Column(db.Integer, nullable=False, default=0)
+    total_alunos = db.Column(db.Integer, nullable=False, default=0)
+    alunos_ativos = db.Column(db.Integer, nullable=False, default=0)
+    total_leituras = db.Column(db.Integer, nullable=False, default=0)
+    leituras_completas = db.Column(db.Integer, nullable=False, default=0)
+    livros_regionais_completos = db.Column(db.Integer, nullable=False, default=0)
+    pontuacao_total = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        total = self.total_alunos
+        return {
+            'nivel': self.nivel,
+            'estado': self.estado,
+            'cidade': self.cidade or None,
+            'escola_id': self.escola_id or None,
+            'total_escolas': self.total_escolas,
+            'total_alunos': total,
+            'alunos_ativos': self.alunos_ativos,
+            'taxa_engajamento': round((self.alunos_ativos / total * 100), 2) if total > 0 else 0,
+            'total_leituras': self.total_leituras,
+            'leituras_completas': self.leituras_completas,
+            'livros_regionais_completos': self.livros_regionais_completos,
+            'pontuacao_total': self.pontuacao_total
+        }
+
+class ContadoresConquista(db.Model):
+    __tablename__ = 'usuarios_contadores'
+
+    # Contadores das regras de conquista que não estão no resumo de leituras,
+    # atualizados pelos mesmos eventos que disparam as regras
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    clubes = db.Column(db.Integer, nullable=False, default=0)
+    segundos_leitura = db.Column(db.Integer, nullable=False, default=0)
+    sequencia_atual = db.Column(db.Integer, nullable=False, default=0)  # Dias seguidos terminando em ultimo_dia
+    maior_sequencia = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_dia = db.Column(db.Date)  # Último dia com atividade de leitura
+
+class BackfillConquista(db.Model):
+    __tablename__ = 'conquistas_backfill'
+
+    # Concessão retroativa de uma atividade aos usuários que já cumprem a
+    # regra; ultimo_usuario_id é o cursor de onde o trabalho é retomado
+    atividade_id = db.Column(db.Integer, db.ForeignKey('atividades_gamificacao.id'), primary_key=True)
+    status = db.Column(db.Enum('pendente', 'executando', 'concluido', 'falhou', name='status_backfill_enum'),
+                       nullable=False, default='pendente')
+    ultimo_usuario_id = db.Column(db.Integer, nullable=False, default=0)
+    maior_usuario_id = db.Column(db.Integer)
+    concedidas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.Text)
+    iniciado_em = db.Column(db.DateTime)
+    atualizado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+
+    def to_dict(self):
+        if self.maior_usuario_id:
+            progresso = min(self.ultimo_usuario_id / self.maior_usuario_id, 1) * 100
+        else:
+            progresso = 100 if self.status == 'concluido' else 0
+        return {
+            'atividade_id': self.atividade_id,
+            'status': self.status,
+            'ultimo_usuario_id': self.ultimo_usuario_id,
+            'maior_usuario_id': self.maior_usuario_id,
+            'progresso': round(progresso, 2),
+            'concedidas': self.concedidas,
+            'erro': self.erro,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None
+        }
+
+class PontuacaoPeriodo(db.Model):
+    __tablename__ = 'pontuacoes_periodo'
+    __table_args__ = (
+        # Ranking de um período: percorre só o balde pedido, já na ordem de pontos
+        db.Index('ix_pontuacoes_periodo_ranking', 'granularidade', 'inicio', db.desc('pontos'), 'usuario_id'),
+    )
+
+    # Pontos de cada usuário por dia, semana e mês, somados no momento em que
+    # são ganhos; baldes de dia e semana antigos são descartados, o mês fica
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    granularidade = db.Column(db.Enum('dia', 'semana', 'mes', name='granularidade_enum'), primary_key=True)
+    inicio = db.Column(db.Date, primary_key=True)  # Primeiro dia do período
+    pontos = db.Column(db.Integer, nullable=False, default=0)
+
+# Índices de uma coluna que já é o início de um índice composto da mesma
+# tabela: só custavam escrita e espaço
+_INDICES_REDUNDANTES = ('ix_leituras_usuario_id', 'ix_acompanhamento_pedagogico_aluno_id')
+
+def _criar_indices_ausentes(target, connection, **kw):
+    """Cria em tabelas já existentes os índices declarados depois delas
+
+    O create_all só cria índices junto com a tabela; bancos antigos
+    ganhariam as tabelas novas, mas nenhum índice novo das antigas. Os
+    índices redundantes criados por versões anteriores são removidos.
+    """
+    for tabela in target.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(connection, checkfirst=True)
+    for nome in _INDICES_REDUNDANTES:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS {nome}')
+
+event.listen(db.metadata, 'after_create', _criar_indices_ausentes)
+
+def _adicionar_limite_atividades(target, connection, **kw):
+    """Cria e preenche atividades_gamificacao.limite em bancos anteriores à coluna
+
+    Antes dela, o limite de cada regra era o primeiro número do nome ou da
+    descrição ("Complete 5 leituras"), ou 1; é lido assim uma única vez.
+    """
+    colunas = {coluna['name'] for coluna in db.inspect(connection).get_columns('atividades_gamificacao')}
+    if 'limite' in colunas:
+        return
+    connection.exec_driver_sql('ALTER TABLE atividades_gamificacao ADD COLUMN limite INTEGER NOT NULL DEFAULT 1')
+    tabela = AtividadeGamificacao.__table__
+    for atividade_id, nome, descricao in connection.execute(select(tabela.c.id, tabela.c.nome, tabela.c.descricao)):
+        numero = re.search(r'\d+', f'{nome or ""} {descricao or ""}')
+        if numero:
+            connection.execute(tabela.update().where(tabela.c.id == atividade_id).values(limite=int(numero.group())))
+
+event.listen(db.metadata, 'after_create', _adicionar_limite_atividades)
+
+# Colunas de ordenação das listagens paginadas: o cursor compara tuplas, e
+# uma linha com NULL nunca seria maior nem menor que ele
+_DATAS_ORDENACAO = ((Usuario, 'data_criacao'), (Livro, 'data_adicao'), (Leitura, 'data_inicio'))
+
+def _preencher_datas_ausentes(target, connection, **kw):
+    """Preenche as datas de ordenação deixadas nulas em bancos criados antes do NOT NULL"""
+    for modelo, campo in _DATAS_ORDENACAO:
+        coluna = modelo.__table__.c[campo]
+        connection.execute(
+            modelo.__table__.update().where(coluna.is_(None)).values({campo: AGORA})
+        )
+
+event.listen(db.metadata, 'after_create', _preencher_datas_ausentes)
@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify, session, render_template_string
-from src.models.minasle_models import db, Biblioteca, Usuario, Escola
+from src.models.minasle_models import db, Livro, Usuario, Escola
+from src.services.carregamento import carregar_por_id
+from src.services.paginacao import ParametroInvalido, ler_parametros, paginar, resposta_paginada
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
+ORDENACOES_USUARIOS = {
+    'id': [Usuario.id],
+    'nome': [Usuario.nome, Usuario.id],
+    'data_criacao': [Usuario.data_criacao, Usuario.id]
+}
+
+ORDENACOES_ESCOLAS = {
+    'id': [Escola.id],
+    'nome': [Escola.nome, Escola.id]
+}
+
 # Template HTML para a interface de administração
 ADMIN_TEMPLATE = """
 <!DOCTYPE html>
@@ -417,7 +430,7 @@ ADMIN_TEMPLATE = """
         // Gerenciamento de Livros
         async function carregarLivros() {
             try {
-                const response = await fetch(`${API_BASE}/api/biblioteca`);
+                const response = await fetch(`${API_BASE}/admin/livros`);
                 const data = await response.json();
                 
                 if (data.sucesso) {
@@ -703,7 +716,7 @@ def admin_dashboard():
 def admin_get_livros():
     """Listar todos os livros para administração"""
     try:
-        livros = Biblioteca.query.all()
+        livros = Livro.query.all()
         return jsonify({
             'sucesso': True,
             'livros': [livro.to_dict() for livro in livros]
@@ -721,7 +734,7 @@ def admin_add_livro():
         if not data.get('titulo') or not data.get('autor'):
             return jsonify({'erro': 'Título e autor são obrigatórios'}), 400
         
-        novo_livro = Biblioteca(
+        novo_livro = Livro(
             titulo=data.get('titulo'),
             autor=data.get('autor'),
             genero=data.get('genero'),
@@ -749,7 +762,7 @@ def admin_add_livro():
 def admin_delete_livro(livro_id):
     """Remover livro"""
     try:
-        livro = Biblioteca.query.get(livro_id)
+        livro = Livro.query.get(livro_id)
         if not livro:
             return jsonify({'erro': 'Livro não encontrado'}), 404
         
@@ -770,24 +783,27 @@ def admin_delete_livro(livro_id):
 def admin_get_usuarios():
     """Listar todos os usuários para administração"""
     try:
-        usuarios = Usuario.query.all()
+        paginacao = ler_parametros(request.args, ORDENACOES_USUARIOS, 'id')
+        usuarios, proximo_cursor, total = paginar(Usuario.query, **paginacao)
         usuarios_data = []
         
+        # Escolas de todos os usuários da página em uma única consulta
+        escolas = carregar_por_id(Escola, (usuario.escola_id for usuario in usuarios))
         for usuario in usuarios:
             usuario_dict = usuario.to_dict()
             # Adicionar informações da escola
-            if usuario.escola:
+            escola = escolas.get(usuario.escola_id)
+            if escola:
                 usuario_dict['escola'] = {
-                    'id': usuario.escola.id,
-                    'nome': usuario.escola.nome,
-                    'cidade': usuario.escola.cidade
+                    'id': escola.id,
+                    'nome': escola.nome,
+                    'cidade': escola.cidade
                 }
             usuarios_data.append(usuario_dict)
         
-        return jsonify({
-            'sucesso': True,
-            'usuarios': usuarios_data
-        }), 200
+        return jsonify(resposta_paginada('usuarios', usuarios_data, proximo_cursor, total)), 200
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -859,11 +875,13 @@ def admin_delete_usuario(usuario_id):
 def admin_get_escolas():
     """Listar todas as escolas"""
     try:
-        escolas = Escola.query.all()
-        return jsonify({
-            'sucesso': True,
-            'escolas': [escola.to_dict() for escola in escolas]
-        }), 200
+        paginacao = ler_parametros(request.args, ORDENACOES_ESCOLAS, 'id')
+        escolas, proximo_cursor, total = paginar(Escola.query, **paginacao)
+        return jsonify(resposta_paginada(
+            'escolas', [escola.to_dict() for escola in escolas], proximo_cursor, total
+        )), 200
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
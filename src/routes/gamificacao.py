@@ -1,38 +1,115 @@
-from flask import Blueprint, request, jsonify, session
-from sqlalchemy import desc, func
-from src.models.minasle_models import db, Usuario, Leitura, AtividadeGamificacao, ConquistaUsuario
+from flask import Blueprint, current_app, request, jsonify, session
+from src.models.minasle_models import (
+    db, Usuario, AtividadeGamificacao, BackfillConquista, ClubeLeitura, ConquistaUsuario, Escola,
+    EstatisticaUsuario, ResumoRede
+)
+from src.services.backfill_conquistas import conceder_em_lote, iniciar_backfill, reiniciar_backfill
+from src.services.carregamento import TAMANHO_BLOCO_IDS, carregar_conquistas, carregar_por_id
+from src.services.paginacao import ParametroInvalido, ler_parametros, paginar, resposta_paginada
+from src.services.pontuacao_periodo import fim_periodo, ler_periodo, ranking_periodo
+from src.services.ranking import ler_escopo, ranking_pontuacao
+from src.services.resumos_rede import estatisticas_escolas, nos_rede
 
 gamificacao_bp = Blueprint('gamificacao', __name__)
 
+LIMITE_RANKING = 200
+MAXIMO_USUARIOS_LOTE = 10000
+MAXIMO_VIZINHOS = 25
+
+ORDENACOES_ALUNOS_REDE = {
+    'id': [Usuario.id]
+}
+
+def _itens_ranking(itens):
+    """Converte (posicao, usuario_id, pontos) no formato da resposta, com o nome de cada aluno"""
+    usuarios = carregar_por_id(Usuario, (usuario_id for _, usuario_id, _ in itens))
+    return [
+        {
+            'posicao': posicao,
+            'usuario_id': usuario_id,
+            'nome': usuarios[usuario_id].nome if usuario_id in usuarios else None,
+            'pontuacao': int(pontos)
+        }
+        for posicao, usuario_id, pontos in itens
+    ]
+
 @gamificacao_bp.route('/gamificacao/ranking', methods=['GET'])
 def get_ranking():
-    """Endpoint para obter o ranking de pontuação dos usuários"""
+    """Endpoint para obter o ranking de pontuação dos usuários
+
+    Geral por padrão; ?escopo=escola|cidade|clube&id= restringe aos alunos
+    da escola, da cidade ou do clube. ?periodo=dia|semana|mes|YYYY-MM conta
+    só os pontos ganhos no período.
+    """
+    try:
+        limite = min(max(request.args.get('limit', 50, type=int), 1), LIMITE_RANKING)
+        escopo, chave = ler_escopo(request.args)
+        periodo = ler_periodo(request.args)
+        
+        if periodo:
+            granularidade, inicio = periodo
+            itens = ranking_periodo(granularidade, inicio, limite, escopo, chave)
+            periodo = {
+                'granularidade': granularidade,
+                'inicio': inicio.isoformat(),
+                'fim': fim_periodo(granularidade, inicio).isoformat()
+            }
+        else:
+            itens = ranking_pontuacao.topo(limite, escopo, chave)
+        
+        return jsonify({
+            'sucesso': True,
+            'escopo': escopo or 'geral',
+            'id': chave,
+            'periodo': periodo,
+            'ranking': _itens_ranking(itens)
+        }), 200
+        
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@gamificacao_bp.route('/gamificacao/ranking/posicao', methods=['GET'])
+def get_posicao_ranking():
+    """Endpoint para obter a posição de um aluno no ranking e os colegas ao redor
+
+    Por padrão, a do usuário logado; pedagogos podem consultar qualquer aluno
+    com ?usuario_id=. ?vizinhos= define quantos colocados acima e abaixo vêm junto;
+    ?escopo=&id= funcionam como em /gamificacao/ranking.
+    """
     try:
-        # Calcular pontuação total por usuário
-        ranking = db.session.query(
-            Usuario.id,
-            Usuario.nome,
-            func.sum(Leitura.pontuacao).label('pontuacao_total')
-        ).join(Leitura, Usuario.id == Leitura.usuario_id)\
-         .filter(Usuario.tipo_usuario == 'aluno')\
-         .group_by(Usuario.id, Usuario.nome)\
-         .order_by(desc('pontuacao_total'))\
-         .limit(50).all()
-        
-        ranking_list = []
-        for posicao, (user_id, nome, pontuacao) in enumerate(ranking, 1):
-            ranking_list.append({
-                'posicao': posicao,
-                'usuario_id': user_id,
-                'nome': nome,
-                'pontuacao': int(pontuacao or 0)
-            })
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id:
+            return jsonify({'erro': 'Usuário não autenticado'}), 401
+        
+        usuario_id = request.args.get('usuario_id', user_id, type=int)
+        if user_type != 'pedagogo' and usuario_id != user_id:
+            return jsonify({'erro': 'Acesso negado'}), 403
+        
+        vizinhos = min(max(request.args.get('vizinhos', 2, type=int), 0), MAXIMO_VIZINHOS)
+        escopo, chave = ler_escopo(request.args)
         
+        # O ranking é montado uma única vez e depois mantido pelos commits de leituras
+        proprio, ao_redor, participantes = ranking_pontuacao.ao_redor(usuario_id, vizinhos, escopo, chave)
+        if proprio is None:
+            return jsonify({'erro': 'Usuário ainda não está no ranking'}), 404
+        
+        posicao, _, pontos = proprio
         return jsonify({
             'sucesso': True,
-            'ranking': ranking_list
+            'escopo': escopo or 'geral',
+            'id': chave,
+            'posicao': posicao,
+            'pontuacao': int(pontos),
+            'total_participantes': participantes,
+            'vizinhos': _itens_ranking(ao_redor)
         }), 200
         
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -65,16 +142,7 @@ def get_conquistas_usuario(usuario_id):
             return jsonify({'erro': 'Acesso negado'}), 403
         
         # Obter conquistas do usuário com detalhes da atividade
-        conquistas = db.session.query(ConquistaUsuario, AtividadeGamificacao)\
-                              .join(AtividadeGamificacao)\
-                              .filter(ConquistaUsuario.usuario_id == usuario_id)\
-                              .all()
-        
-        conquistas_list = []
-        for conquista, atividade in conquistas:
-            conquista_dict = conquista.to_dict()
-            conquista_dict['atividade'] = atividade.to_dict()
-            conquistas_list.append(conquista_dict)
+        conquistas_list = carregar_conquistas([usuario_id]).get(usuario_id, [])
         
         return jsonify({
             'sucesso': True,
@@ -87,7 +155,11 @@ def get_conquistas_usuario(usuario_id):
 
 @gamificacao_bp.route('/gamificacao/atividades', methods=['POST'])
 def criar_atividade():
-    """Endpoint para criar nova atividade de gamificação (apenas pedagogos)"""
+    """Endpoint para criar nova atividade de gamificação (apenas pedagogos)
+
+    `limite` é o valor que o contador do tipo precisa alcançar (leituras
+    completas, dias seguidos, minutos de leitura...); o padrão é 1.
+    """
     try:
         user_id = session.get('user_id')
         user_type = session.get('user_type')
@@ -100,23 +172,35 @@ def criar_atividade():
         descricao = data.get('descricao')
         pontos = data.get('pontos', 0)
         tipo = data.get('tipo')
+        limite = data.get('limite', 1)
         
         if not all([nome, descricao, tipo]):
             return jsonify({'erro': 'Nome, descrição e tipo são obrigatórios'}), 400
         
+        if not isinstance(limite, int) or isinstance(limite, bool) or limite < 1:
+            return jsonify({'erro': 'limite deve ser um número inteiro positivo'}), 400
+        
         nova_atividade = AtividadeGamificacao(
             nome=nome,
             descricao=descricao,
             pontos=pontos,
-            tipo=tipo
+            tipo=tipo,
+            limite=limite
         )
         
         db.session.add(nova_atividade)
+        db.session.flush()
+        
+        # Quem já cumpre a regra da atividade recebe a conquista em segundo plano
+        progresso = BackfillConquista(atividade_id=nova_atividade.id, status='pendente', ultimo_usuario_id=0, concedidas=0)
+        db.session.add(progresso)
         db.session.commit()
+        iniciar_backfill(current_app._get_current_object(), nova_atividade.id)
         
         return jsonify({
             'sucesso': True,
             'atividade': nova_atividade.to_dict(),
+            'backfill': progresso.to_dict(),
             'mensagem': 'Atividade criada com sucesso'
         }), 201
         
@@ -124,6 +208,61 @@ def criar_atividade():
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+@gamificacao_bp.route('/gamificacao/atividades/<int:atividade_id>/backfill', methods=['GET'])
+def get_backfill_atividade(atividade_id):
+    """Endpoint para acompanhar a concessão retroativa de uma atividade (apenas pedagogos)"""
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado'}), 403
+        
+        progresso = db.session.get(BackfillConquista, atividade_id)
+        if not progresso:
+            return jsonify({'erro': 'Nenhuma concessão retroativa para esta atividade'}), 404
+        
+        return jsonify({
+            'sucesso': True,
+            'backfill': progresso.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@gamificacao_bp.route('/gamificacao/atividades/<int:atividade_id>/backfill', methods=['POST'])
+def retomar_backfill_atividade(atividade_id):
+    """Endpoint para retomar uma concessão retroativa interrompida (apenas pedagogos)
+
+    Uma concessão já concluída recomeça do primeiro usuário, para aplicar a
+    regra de novo depois de a atividade mudar.
+    """
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado'}), 403
+        
+        if not db.session.get(AtividadeGamificacao, atividade_id):
+            return jsonify({'erro': 'Atividade não encontrada'}), 404
+        
+        progresso = db.session.get(BackfillConquista, atividade_id)
+        if progresso is None or progresso.status == 'concluido':
+            progresso = reiniciar_backfill(atividade_id)
+            db.session.commit()
+        iniciar_backfill(current_app._get_current_object(), atividade_id)
+        
+        db.session.refresh(progresso)
+        return jsonify({
+            'sucesso': True,
+            'backfill': progresso.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
 @gamificacao_bp.route('/gamificacao/conquistas', methods=['POST'])
 def conceder_conquista():
     """Endpoint para conceder conquista a um usuário (apenas pedagogos)"""
@@ -178,49 +317,202 @@ def conceder_conquista():
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
-@gamificacao_bp.route('/gamificacao/estatisticas/escola/<int:escola_id>', methods=['GET'])
-def get_estatisticas_escola(escola_id):
-    """Endpoint para obter estatísticas de gamificação por escola (apenas pedagogos)"""
+@gamificacao_bp.route('/gamificacao/conquistas/lote', methods=['POST'])
+def conceder_conquista_lote():
+    """Endpoint para conceder uma conquista a vários usuários de uma vez (apenas pedagogos)
+
+    Recebe atividade_id e exatamente um de: usuario_ids (lista de alunos),
+    escola_id (todos os alunos da escola) ou clube_id (todos os membros do
+    clube). Quem já tem a conquista é ignorado; tudo é gravado em uma
+    transação. Com usuario_ids, a resposta traz os ids que não são de alunos
+    em `excluidos` e quantos não existem em `nao_encontrados`.
+    """
     try:
         user_id = session.get('user_id')
         user_type = session.get('user_type')
         
         if not user_id or user_type != 'pedagogo':
-            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver estatísticas da escola'}), 403
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem conceder conquistas'}), 403
+        
+        data = request.get_json() or {}
+        atividade_id = data.get('atividade_id')
+        filtros = [campo for campo in ('usuario_ids', 'escola_id', 'clube_id') if data.get(campo) is not None]
         
-        # Total de alunos na escola
-        total_alunos = Usuario.query.filter_by(escola_id=escola_id, tipo_usuario='aluno').count()
+        if not atividade_id:
+            return jsonify({'erro': 'ID da atividade é obrigatório'}), 400
+        if len(filtros) != 1:
+            return jsonify({'erro': 'Informe exatamente um de: usuario_ids, escola_id, clube_id'}), 400
         
-        # Alunos com pelo menos uma leitura
-        alunos_ativos = db.session.query(Usuario.id).join(Leitura)\
-                                 .filter(Usuario.escola_id == escola_id, Usuario.tipo_usuario == 'aluno')\
-                                 .distinct().count()
+        if not db.session.get(AtividadeGamificacao, atividade_id):
+            return jsonify({'erro': 'Atividade não encontrada'}), 404
+        
+        if filtros[0] == 'usuario_ids':
+            usuario_ids = data['usuario_ids']
+            if not isinstance(usuario_ids, list) or not all(
+                    isinstance(i, int) and not isinstance(i, bool) for i in usuario_ids):
+                return jsonify({'erro': 'usuario_ids deve ser uma lista de ids'}), 400
+            if len(usuario_ids) > MAXIMO_USUARIOS_LOTE:
+                return jsonify({'erro': f'Envie no máximo {MAXIMO_USUARIOS_LOTE} usuários por requisição'}), 400
+            origem, valores = 'usuarios', usuario_ids
+        elif filtros[0] == 'escola_id':
+            if not db.session.get(Escola, data['escola_id']):
+                return jsonify({'erro': 'Escola não encontrada'}), 404
+            origem, valores = 'escola', [data['escola_id']]
+        else:
+            if not db.session.get(ClubeLeitura, data['clube_id']):
+                return jsonify({'erro': 'Clube não encontrado'}), 404
+            origem, valores = 'clube', [data['clube_id']]
+        
+        candidatos, concedidas, excluidos = conceder_em_lote(db.session.connection(), atividade_id, origem, valores)
+        db.session.commit()
         
-        # Pontuação média da escola
-        pontuacao_media = db.session.query(func.avg(Leitura.pontuacao))\
-                                   .join(Usuario)\
-                                   .filter(Usuario.escola_id == escola_id, Usuario.tipo_usuario == 'aluno')\
-                                   .scalar() or 0
+        resposta = {
+            'sucesso': True,
+            'concedidas': concedidas,
+            'ignoradas': candidatos - concedidas
+        }
+        if origem == 'usuarios':
+            # Pedagogos da lista não recebem conquistas de alunos
+            resposta['excluidos'] = excluidos
+            resposta['nao_encontrados'] = len(set(valores)) - candidatos - len(excluidos)
+        return jsonify(resposta), 200
         
-        # Total de livros lidos (completos) na escola
-        livros_completos = db.session.query(Leitura)\
-                                    .join(Usuario)\
-                                    .filter(Usuario.escola_id == escola_id, 
-                                           Usuario.tipo_usuario == 'aluno',
-                                           Leitura.progresso == 100)\
-                                    .count()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@gamificacao_bp.route('/gamificacao/estatisticas/escolas', methods=['GET'])
+def get_estatisticas_escolas():
+    """Endpoint para comparar as estatísticas de várias escolas (apenas pedagogos)
+
+    ?escolas=1,2,3 lista as escolas; os totais de todas vêm dos nós de
+    escola de resumos_rede, em uma única consulta.
+    """
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
         
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver estatísticas das escolas'}), 403
+        
+        try:
+            escola_ids = list(dict.fromkeys(
+                int(valor) for valor in request.args.get('escolas', '').split(',') if valor.strip()
+            ))
+        except ValueError:
+            return jsonify({'erro': 'escolas deve ser uma lista de ids separados por vírgula'}), 400
+        if not escola_ids:
+            return jsonify({'erro': 'Informe as escolas em ?escolas=1,2,3'}), 400
+        if len(escola_ids) > TAMANHO_BLOCO_IDS:
+            return jsonify({'erro': f'Compare no máximo {TAMANHO_BLOCO_IDS} escolas por requisição'}), 400
+        
+        estatisticas = estatisticas_escolas(escola_ids)
         return jsonify({
             'sucesso': True,
-            'estatisticas': {
-                'total_alunos': total_alunos,
-                'alunos_ativos': alunos_ativos,
-                'taxa_engajamento': round((alunos_ativos / total_alunos * 100), 2) if total_alunos > 0 else 0,
-                'pontuacao_media': round(float(pontuacao_media), 2),
-                'livros_completos': livros_completos
-            }
+            'escolas': [{'escola_id': escola_id, **estatisticas[escola_id]} for escola_id in escola_ids]
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@gamificacao_bp.route('/gamificacao/estatisticas/escola/<int:escola_id>', methods=['GET'])
+def get_estatisticas_escola(escola_id):
+    """Endpoint para obter estatísticas de gamificação por escola (apenas pedagogos)"""
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver estatísticas da escola'}), 403
+        
+        # Totais já somados no nó da escola em resumos_rede
+        return jsonify({
+            'sucesso': True,
+            'estatisticas': estatisticas_escolas([escola_id])[escola_id]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@gamificacao_bp.route('/gamificacao/estatisticas/rede', methods=['GET'])
+def get_estatisticas_rede():
+    """Endpoint para navegar pelos totais da rede, do estado até o aluno (apenas pedagogos)
+
+    Sem parâmetros lista os estados; ?estado= traz o estado e suas cidades
+    (com &incluir=escolas, também todas as escolas do estado); ?estado=&cidade=
+    traz a cidade e suas escolas; ?escola_id= traz a escola e seus alunos,
+    paginados. Os totais já vêm somados em resumos_rede.
+    """
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver estatísticas da rede'}), 403
+        
+        escola_id = request.args.get('escola_id', type=int)
+        estado = request.args.get('estado')
+        cidade = request.args.get('cidade')
+        
+        if escola_id is not None:
+            escola = db.session.get(Escola, escola_id)
+            resumo = escola and db.session.get(ResumoRede, ('escola', escola.estado, escola.cidade, escola.id))
+            if not resumo:
+                return jsonify({'erro': 'Escola não encontrada'}), 404
+            
+            paginacao = ler_parametros(request.args, ORDENACOES_ALUNOS_REDE, 'id')
+            # A classificação por pontos dentro da escola fica em /gamificacao/ranking?escopo=escola
+            query = Usuario.query.filter(Usuario.escola_id == escola_id, Usuario.tipo_usuario == 'aluno')
+            alunos, proximo_cursor, total = paginar(query, **paginacao)
+            
+            # Resumos de todos os alunos da página em uma única consulta
+            estatisticas = {
+                item.usuario_id: item
+                for item in EstatisticaUsuario.query.filter(
+                    EstatisticaUsuario.usuario_id.in_([aluno.id for aluno in alunos])
+                )
+            }
+            resposta = resposta_paginada('alunos', [
+                {'id': aluno.id, 'nome': aluno.nome, **estatisticas[aluno.id].to_dict()}
+                if aluno.id in estatisticas else {'id': aluno.id, 'nome': aluno.nome}
+                for aluno in alunos
+            ], proximo_cursor, total)
+            resposta['resumo'] = dict(resumo.to_dict(), nome=escola.nome)
+            return jsonify(resposta), 200
+        
+        if cidade is not None and estado is None:
+            return jsonify({'erro': 'Informe o estado da cidade em ?estado='}), 400
+        
+        if estado is None:
+            return jsonify({
+                'sucesso': True,
+                'estados': nos_rede('estado')
+            }), 200
+        
+        if cidade is not None:
+            resumo = db.session.get(ResumoRede, ('cidade', estado, cidade, 0))
+            if not resumo:
+                return jsonify({'erro': 'Cidade não encontrada'}), 404
+            return jsonify({
+                'sucesso': True,
+                'resumo': resumo.to_dict(),
+                'escolas': nos_rede('escola', estado, cidade)
+            }), 200
+        
+        resumo = db.session.get(ResumoRede, ('estado', estado, '', 0))
+        if not resumo:
+            return jsonify({'erro': 'Estado não encontrado'}), 404
+        resposta = {
+            'sucesso': True,
+            'resumo': resumo.to_dict(),
+            'cidades': nos_rede('cidade', estado)
+        }
+        # Painel do estado inteiro: todas as escolas em uma leitura sequencial do índice
+        if request.args.get('incluir') == 'escolas':
+            resposta['escolas'] = nos_rede('escola', estado)
+        return jsonify(resposta), 200
+        
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
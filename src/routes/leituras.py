@@ -1,9 +1,72 @@
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime
-from src.models.minasle_models import db, Leitura, Usuario, Livro, AtividadeGamificacao, ConquistaUsuario
+from flask import Blueprint, current_app, request, jsonify, session
+from datetime import datetime, timedelta, timezone
+from src.models.minasle_models import db, EstatisticaUsuario, Leitura, Usuario, Livro, AtividadeGamificacao, ConquistaUsuario
+from src.services.atividade_leitura import (
+    calendario, hoje, maior_sequencia, registrar_eventos, sequencia_atual
+)
+from src.services.carregamento import (
+    aplicar_campos, anexar_relacionado, carregar_conquistas, carregar_por_id, ler_campos, ler_inclusoes
+)
+from src.services.paginacao import ParametroInvalido, ler_parametros, paginar, paginar_lista, resposta_paginada
+from src.services.painel_turma import metricas_turma, ultimos_acompanhamentos
+from src.services.progresso_leitura import aplicar_progresso, carregar_momentos, registrar_momento
+from src.services.progresso_pendente import buffer_progresso, write_behind_ativo
 
 leituras_bp = Blueprint('leituras', __name__)
 
+ORDENACOES_LEITURAS = {
+    'id': [Leitura.id],
+    'data_inicio': [Leitura.data_inicio, Leitura.id]
+}
+
+MAXIMO_OPERACOES_SYNC = 1000
+MAXIMO_EVENTOS_POR_LOTE = 1000
+DIAS_CALENDARIO_PADRAO = 365
+
+# Relações aceitas em include; o livro vem por padrão
+INCLUSOES_LEITURAS = ('livro', 'conquistas')
+
+# A turma é ordenada em memória, por qualquer métrica, sempre desempatada pelo id
+ORDENACOES_TURMA = {
+    'id': ['id'],
+    'nome': ['nome', 'id'],
+    'total_leituras': ['total_leituras', 'id'],
+    'leituras_completas': ['leituras_completas', 'id'],
+    'leituras_em_andamento': ['leituras_em_andamento', 'id'],
+    'progresso_medio': ['progresso_medio', 'id'],
+    'pontuacao_total': ['pontuacao_total', 'id'],
+    'total_conquistas': ['total_conquistas', 'id'],
+    'ultima_atividade': ['ultima_atividade', 'id']
+}
+
+DIRECOES_TURMA = {nome: 'desc' for nome in ORDENACOES_TURMA if nome not in ('id', 'nome')}
+
+INCLUSOES_TURMA = ('conquistas', 'acompanhamento')
+
+def _com_progresso_pendente(leitura_dict):
+    """Mostra o progresso ainda no buffer do write-behind, mais novo que o gravado"""
+    pendente = buffer_progresso.pendente(leitura_dict['id'])
+    if pendente is not None:
+        leitura_dict['progresso'] = pendente
+    return leitura_dict
+
+def _resposta_leituras(usuario_id, leituras, proximo_cursor, total, inclusoes, campos):
+    """Monta a listagem de leituras com as relações pedidas em include e os campos de fields
+
+    Cada relação custa uma única consulta, qualquer que seja o tamanho da página.
+    """
+    leituras_dict = [_com_progresso_pendente(leitura.to_dict()) for leitura in leituras]
+    if 'livro' in inclusoes:
+        anexar_relacionado(leituras, leituras_dict, 'livro', Livro, 'livro_id')
+    
+    resposta = resposta_paginada(
+        'leituras', aplicar_campos(leituras_dict, campos, inclusoes), proximo_cursor, total
+    )
+    # As conquistas são do usuário, não de cada leitura
+    if 'conquistas' in inclusoes:
+        resposta['conquistas'] = carregar_conquistas([usuario_id]).get(usuario_id, [])
+    return resposta
+
 @leituras_bp.route('/leituras', methods=['GET'])
 def get_leituras():
     """Endpoint para obter leituras do usuário logado"""
@@ -12,23 +75,18 @@ def get_leituras():
         if not user_id:
             return jsonify({'erro': 'Usuário não autenticado'}), 401
         
-        leituras = Leitura.query.filter_by(usuario_id=user_id).all()
+        paginacao = ler_parametros(request.args, ORDENACOES_LEITURAS, 'id')
+        inclusoes = ler_inclusoes(request.args, INCLUSOES_LEITURAS, padrao=('livro',))
+        campos = ler_campos(request.args)
         
-        # Incluir informações do livro em cada leitura
-        leituras_com_livros = []
-        for leitura in leituras:
-            leitura_dict = leitura.to_dict()
-            livro = Livro.query.get(leitura.livro_id)
-            if livro:
-                leitura_dict['livro'] = livro.to_dict()
-            leituras_com_livros.append(leitura_dict)
+        query = Leitura.query.filter_by(usuario_id=user_id)
+        leituras, proximo_cursor, total = paginar(query, **paginacao)
         
-        return jsonify({
-            'sucesso': True,
-            'leituras': leituras_com_livros,
-            'total': len(leituras)
-        }), 200
+        resposta = _resposta_leituras(user_id, leituras, proximo_cursor, total, inclusoes, campos)
+        return jsonify(resposta), 200
         
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -46,23 +104,18 @@ def get_leituras_usuario(usuario_id):
         if user_type != 'pedagogo' and user_id != usuario_id:
             return jsonify({'erro': 'Acesso negado'}), 403
         
-        leituras = Leitura.query.filter_by(usuario_id=usuario_id).all()
+        paginacao = ler_parametros(request.args, ORDENACOES_LEITURAS, 'id')
+        inclusoes = ler_inclusoes(request.args, INCLUSOES_LEITURAS, padrao=('livro',))
+        campos = ler_campos(request.args)
         
-        # Incluir informações do livro em cada leitura
-        leituras_com_livros = []
-        for leitura in leituras:
-            leitura_dict = leitura.to_dict()
-            livro = Livro.query.get(leitura.livro_id)
-            if livro:
-                leitura_dict['livro'] = livro.to_dict()
-            leituras_com_livros.append(leitura_dict)
+        query = Leitura.query.filter_by(usuario_id=usuario_id)
+        leituras, proximo_cursor, total = paginar(query, **paginacao)
         
-        return jsonify({
-            'sucesso': True,
-            'leituras': leituras_com_livros,
-            'total': len(leituras)
-        }), 200
+        resposta = _resposta_leituras(usuario_id, leituras, proximo_cursor, total, inclusoes, campos)
+        return jsonify(resposta), 200
         
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -94,7 +147,7 @@ def iniciar_leitura():
         if leitura_existente:
             return jsonify({
                 'sucesso': True,
-                'leitura': leitura_existente.to_dict(),
+                'leitura': _com_progresso_pendente(leitura_existente.to_dict()),
                 'mensagem': 'Leitura já iniciada anteriormente'
             }), 200
         
@@ -140,27 +193,26 @@ def atualizar_progresso(leitura_id):
         if novo_progresso is None or novo_progresso < 0 or novo_progresso > 100:
             return jsonify({'erro': 'Progresso deve ser um valor entre 0 e 100'}), 400
         
-        leitura.progresso = novo_progresso
+        # No modo write-behind, progresso parcial de leitura em andamento fica
+        # em memória e é gravado em lote; conclusões seguem pelo caminho normal
+        if write_behind_ativo(current_app.config) and novo_progresso < 100 and not leitura.data_conclusao:
+            buffer_progresso.registrar(current_app._get_current_object(), leitura_id, novo_progresso)
+            leitura_dict = leitura.to_dict()
+            leitura_dict['progresso'] = novo_progresso
+            return jsonify({
+                'sucesso': True,
+                'leitura': leitura_dict,
+                'mensagem': 'Progresso atualizado com sucesso'
+            }), 200
+        
+        # A gravação direta substitui qualquer valor ainda pendente
+        buffer_progresso.descartar(leitura_id)
         
         # Se completou a leitura (100%), marcar data de conclusão e dar pontos
-        if novo_progresso == 100 and not leitura.data_conclusao:
-            leitura.data_conclusao = datetime.utcnow()
-            leitura.pontuacao = 100  # Pontos base por completar um livro
-            
-            # Verificar se deve ganhar conquista de leitura completa
-            atividade_leitura = AtividadeGamificacao.query.filter_by(tipo='leitura_completa').first()
-            if atividade_leitura:
-                conquista_existente = ConquistaUsuario.query.filter_by(
-                    usuario_id=user_id,
-                    atividade_id=atividade_leitura.id
-                ).first()
-                
-                if not conquista_existente:
-                    nova_conquista = ConquistaUsuario(
-                        usuario_id=user_id,
-                        atividade_id=atividade_leitura.id
-                    )
-                    db.session.add(nova_conquista)
+        agora = datetime.utcnow()
+        aplicar_progresso(leitura, novo_progresso)
+        registrar_momento(leitura_id, agora)
+        registrar_eventos(db.session.connection(), [(user_id, leitura.livro_id, agora, 0, 0)])
         
         db.session.commit()
         
@@ -174,41 +226,322 @@ def atualizar_progresso(leitura_id):
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
-@leituras_bp.route('/leituras/estatisticas', methods=['GET'])
-def get_estatisticas_leitura():
-    """Endpoint para obter estatísticas de leitura do usuário"""
+def _ler_momento(valor):
+    """Converte o client_timestamp (ISO 8601 ou milissegundos desde a época) para UTC"""
+    if isinstance(valor, bool):
+        raise ValueError
+    if isinstance(valor, (int, float)):
+        return datetime.utcfromtimestamp(valor / 1000)
+    momento = datetime.fromisoformat(valor)
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(timezone.utc).replace(tzinfo=None)
+    return momento
+
+def _ler_operacao(operacao):
+    """Valida uma operação de sincronização; retorna (leitura_id, livro_id, progresso, momento)"""
+    if not isinstance(operacao, dict):
+        raise ValueError('Operação deve ser um objeto')
+    
+    leitura_id = operacao.get('leitura_id')
+    livro_id = operacao.get('livro_id')
+    # true e false do JSON chegam como bool, que também é int em Python
+    if isinstance(leitura_id, bool) or isinstance(livro_id, bool):
+        raise ValueError('leitura_id e livro_id devem ser números inteiros')
+    if not isinstance(leitura_id, int) and not isinstance(livro_id, int):
+        raise ValueError('Informe leitura_id ou livro_id')
+    
+    progresso = operacao.get('progresso')
+    if not isinstance(progresso, int) or isinstance(progresso, bool) or not 0 <= progresso <= 100:
+        raise ValueError('Progresso deve ser um valor entre 0 e 100')
+    
+    try:
+        momento = _ler_momento(operacao.get('client_timestamp'))
+    except (ValueError, TypeError, OverflowError, OSError):
+        raise ValueError('client_timestamp inválido')
+    
+    # Um relógio adiantado não pode bloquear as atualizações seguintes da leitura
+    momento = min(momento, datetime.utcnow())
+    
+    return leitura_id if isinstance(leitura_id, int) else None, livro_id, progresso, momento
+
+@leituras_bp.route('/leituras/sync', methods=['POST'])
+def sincronizar_leituras():
+    """Endpoint para aplicar de uma vez o progresso acumulado por um cliente offline
+
+    Recebe uma lista de operações {leitura_id ou livro_id, progresso,
+    client_timestamp}. Em cada leitura vale a operação mais recente pelo
+    relógio do cliente, desde que mais nova que a última já aplicada; a
+    leitura é concluída, como na atualização direta, quando o progresso
+    final é 100%.
+    Tudo é gravado em uma única transação.
+    """
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'erro': 'Usuário não autenticado'}), 401
         
-        # Estatísticas gerais
-        total_leituras = Leitura.query.filter_by(usuario_id=user_id).count()
-        leituras_completas = Leitura.query.filter_by(usuario_id=user_id).filter(Leitura.progresso == 100).count()
-        pontuacao_total = db.session.query(db.func.sum(Leitura.pontuacao)).filter_by(usuario_id=user_id).scalar() or 0
+        data = request.get_json(silent=True)
+        operacoes = data.get('operacoes') if isinstance(data, dict) else data
+        if not isinstance(operacoes, list):
+            return jsonify({'erro': 'Envie uma lista de operações'}), 400
+        if len(operacoes) > MAXIMO_OPERACOES_SYNC:
+            return jsonify({'erro': f'Máximo de {MAXIMO_OPERACOES_SYNC} operações por sincronização'}), 400
+        
+        resultados = [None] * len(operacoes)
+        validas = []
+        for indice, operacao in enumerate(operacoes):
+            try:
+                validas.append((indice,) + _ler_operacao(operacao))
+            except ValueError as e:
+                resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': str(e)}
+        
+        # Leituras e livros citados, carregados com uma consulta cada
+        por_id = carregar_por_id(Leitura, (leitura_id for _, leitura_id, _, _, _ in validas))
+        livro_ids = {livro_id for _, leitura_id, livro_id, _, _ in validas if leitura_id is None}
+        por_livro = {}
+        if livro_ids:
+            por_livro = {
+                leitura.livro_id: leitura
+                for leitura in Leitura.query.filter(
+                    Leitura.usuario_id == user_id, Leitura.livro_id.in_(livro_ids)
+                )
+            }
+        livros = carregar_por_id(Livro, livro_ids - set(por_livro))
+        
+        # Agrupar as operações por leitura, criando as que ainda não existem
+        grupos = {}
+        for indice, leitura_id, livro_id, progresso, momento in validas:
+            if leitura_id is not None:
+                leitura = por_id.get(leitura_id)
+                if leitura is None or leitura.usuario_id != user_id:
+                    resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'Leitura não encontrada'}
+                    continue
+            else:
+                leitura = por_livro.get(livro_id)
+                if leitura is None:
+                    if livro_id not in livros:
+                        resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'Livro não encontrado'}
+                        continue
+                    leitura = Leitura(usuario_id=user_id, livro_id=livro_id, progresso=0)
+                    db.session.add(leitura)
+                    por_livro[livro_id] = leitura
+            grupos.setdefault(id(leitura), (leitura, []))[1].append((momento, indice, progresso))
+        
+        db.session.flush()
+        momentos = carregar_momentos(leitura.id for leitura, _ in grupos.values())
+        
+        afetadas = []
+        eventos = []
+        for leitura, operacoes_leitura in grupos.values():
+            registro = momentos.get(leitura.id)
+            novas = []
+            for momento, indice, progresso in operacoes_leitura:
+                if registro is not None and momento <= registro.atualizado_em:
+                    resultados[indice] = {'indice': indice, 'status': 'obsoleto', 'leitura_id': leitura.id}
+                else:
+                    novas.append((momento, indice, progresso))
+            if not novas:
+                continue
+            
+            # Última escrita vence; a ordem no lote desempata momentos iguais
+            momento, indice_final, progresso_final = max(novas)
+            buffer_progresso.descartar(leitura.id)
+            aplicar_progresso(leitura, progresso_final)
+            registrar_momento(leitura.id, momento, momentos)
+            afetadas.append(leitura)
+            # Cada operação aplicada conta como atividade no dia em que o aluno leu
+            eventos.extend((user_id, leitura.livro_id, momento, 0, 0) for momento, _, _ in novas)
+            
+            for _, indice, _ in novas:
+                resultados[indice] = {
+                    'indice': indice,
+                    'status': 'aplicado' if indice == indice_final else 'substituido',
+                    'leitura_id': leitura.id
+                }
+        
+        registrar_eventos(db.session.connection(), eventos)
+        db.session.commit()
+        
+        return jsonify({
+            'sucesso': True,
+            'resultados': resultados,
+            'leituras': [leitura.to_dict() for leitura in afetadas]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@leituras_bp.route('/leituras/eventos', methods=['POST'])
+def registrar_eventos_leitura():
+    """Endpoint para registrar em lote sessões de leitura (páginas e segundos lidos)
+
+    Recebe uma lista de eventos {livro_id, paginas, segundos, client_timestamp}.
+    Os eventos são só incluídos, nunca alterados, e os totais diários do
+    usuário são atualizados na mesma transação.
+    """
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'erro': 'Usuário não autenticado'}), 401
         
-        # Progresso médio
-        progresso_medio = db.session.query(db.func.avg(Leitura.progresso)).filter_by(usuario_id=user_id).scalar() or 0
+        data = request.get_json(silent=True)
+        eventos = data.get('eventos') if isinstance(data, dict) else data
+        if not isinstance(eventos, list) or not eventos:
+            return jsonify({'erro': 'Envie uma lista de eventos'}), 400
+        if len(eventos) > MAXIMO_EVENTOS_POR_LOTE:
+            return jsonify({'erro': f'Máximo de {MAXIMO_EVENTOS_POR_LOTE} eventos por lote'}), 400
+        
+        agora = datetime.utcnow()
+        validos = []
+        for indice, evento in enumerate(eventos):
+            if not isinstance(evento, dict) or not isinstance(evento.get('livro_id'), int) \
+                    or isinstance(evento['livro_id'], bool):
+                return jsonify({'erro': f'Evento {indice}: livro_id é obrigatório'}), 400
+            
+            paginas = evento.get('paginas', 0)
+            segundos = evento.get('segundos', 0)
+            if any(not isinstance(v, int) or isinstance(v, bool) or v < 0 for v in (paginas, segundos)):
+                return jsonify({'erro': f'Evento {indice}: paginas e segundos devem ser inteiros não negativos'}), 400
+            
+            momento = agora
+            if evento.get('client_timestamp') is not None:
+                try:
+                    momento = min(_ler_momento(evento['client_timestamp']), agora)
+                except (ValueError, TypeError, OverflowError, OSError):
+                    return jsonify({'erro': f'Evento {indice}: client_timestamp inválido'}), 400
+            
+            validos.append((user_id, evento['livro_id'], momento, paginas, segundos))
         
-        # Livros regionais lidos
-        livros_regionais = db.session.query(Leitura).join(Livro).filter(
-            Leitura.usuario_id == user_id,
-            Livro.obra_regional == True,
-            Leitura.progresso == 100
-        ).count()
+        livros = carregar_por_id(Livro, (livro_id for _, livro_id, _, _, _ in validos))
+        desconhecidos = sorted({livro_id for _, livro_id, _, _, _ in validos} - set(livros))
+        if desconhecidos:
+            return jsonify({'erro': f'Livros não encontrados: {desconhecidos}'}), 404
+        
+        registrar_eventos(db.session.connection(), validos)
+        db.session.commit()
+        
+        return jsonify({
+            'sucesso': True,
+            'registrados': len(validos),
+            'mensagem': 'Eventos de leitura registrados com sucesso'
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@leituras_bp.route('/leituras/atividade', methods=['GET'])
+def get_atividade_leitura():
+    """Endpoint para obter sequência de dias, tempo de leitura e calendário de atividade
+
+    Tudo é calculado a partir dos totais diários. Pedagogos podem consultar
+    um aluno com ?usuario_id=; o período do calendário vem de inicio e fim
+    (AAAA-MM-DD), por padrão os últimos 365 dias.
+    """
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id:
+            return jsonify({'erro': 'Usuário não autenticado'}), 401
+        
+        usuario_id = request.args.get('usuario_id', user_id, type=int)
+        if user_type != 'pedagogo' and usuario_id != user_id:
+            return jsonify({'erro': 'Acesso negado'}), 403
+        
+        try:
+            fim = datetime.strptime(request.args['fim'], '%Y-%m-%d').date() if 'fim' in request.args else hoje()
+            inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date() if 'inicio' in request.args \
+                else fim - timedelta(days=DIAS_CALENDARIO_PADRAO - 1)
+        except ValueError:
+            return jsonify({'erro': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+        if inicio > fim:
+            return jsonify({'erro': 'inicio deve ser anterior a fim'}), 400
+        
+        dias = calendario(usuario_id, inicio, fim)
         
         return jsonify({
             'sucesso': True,
-            'estatisticas': {
-                'total_leituras': total_leituras,
-                'leituras_completas': leituras_completas,
-                'pontuacao_total': int(pontuacao_total),
-                'progresso_medio': round(float(progresso_medio), 2),
-                'livros_regionais_completos': livros_regionais,
-                'taxa_conclusao': round((leituras_completas / total_leituras * 100), 2) if total_leituras > 0 else 0
+            'atividade': {
+                'sequencia_atual': sequencia_atual(usuario_id),
+                'maior_sequencia': maior_sequencia(usuario_id),
+                'inicio': inicio.isoformat(),
+                'fim': fim.isoformat(),
+                'dias_ativos': len(dias),
+                'paginas': sum(dia.paginas for dia in dias),
+                'segundos': sum(dia.segundos for dia in dias),
+                'calendario': [dia.to_dict() for dia in dias]
             }
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@leituras_bp.route('/leituras/estatisticas', methods=['GET'])
+def get_estatisticas_leitura():
+    """Endpoint para obter estatísticas de leitura do usuário"""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'erro': 'Usuário não autenticado'}), 401
+        
+        # Resumo mantido a cada leitura: uma busca pela chave primária
+        estatisticas = db.session.get(EstatisticaUsuario, user_id) or EstatisticaUsuario(
+            usuario_id=user_id, total_leituras=0, leituras_completas=0, pontuacao_total=0,
+            soma_progresso=0, livros_regionais_completos=0
+        )
+        
+        return jsonify({
+            'sucesso': True,
+            'estatisticas': estatisticas.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@leituras_bp.route('/pedagogo/turma', methods=['GET'])
+def get_painel_turma():
+    """Endpoint para o pedagogo acompanhar todos os alunos da sua escola
+
+    Cada aluno traz contagens de leitura, progresso médio, pontuação,
+    conquistas e a última atividade; com include, também a lista de
+    conquistas e o acompanhamento pedagógico mais recente. A turma inteira
+    sai de uma consulta agregada e a página, de uma consulta por relação.
+    """
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver a turma'}), 403
+        
+        pedagogo = db.session.get(Usuario, user_id)
+        if not pedagogo:
+            return jsonify({'erro': 'Usuário não encontrado'}), 404
+        
+        paginacao = ler_parametros(request.args, ORDENACOES_TURMA, 'nome', DIRECOES_TURMA)
+        inclusoes = ler_inclusoes(request.args, INCLUSOES_TURMA, padrao=INCLUSOES_TURMA)
+        campos = ler_campos(request.args)
+        
+        alunos, proximo_cursor, total = paginar_lista(metricas_turma(pedagogo.escola_id), **paginacao)
+        
+        aluno_ids = [aluno['id'] for aluno in alunos]
+        if 'conquistas' in inclusoes:
+            conquistas = carregar_conquistas(aluno_ids)
+            for aluno in alunos:
+                aluno['conquistas'] = conquistas.get(aluno['id'], [])
+        if 'acompanhamento' in inclusoes:
+            acompanhamentos = ultimos_acompanhamentos(aluno_ids)
+            for aluno in alunos:
+                acompanhamento = acompanhamentos.get(aluno['id'])
+                aluno['acompanhamento'] = acompanhamento.to_dict() if acompanhamento else None
+        
+        resposta = resposta_paginada('alunos', aplicar_campos(alunos, campos, inclusoes), proximo_cursor, total)
+        resposta['escola_id'] = pedagogo.escola_id
+        return jsonify(resposta), 200
+        
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
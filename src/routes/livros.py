@@ -1,9 +1,57 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.minasle_models import db, Livro, Usuario
+import io
+from flask import Blueprint, current_app, request, jsonify, session
+from sqlalchemy import and_, or_
+from src.models.minasle_models import db, EstatisticaLivro, Livro, LivroNormalizado, Usuario
+from src.services.busca import buscar_livros, busca_aproximada, ids_busca_textual
+from src.services.cache_catalogo import com_cache_catalogo
+from src.services.carregamento import carregar_por_id
+from src.services.duplicatas import LIMIAR_PADRAO, relatorio_duplicatas
+from src.services.facetas import indice_facetas
+from src.services.importacao import FORMATOS, detectar_formato, importar_catalogo
+from src.services.publicacao_catalogo import publicar_catalogo
+from src.services.paginacao import ParametroInvalido, ler_parametros, paginar, paginar_lista, resposta_paginada
+from src.services.sugestoes import indice_sugestoes
+from src.services.texto import normalizar
 
 livros_bp = Blueprint('livros', __name__)
 
+# Ordenações aceitas nas listagens de livros, todas apoiadas em índices
+ORDENACOES_LIVROS = {
+    'id': [Livro.id],
+    'data_adicao': [Livro.data_adicao, Livro.id],
+    'titulo': [Livro.titulo, Livro.id],
+    'recentes': [Livro.data_adicao, Livro.id],
+    # Mais leitores primeiro, desempatando por conclusões; usa o índice
+    # ix_livros_estatisticas_populares
+    'populares': [EstatisticaLivro.leitores, EstatisticaLivro.conclusoes, EstatisticaLivro.livro_id]
+}
+
+DIRECOES_LIVROS = {'recentes': 'desc', 'populares': 'desc'}
+
+def _ordenado_por_popularidade(args):
+    # Os contadores mudam a cada leitura, não só quando o catálogo muda
+    return args.get('ordenar') == 'populares'
+
+def _filtros_catalogo(genero, obra_regional, autor):
+    """Condições dos filtros de gênero, obra regional e autor sobre Livro e LivroNormalizado
+
+    O autor é comparado na forma normalizada; um livro ainda sem linha em
+    livros_normalizados cai na comparação direta com Livro.autor.
+    """
+    filtros = []
+    if genero:
+        filtros.append(Livro.genero.ilike(f'%{genero}%'))
+    if obra_regional is not None:
+        filtros.append(Livro.obra_regional == (obra_regional.lower() == 'true'))
+    if autor:
+        filtros.append(or_(
+            LivroNormalizado.autor.contains(normalizar(autor), autoescape=True),
+            and_(LivroNormalizado.livro_id.is_(None), Livro.autor.ilike(f'%{autor}%'))
+        ))
+    return filtros
+
 @livros_bp.route('/livros', methods=['GET'])
+@com_cache_catalogo(popularidade=_ordenado_por_popularidade)
 def get_livros():
     """Endpoint para listar todos os livros"""
     try:
@@ -11,31 +59,126 @@ def get_livros():
         genero = request.args.get('genero')
         obra_regional = request.args.get('obra_regional')
         autor = request.args.get('autor')
+        termos = request.args.get('q')
+        busca = request.args.get('busca')
         
         query = Livro.query
+        ordenacoes = ORDENACOES_LIVROS
+        ordenacao_padrao = 'id'
+        
+        # Busca textual no índice FTS5, ordenada por relevância
+        if termos:
+            query, relevancia = buscar_livros(query, termos)
+            ordenacoes = dict(ORDENACOES_LIVROS, relevancia=[relevancia, Livro.id])
+            ordenacao_padrao = 'relevancia'
+        
+        paginacao = ler_parametros(request.args, ordenacoes, ordenacao_padrao, DIRECOES_LIVROS)
+        
+        populares = request.args.get('ordenar') == 'populares'
+        filtros = _filtros_catalogo(genero, obra_regional, autor)
+        
+        similaridades = None
+        if busca:
+            if termos:
+                filtros.append(Livro.id.in_(ids_busca_textual(termos)))
+            # Busca aproximada por título e autor, tolerante a acentos e erros;
+            # os filtros entram já na escolha dos candidatos e as páginas
+            # seguem a ordem de similaridade
+            itens = [
+                {'id': livro_id, 'similaridade': similaridade, 'desempate': desempate}
+                for livro_id, similaridade, desempate in busca_aproximada(busca, limite=None, filtros=filtros)
+            ]
+            pagina, proximo_cursor, total = paginar_lista(
+                itens, ['similaridade', 'desempate', 'id'], descendente=True, limite=paginacao['limite'],
+                cursor=paginacao['cursor'], incluir_total=paginacao['incluir_total']
+            )
+            encontrados = carregar_por_id(Livro, (item['id'] for item in pagina))
+            livros = [encontrados[item['id']] for item in pagina if item['id'] in encontrados]
+            similaridades = {item['id']: item['similaridade'] for item in pagina}
+        else:
+            if populares:
+                query = query.join(EstatisticaLivro, EstatisticaLivro.livro_id == Livro.id)
+            if autor:
+                query = query.outerjoin(LivroNormalizado, LivroNormalizado.livro_id == Livro.id)
+            livros, proximo_cursor, total = paginar(query.filter(*filtros), **paginacao)
+        
+        livros_dict = [livro.to_dict() for livro in livros]
+        if similaridades is not None:
+            for livro_dict in livros_dict:
+                livro_dict['similaridade'] = similaridades[livro_dict['id']]
         
-        if genero:
-            query = query.filter(Livro.genero.ilike(f'%{genero}%'))
+        if populares:
+            estatisticas = {
+                estatistica.livro_id: estatistica
+                for estatistica in EstatisticaLivro.query.filter(
+                    EstatisticaLivro.livro_id.in_([livro.id for livro in livros])
+                )
+            }
+            # Na busca aproximada a listagem não passa pelo join, então um
+            # livro ainda sem contadores aparece zerado
+            zeradas = {'leitores': 0, 'conclusoes': 0, 'progresso_medio': 0}
+            for livro_dict in livros_dict:
+                estatistica = estatisticas.get(livro_dict['id'])
+                livro_dict['estatisticas'] = estatistica.to_dict() if estatistica else zeradas
         
+        return jsonify(resposta_paginada('livros', livros_dict, proximo_cursor, total)), 200
+        
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@livros_bp.route('/livros/sugestoes', methods=['GET'])
+def get_sugestoes():
+    """Endpoint para sugerir livros pelo início do título ou do autor"""
+    try:
+        prefixo = request.args.get('prefixo', '')
+        limite = min(request.args.get('limite', 10, type=int), 50)
+        
+        # O índice é montado uma única vez e depois mantido pelos commits de livros
+        if not indice_sugestoes.carregado():
+            indice_sugestoes.carregar()
+        
+        sugestoes = indice_sugestoes.sugerir(prefixo, limite)
+        
+        return jsonify({
+            'sucesso': True,
+            'sugestoes': sugestoes,
+            'total': len(sugestoes)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@livros_bp.route('/livros/facetas', methods=['GET'])
+@com_cache_catalogo
+def get_facetas():
+    """Endpoint para obter a contagem de livros por gênero, autor e obra regional"""
+    try:
+        # Cada faceta é filtrada pelas demais, mas não por ela mesma
+        genero = request.args.get('genero')
+        autor = request.args.get('autor')
+        obra_regional = request.args.get('obra_regional')
         if obra_regional is not None:
-            obra_regional_bool = obra_regional.lower() == 'true'
-            query = query.filter(Livro.obra_regional == obra_regional_bool)
+            obra_regional = obra_regional.lower() == 'true'
         
-        if autor:
-            query = query.filter(Livro.autor.ilike(f'%{autor}%'))
+        # O índice é montado uma única vez e depois mantido pelos commits de livros
+        if not indice_facetas.carregado():
+            indice_facetas.carregar()
         
-        livros = query.all()
+        facetas, total = indice_facetas.contar(genero, autor, obra_regional)
         
         return jsonify({
             'sucesso': True,
-            'livros': [livro.to_dict() for livro in livros],
-            'total': len(livros)
+            'facetas': facetas,
+            'total': total
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 @livros_bp.route('/livros/<int:livro_id>', methods=['GET'])
+@com_cache_catalogo
 def get_livro(livro_id):
     """Endpoint para obter detalhes de um livro específico"""
     try:
@@ -98,6 +241,86 @@ def criar_livro():
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+@livros_bp.route('/livros/importar', methods=['POST'])
+def importar_livros():
+    """Endpoint para importar livros em lote de um arquivo CSV ou JSONL (apenas pedagogos)"""
+    try:
+        # Verificar autenticação
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem importar livros'}), 403
+        
+        # O arquivo pode vir como campo 'arquivo' de um formulário ou como corpo da requisição
+        arquivo = request.files.get('arquivo')
+        if arquivo:
+            fluxo = arquivo.stream
+            formato_detectado = detectar_formato(arquivo.filename, arquivo.mimetype)
+        else:
+            fluxo = request.stream
+            formato_detectado = detectar_formato(tipo_conteudo=request.mimetype)
+        
+        formato = request.args.get('formato', formato_detectado)
+        if formato not in FORMATOS:
+            return jsonify({'erro': f"Formato inválido. Use: {', '.join(FORMATOS)}"}), 400
+        
+        # Com semelhantes=true, livros parecidos com os já cadastrados são importados, mas listados no relatório
+        verificar_semelhantes = request.args.get('semelhantes', '').lower() == 'true'
+        
+        texto = io.TextIOWrapper(fluxo, encoding='utf-8-sig', newline='')
+        relatorio = importar_catalogo(texto, formato, verificar_semelhantes=verificar_semelhantes)
+        
+        return jsonify({
+            'sucesso': True,
+            'relatorio': relatorio,
+            'mensagem': f"{relatorio['inseridos']} livros importados"
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@livros_bp.route('/livros/duplicatas', methods=['GET'])
+def get_duplicatas():
+    """Endpoint para listar livros possivelmente duplicados (apenas pedagogos)"""
+    try:
+        # Verificar autenticação
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem ver duplicatas'}), 403
+        
+        limiar = request.args.get('limiar', LIMIAR_PADRAO, type=float)
+        if not 0 < limiar <= 1:
+            return jsonify({'erro': 'Limiar deve estar entre 0 e 1'}), 400
+        
+        pares, descartados = relatorio_duplicatas(limiar)
+        
+        # Incluir título e autor dos livros envolvidos; o relatório já percorre
+        # o catálogo inteiro, então uma leitura só das colunas basta
+        livros = {}
+        if pares:
+            livros = {
+                livro_id: {'id': livro_id, 'titulo': titulo, 'autor': autor}
+                for livro_id, titulo, autor in db.session.query(Livro.id, Livro.titulo, Livro.autor)
+            }
+        for par in pares:
+            par['manter'] = livros[par['manter_livro_id']]
+            par['mesclar'] = livros[par['mesclar_livro_id']]
+        
+        return jsonify({
+            'sucesso': True,
+            'duplicatas': pares,
+            'total': len(pares),
+            # Entradas que não couberam no índice; acima de zero, a lista pode estar incompleta
+            'descartados': descartados
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
 @livros_bp.route('/livros/<int:livro_id>', methods=['PUT'])
 def atualizar_livro(livro_id):
     """Endpoint para atualizar um livro (apenas pedagogos)"""
@@ -171,17 +394,41 @@ def deletar_livro(livro_id):
         return jsonify({'erro': str(e)}), 500
 
 @livros_bp.route('/livros/regionais', methods=['GET'])
+@com_cache_catalogo
 def get_livros_regionais():
     """Endpoint específico para obter livros regionais"""
     try:
-        livros = Livro.query.filter_by(obra_regional=True).all()
+        paginacao = ler_parametros(request.args, ORDENACOES_LIVROS, 'id')
+        
+        query = Livro.query.filter_by(obra_regional=True)
+        livros, proximo_cursor, total = paginar(query, **paginacao)
+        
+        return jsonify(resposta_paginada(
+            'livros', [livro.to_dict() for livro in livros], proximo_cursor, total
+        )), 200
+        
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@livros_bp.route('/livros/catalogo/publicar', methods=['POST'])
+def publicar_instantaneos():
+    """Endpoint para regerar os arquivos estáticos do catálogo (apenas pedagogos)"""
+    try:
+        user_id = session.get('user_id')
+        user_type = session.get('user_type')
+        
+        if not user_id or user_type != 'pedagogo':
+            return jsonify({'erro': 'Acesso negado. Apenas pedagogos podem publicar o catálogo'}), 403
+        
+        manifesto = publicar_catalogo(current_app.static_folder)
         
         return jsonify({
             'sucesso': True,
-            'livros': [livro.to_dict() for livro in livros],
-            'total': len(livros)
+            'manifesto': manifesto,
+            'mensagem': 'Catálogo publicado com sucesso'
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
-
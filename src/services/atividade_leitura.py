@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import insert, select
+from src.models.minasle_models import db, AtividadeDiaria, EventoLeitura
+from src.services.conquistas import registrar_atividade
+
+# Os dias de atividade seguem o horário de Brasília (UTC-3, sem horário de
+# verão); ATIVIDADE_FUSO_HORAS no app.config permite outro deslocamento
+FUSO_PADRAO_HORAS = -3
+
+def _fuso():
+    horas = FUSO_PADRAO_HORAS
+    if has_app_context():
+        horas = current_app.config.get('ATIVIDADE_FUSO_HORAS', FUSO_PADRAO_HORAS)
+    return timedelta(hours=horas)
+
+def dia_local(momento):
+    """Dia do calendário local de um momento em UTC"""
+    return (momento + _fuso()).date()
+
+def hoje():
+    return dia_local(datetime.utcnow())
+
+def registrar_eventos(connection, eventos):
+    """Grava um lote de eventos de leitura e soma os totais diários de cada usuário
+
+    Recebe tuplas (usuario_id, livro_id, momento, paginas, segundos). Os
+    eventos entram com uma única inserção em lote e cada par (usuário, dia)
+    recebe uma única atualização, na mesma transação, assim como os
+    contadores de sequência e tempo das conquistas.
+    """
+    eventos = list(eventos)
+    if not eventos:
+        return
+
+    connection.execute(insert(EventoLeitura.__table__), [
+        {'usuario_id': usuario_id, 'livro_id': livro_id, 'momento': momento,
+         'paginas': paginas, 'segundos': segundos}
+        for usuario_id, livro_id, momento, paginas, segundos in eventos
+    ])
+
+    totais = defaultdict(lambda: [0, 0, 0])
+    for usuario_id, _, momento, paginas, segundos in eventos:
+        total = totais[(usuario_id, dia_local(momento))]
+        total[0] += paginas
+        total[1] += segundos
+        total[2] += 1
+    connection.exec_driver_sql(
+        'INSERT INTO atividade_diaria (usuario_id, dia, paginas, segundos, eventos) VALUES (?, ?, ?, ?, ?) '
+        'ON CONFLICT (usuario_id, dia) DO UPDATE SET paginas = paginas + excluded.paginas, '
+        'segundos = segundos + excluded.segundos, eventos = eventos + excluded.eventos',
+        [(usuario_id, dia.isoformat(), *total) for (usuario_id, dia), total in totais.items()]
+    )
+    registrar_atividade(connection, {chave: total[1] for chave, total in totais.items()})
+
+def calendario(usuario_id, inicio, fim):
+    """Totais diários do usuário entre inicio e fim (inclusive), só dos dias com atividade"""
+    return AtividadeDiaria.query.filter(
+        AtividadeDiaria.usuario_id == usuario_id,
+        AtividadeDiaria.dia >= inicio,
+        AtividadeDiaria.dia <= fim
+    ).order_by(AtividadeDiaria.dia).all()
+
+def sequencia_atual(usuario_id, referencia=None):
+    """Dias seguidos com atividade até hoje
+
+    Sem atividade hoje, a sequência que terminou ontem continua valendo até
+    o fim do dia. Lê só os dias da própria sequência, do mais recente para trás.
+    """
+    referencia = referencia or hoje()
+    esperado = referencia
+    sequencia = 0
+    dias = db.session.execute(
+        select(AtividadeDiaria.dia)
+        .where(AtividadeDiaria.usuario_id == usuario_id, AtividadeDiaria.dia <= referencia)
+        .order_by(AtividadeDiaria.dia.desc())
+    ).scalars()
+    for dia in dias:
+        if sequencia == 0 and dia == referencia - timedelta(days=1):
+            esperado = dia
+        if dia != esperado:
+            break
+        sequencia += 1
+        esperado = dia - timedelta(days=1)
+    return sequencia
+
+def maior_sequencia(usuario_id):
+    """Maior sequência de dias seguidos com atividade já alcançada pelo usuário"""
+    maior = atual = 0
+    anterior = None
+    dias = db.session.execute(
+        select(AtividadeDiaria.dia)
+        .where(AtividadeDiaria.usuario_id == usuario_id)
+        .order_by(AtividadeDiaria.dia)
+    ).scalars()
+    for dia in dias:
+        atual = atual + 1 if anterior is not None and dia - anterior == timedelta(days=1) else 1
+        maior = max(maior, atual)
+        anterior = dia
+    return maior
@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, AtividadeGamificacao, BackfillConquista, Usuario
+from src.services.carregamento import TAMANHO_BLOCO_IDS
+from src.services.conquistas import CONTADORES_POR_TIPO
+
+logger = logging.getLogger(__name__)
+
+# Faixa de usuario_id coberta por transação: cada lote segura a escrita do
+# SQLite só pelo tempo de uma inserção curta, e a pausa entre lotes deixa
+# as requisições gravarem
+TAMANHO_LOTE = 5000
+PAUSA_ENTRE_LOTES_S = 0.01
+
+# Onde está cada contador das regras: (tabela, coluna, multiplicador do limite)
+FONTES_CONTADORES = {
+    'leituras_completas': ('usuarios_estatisticas', 'leituras_completas', 1),
+    'livros_regionais_completos': ('usuarios_estatisticas', 'livros_regionais_completos', 1),
+    'clubes': ('usuarios_contadores', 'clubes', 1),
+    'maior_sequencia': ('usuarios_contadores', 'maior_sequencia', 1),
+    'minutos_leitura': ('usuarios_contadores', 'segundos_leitura', 60)
+}
+
+# Origens de uma concessão em lote: (FROM ... WHERE com os parâmetros, coluna do usuário)
+ORIGENS_LOTE = {
+    'usuarios': ("usuarios WHERE id IN ({marcadores}) AND tipo_usuario = 'aluno'", 'id'),
+    'escola': ("usuarios WHERE escola_id = ? AND tipo_usuario = 'aluno'", 'id'),
+    'clube': (
+        'membros_clube JOIN usuarios ON usuarios.id = membros_clube.usuario_id '
+        "WHERE membros_clube.clube_id = ? AND usuarios.tipo_usuario = 'aluno'",
+        'membros_clube.usuario_id'
+    )
+}
+
+_executando = set()
+_trava = threading.Lock()
+
+def _conceder_lote(connection, atividade_id, fonte, limite, inicio, fim, momento):
+    """Concede a atividade aos alunos de (inicio, fim] que cumprem a regra; retorna quantos ganharam"""
+    tabela, coluna, multiplicador = fonte
+    resultado = connection.exec_driver_sql(
+        f'INSERT INTO conquistas_usuario (usuario_id, atividade_id, data_conquista) '
+        f'SELECT f.usuario_id, ?, ? FROM {tabela} AS f JOIN usuarios ON usuarios.id = f.usuario_id '
+        f"WHERE f.usuario_id > ? AND f.usuario_id <= ? AND f.{coluna} >= ? AND usuarios.tipo_usuario = 'aluno' "
+        f'ON CONFLICT (usuario_id, atividade_id) DO NOTHING',
+        (atividade_id, momento, inicio, fim, limite * multiplicador)
+    )
+    return max(resultado.rowcount, 0)
+
+def executar_backfill(atividade_id, tamanho_lote=TAMANHO_LOTE, ao_progredir=None):
+    """Concede a atividade a quem já cumpre a regra, retomando do último lote gravado
+
+    Cada lote é uma inserção em conjunto sobre uma faixa de usuario_id,
+    confirmada junto com o cursor em conquistas_backfill; se o processo cair,
+    a próxima execução continua da faixa seguinte. `ao_progredir` recebe o
+    dicionário de progresso depois de cada lote. Retorna o progresso final.
+    """
+    with _trava:
+        if atividade_id in _executando:
+            return None
+        _executando.add(atividade_id)
+
+    try:
+        with Session(db.engine) as sessao:
+            progresso = sessao.get(BackfillConquista, atividade_id)
+            if progresso is None:
+                progresso = BackfillConquista(atividade_id=atividade_id, ultimo_usuario_id=0, concedidas=0)
+                sessao.add(progresso)
+            try:
+                _executar(sessao, progresso, tamanho_lote, ao_progredir)
+            except Exception as e:
+                logger.exception('Falha na concessão retroativa da atividade %s', atividade_id)
+                sessao.rollback()
+                sessao.add(progresso)
+                progresso.status = 'falhou'
+                progresso.erro = str(e)
+                progresso.atualizado_em = datetime.utcnow()
+                sessao.commit()
+            return progresso.to_dict()
+    finally:
+        with _trava:
+            _executando.discard(atividade_id)
+
+def _executar(sessao, progresso, tamanho_lote, ao_progredir):
+    atividade = sessao.get(AtividadeGamificacao, progresso.atividade_id)
+    fonte = FONTES_CONTADORES.get(CONTADORES_POR_TIPO.get(atividade.tipo)) if atividade else None
+    agora = datetime.utcnow()
+    progresso.status = 'executando'
+    progresso.erro = None
+    progresso.iniciado_em = progresso.iniciado_em or agora
+    progresso.atualizado_em = agora
+    progresso.maior_usuario_id = sessao.execute(select(func.max(Usuario.id))).scalar() or 0
+    sessao.commit()
+
+    # Tipos sem regra automática só são concedidos manualmente
+    if fonte is not None:
+        while progresso.ultimo_usuario_id < progresso.maior_usuario_id:
+            inicio = progresso.ultimo_usuario_id
+            fim = min(inicio + tamanho_lote, progresso.maior_usuario_id)
+            progresso.concedidas += _conceder_lote(
+                sessao.connection(), atividade.id, fonte, atividade.limite, inicio, fim, agora
+            )
+            progresso.ultimo_usuario_id = fim
+            progresso.atualizado_em = datetime.utcnow()
+            sessao.commit()
+            if ao_progredir:
+                ao_progredir(progresso.to_dict())
+            time.sleep(PAUSA_ENTRE_LOTES_S)
+
+    progresso.status = 'concluido'
+    progresso.ultimo_usuario_id = progresso.maior_usuario_id
+    progresso.concluido_em = datetime.utcnow()
+    sessao.commit()
+
+def reiniciar_backfill(atividade_id):
+    """Volta o cursor ao início, para reaplicar a regra depois de a atividade mudar"""
+    progresso = db.session.get(BackfillConquista, atividade_id)
+    if progresso is None:
+        progresso = BackfillConquista(atividade_id=atividade_id)
+        db.session.add(progresso)
+    progresso.status = 'pendente'
+    progresso.ultimo_usuario_id = 0
+    progresso.concedidas = 0
+    progresso.erro = None
+    progresso.iniciado_em = progresso.concluido_em = None
+    return progresso
+
+def iniciar_backfill(app, atividade_id):
+    """Roda a concessão retroativa em segundo plano (ou na hora, se configurado)
+
+    CONQUISTAS_BACKFILL_SEGUNDO_PLANO no app.config desliga a thread; útil em
+    scripts e testes.
+    """
+    if not app.config.get('CONQUISTAS_BACKFILL_SEGUNDO_PLANO', True):
+        return executar_backfill(atividade_id)
+
+    def executar():
+        with app.app_context():
+            executar_backfill(atividade_id)
+
+    threading.Thread(target=executar, daemon=True).start()
+
+def backfills_pendentes():
+    """Ids das atividades com concessão retroativa não concluída"""
+    return db.session.execute(
+        select(BackfillConquista.atividade_id).where(BackfillConquista.status != 'concluido')
+        .order_by(BackfillConquista.atividade_id)
+    ).scalars().all()
+
+def conceder_em_lote(connection, atividade_id, origem, valores):
+    """Concede a atividade a todos os alunos de uma origem, na transação da conexão
+
+    `origem` é 'usuarios' (valores: lista de ids), 'escola' ou 'clube'
+    (valores: [id]). Cada bloco é uma única inserção que ignora quem já tem a
+    conquista. Retorna (candidatos, concedidas, excluidos), onde excluidos são
+    os ids da lista que existem mas não são de alunos.
+    """
+    de, coluna = ORIGENS_LOTE[origem]
+    valores = sorted(set(valores))
+    tamanho = TAMANHO_BLOCO_IDS if origem == 'usuarios' else len(valores)
+    agora = datetime.utcnow()
+    candidatos = concedidas = 0
+    excluidos = []
+    for inicio in range(0, len(valores), tamanho):
+        bloco = tuple(valores[inicio:inicio + tamanho])
+        marcadores = ', '.join('?' * len(bloco))
+        filtro = de.format(marcadores=marcadores)
+        candidatos += connection.exec_driver_sql(f'SELECT count(*) FROM {filtro}', bloco).scalar()
+        concedidas += max(connection.exec_driver_sql(
+            f'INSERT INTO conquistas_usuario (usuario_id, atividade_id, data_conquista) '
+            f'SELECT {coluna}, ?, ? FROM {filtro} ON CONFLICT (usuario_id, atividade_id) DO NOTHING',
+            (atividade_id, agora, *bloco)
+        ).rowcount, 0)
+        if origem == 'usuarios':
+            excluidos += connection.exec_driver_sql(
+                f"SELECT id FROM usuarios WHERE id IN ({marcadores}) AND tipo_usuario != 'aluno' ORDER BY id", bloco
+            ).scalars().all()
+    return candidatos, concedidas, excluidos
@@ -0,0 +1,272 @@
+import math
+import re
+from collections import Counter
+from sqlalchemy import DDL, delete, event, func, select, text
+from src.models.minasle_models import db, FrequenciaTrigrama, Livro, LivroNormalizado, TrigramaLivro
+from src.services.texto import normalizar, trigramas
+
+# Índice FTS5 de conteúdo externo: o texto fica apenas na tabela livros e o
+# índice guarda só os tokens, mantidos em sincronia pelos triggers abaixo.
+_DDL_INDICE_BUSCA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS livros_fts USING fts5(
+        titulo, autor, genero, descricao,
+        content='livros', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS livros_fts_ai AFTER INSERT ON livros BEGIN
+        INSERT INTO livros_fts(rowid, titulo, autor, genero, descricao)
+        VALUES (new.id, new.titulo, new.autor, new.genero, new.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS livros_fts_ad AFTER DELETE ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, titulo, autor, genero, descricao)
+        VALUES ('delete', old.id, old.titulo, old.autor, old.genero, old.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS livros_fts_au AFTER UPDATE ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, titulo, autor, genero, descricao)
+        VALUES ('delete', old.id, old.titulo, old.autor, old.genero, old.descricao);
+        INSERT INTO livros_fts(rowid, titulo, autor, genero, descricao)
+        VALUES (new.id, new.titulo, new.autor, new.genero, new.descricao);
+    END
+    """,
+]
+
+# Pesos do bm25 na ordem das colunas: título pesa mais que autor, que pesa
+# mais que gênero e descrição.
+_PESOS_BM25 = '10.0, 5.0, 2.0, 1.0'
+
+def _criar_indice_busca(target, connection, **kw):
+    """Cria o índice FTS5 e seus triggers, reconstruindo-o se estiver vazio"""
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for ddl in _DDL_INDICE_BUSCA:
+        connection.execute(DDL(ddl))
+
+    # Bancos criados antes do índice já têm livros cadastrados
+    indexados = connection.execute(text('SELECT COUNT(*) FROM livros_fts_docsize')).scalar()
+    cadastrados = connection.execute(text('SELECT COUNT(*) FROM livros')).scalar()
+    if indexados != cadastrados:
+        connection.execute(text("INSERT INTO livros_fts(livros_fts) VALUES ('rebuild')"))
+
+event.listen(db.metadata, 'after_create', _criar_indice_busca)
+
+def montar_consulta_fts(termos):
+    """Converte o texto digitado em uma expressão MATCH segura com prefixos"""
+    palavras = re.findall(r'\w+', termos or '')
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def subconsulta_busca(termos):
+    """Retorna uma subconsulta (rowid, rank) com os livros que casam com os termos
+
+    O rank é o bm25 do FTS5: quanto menor, mais relevante.
+    """
+    consulta = montar_consulta_fts(termos)
+    if not consulta:
+        return None
+
+    return text(
+        f'SELECT rowid, bm25(livros_fts, {_PESOS_BM25}) AS rank '
+        'FROM livros_fts WHERE livros_fts MATCH :consulta'
+    ).bindparams(consulta=consulta)\
+     .columns(rowid=db.Integer, rank=db.Float)\
+     .subquery('busca')
+
+def buscar_livros(query, termos):
+    """Restringe a query de Livro aos resultados da busca
+
+    Retorna a query e a coluna de relevância, para ordenar os resultados.
+    """
+    busca = subconsulta_busca(termos)
+    if busca is None:
+        return query.filter(db.false()), db.literal(0.0)
+
+    return query.join(busca, Livro.id == busca.c.rowid), busca.c.rank
+
+def ids_busca_textual(termos):
+    """Seleção dos ids que casam com os termos, para combinar a busca textual com outros filtros"""
+    busca = subconsulta_busca(termos)
+    if busca is None:
+        return select(Livro.id).where(db.false())
+    return select(busca.c.rowid)
+
+# Busca aproximada: título e autor normalizados e indexados por trigramas
+
+# Limite de postagens lidas para gerar candidatos, e de candidatos conferidos
+ORCAMENTO_POSTAGENS = 20000
+MAXIMO_CANDIDATOS = 1000
+
+def indexar_livros(connection, livros, novos=False):
+    """Atualiza a representação normalizada e os trigramas dos livros informados
+
+    Recebe tuplas (id, titulo, autor) e pode ser usada tanto pelos eventos do
+    ORM quanto por inserções em lote, que não disparam esses eventos. As
+    escritas vão direto ao driver, pois em lotes grandes o processamento de
+    parâmetros do SQLAlchemy custaria mais que o próprio banco. Com
+    `novos=True` a remoção das entradas anteriores é pulada.
+    """
+    livros = list(livros)
+    if not livros:
+        return
+
+    if not novos:
+        remover_do_indice(connection, [livro_id for livro_id, _, _ in livros])
+
+    normalizados = []
+    postagens = []
+    frequencias = Counter()
+    for livro_id, titulo, autor in livros:
+        titulo_normalizado = normalizar(titulo)
+        autor_normalizado = normalizar(autor)
+        conjunto = trigramas(f'{titulo_normalizado} {autor_normalizado}')
+        normalizados.append((livro_id, titulo_normalizado, autor_normalizado, len(conjunto)))
+        postagens.extend((t, livro_id) for t in conjunto)
+        frequencias.update(conjunto)
+
+    connection.exec_driver_sql(
+        'INSERT INTO livros_normalizados (livro_id, titulo, autor, total_trigramas) VALUES (?, ?, ?, ?)',
+        normalizados
+    )
+    if postagens:
+        connection.exec_driver_sql('INSERT INTO livros_trigramas (trigrama, livro_id) VALUES (?, ?)', postagens)
+        connection.exec_driver_sql(
+            'INSERT INTO trigramas_frequencia (trigrama, livros) VALUES (?, ?) '
+            'ON CONFLICT (trigrama) DO UPDATE SET livros = livros + excluded.livros',
+            list(frequencias.items())
+        )
+
+def remover_do_indice(connection, ids):
+    """Remove livros da representação normalizada e do índice de trigramas"""
+    removidas = connection.execute(
+        select(TrigramaLivro.trigrama, func.count())
+        .where(TrigramaLivro.livro_id.in_(ids))
+        .group_by(TrigramaLivro.trigrama)
+    ).all()
+    if removidas:
+        connection.exec_driver_sql(
+            'UPDATE trigramas_frequencia SET livros = livros - ? WHERE trigrama = ?',
+            [(quantidade, trigrama) for trigrama, quantidade in removidas]
+        )
+        # Trigramas que nenhum livro contém mais saem da tabela
+        connection.exec_driver_sql(
+            'DELETE FROM trigramas_frequencia WHERE trigrama = ? AND livros <= 0',
+            [(trigrama,) for trigrama, _ in removidas]
+        )
+        connection.execute(delete(TrigramaLivro.__table__).where(TrigramaLivro.livro_id.in_(ids)))
+    connection.execute(delete(LivroNormalizado.__table__).where(LivroNormalizado.livro_id.in_(ids)))
+
+@event.listens_for(Livro, 'after_insert')
+def _indexar_livro_inserido(mapper, connection, livro):
+    indexar_livros(connection, [(livro.id, livro.titulo, livro.autor)], novos=True)
+
+@event.listens_for(Livro, 'after_update')
+def _indexar_livro_atualizado(mapper, connection, livro):
+    estado = db.inspect(livro)
+    if estado.attrs.titulo.history.has_changes() or estado.attrs.autor.history.has_changes():
+        indexar_livros(connection, [(livro.id, livro.titulo, livro.autor)])
+
+@event.listens_for(Livro, 'after_delete')
+def _remover_livro_do_indice(mapper, connection, livro):
+    remover_do_indice(connection, [livro.id])
+
+def _criar_indice_aproximado(target, connection, **kw):
+    """Popula o índice de trigramas de bancos criados antes dele existir"""
+    indexados = connection.execute(select(func.count()).select_from(LivroNormalizado.__table__)).scalar()
+    cadastrados = connection.execute(select(func.count()).select_from(Livro.__table__)).scalar()
+    com_frequencias = connection.execute(select(FrequenciaTrigrama.trigrama).limit(1)).first() is not None
+    if indexados == cadastrados and (com_frequencias or not cadastrados):
+        return
+
+    connection.execute(delete(TrigramaLivro.__table__))
+    connection.execute(delete(FrequenciaTrigrama.__table__))
+    connection.execute(delete(LivroNormalizado.__table__))
+    livros = connection.execute(select(Livro.id, Livro.titulo, Livro.autor))
+    indexar_livros(connection, [tuple(linha) for linha in livros], novos=True)
+
+event.listen(db.metadata, 'after_create', _criar_indice_aproximado)
+
+def _gerar_candidatos(consulta, similaridade_minima, filtros=()):
+    """Escolhe os livros a conferir a partir dos trigramas mais raros da busca
+
+    Um livro com similaridade s tem pelo menos ceil(s * |Q|) dos |Q| trigramas
+    da busca, então contém algum dos |Q| - ceil(s * |Q|) + 1 mais raros. Ler
+    só as listas desses trigramas encontra todos os resultados possíveis; o
+    orçamento de postagens corta os mais comuns quando nem isso é barato.
+    Os `filtros` restringem os candidatos antes do corte em MAXIMO_CANDIDATOS.
+    """
+    frequencias = dict(db.session.execute(
+        select(FrequenciaTrigrama.trigrama, FrequenciaTrigrama.livros)
+        .where(FrequenciaTrigrama.trigrama.in_(consulta))
+    ).all())
+    ordenados = sorted(consulta, key=lambda t: frequencias.get(t, 0))
+    necessarios = len(consulta) - math.ceil(similaridade_minima * len(consulta)) + 1
+
+    geradores = []
+    postagens = 0
+    for trigrama in ordenados[:max(necessarios, 1)]:
+        frequencia = frequencias.get(trigrama, 0)
+        if not frequencia:
+            continue
+        if geradores and postagens + frequencia > ORCAMENTO_POSTAGENS:
+            break
+        geradores.append(trigrama)
+        postagens += frequencia
+
+    if not geradores:
+        return []
+
+    candidatos = select(TrigramaLivro.livro_id).where(TrigramaLivro.trigrama.in_(geradores))
+    if filtros:
+        candidatos = candidatos.join(Livro, Livro.id == TrigramaLivro.livro_id)\
+                               .join(LivroNormalizado, LivroNormalizado.livro_id == TrigramaLivro.livro_id)\
+                               .where(*filtros)
+    return db.session.execute(
+        candidatos
+        .group_by(TrigramaLivro.livro_id)
+        .order_by(func.count().desc(), TrigramaLivro.livro_id)
+        .limit(MAXIMO_CANDIDATOS)
+    ).scalars().all()
+
+def busca_aproximada(termos, limite=20, similaridade_minima=0.3, filtros=()):
+    """Retorna [(livro_id, similaridade, desempate)] dos livros mais parecidos com os termos
+
+    A similaridade é a fração dos trigramas da busca presentes no título ou
+    autor, como o word_similarity do pg_trgm; o desempate é o Jaccard, que
+    favorece textos mais curtos. `filtros` são condições sobre Livro e
+    LivroNormalizado aplicadas já na escolha dos candidatos; `limite=None`
+    devolve todos os resultados. O custo depende das listas invertidas
+    lidas, não do catálogo.
+    """
+    consulta = trigramas(normalizar(termos))
+    if not consulta:
+        return []
+
+    candidatos = _gerar_candidatos(consulta, similaridade_minima, filtros)
+    if not candidatos:
+        return []
+
+    comuns_por_livro = db.session.execute(
+        select(
+            TrigramaLivro.livro_id,
+            func.count().label('comuns'),
+            LivroNormalizado.total_trigramas
+        ).join(LivroNormalizado, LivroNormalizado.livro_id == TrigramaLivro.livro_id)
+         .where(TrigramaLivro.livro_id.in_(candidatos), TrigramaLivro.trigrama.in_(consulta))
+         .group_by(TrigramaLivro.livro_id)
+    )
+
+    resultados = []
+    for livro_id, comuns, total in comuns_por_livro:
+        similaridade = comuns / len(consulta)
+        if similaridade >= similaridade_minima:
+            jaccard = comuns / (len(consulta) + total - comuns)
+            resultados.append((livro_id, round(similaridade, 4), round(jaccard, 4)))
+
+    resultados.sort(key=lambda r: (-r[1], -r[2], r[0]))
+    return resultados if limite is None else resultados[:limite]
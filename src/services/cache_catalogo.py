@@ -0,0 +1,113 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import make_response, request
+from src.services.estatisticas_livros import ao_alterar_popularidade
+from src.services.eventos_catalogo import ao_alterar_catalogo
+
+TAMANHO_MAXIMO = 512
+
+class CacheCatalogo:
+    """Respostas do catálogo já serializadas, válidas enquanto nenhum livro mudar
+
+    Cada entrada guarda a versão do catálogo em que foi gerada; qualquer
+    commit que altere livros incrementa a versão e invalida todas de uma vez.
+    Respostas que dependem dos contadores de leitura guardam também a versão
+    da popularidade, incrementada a cada commit que altera esses contadores,
+    sem afetar as demais entradas.
+    """
+
+    def __init__(self, tamanho_maximo=TAMANHO_MAXIMO):
+        self._trava = threading.Lock()
+        self._entradas = OrderedDict()
+        self._tamanho_maximo = tamanho_maximo
+        self.versao = 0
+        self.versao_popularidade = 0
+
+    def versao_atual(self, popularidade=False):
+        return self.versao, self.versao_popularidade if popularidade else 0
+
+    def invalidar(self):
+        with self._trava:
+            self.versao += 1
+            self._entradas.clear()
+
+    def invalidar_popularidade(self):
+        with self._trava:
+            self.versao_popularidade += 1
+
+    def obter(self, chave, versao):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] != versao:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada
+
+    def guardar(self, chave, versao, corpo, etag, popularidade=False):
+        with self._trava:
+            # Uma escrita no catálogo durante a geração torna a resposta obsoleta
+            if versao != self.versao_atual(popularidade):
+                return
+            self._entradas[chave] = (versao, corpo, etag)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self._tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+cache_catalogo = CacheCatalogo()
+
+@ao_alterar_catalogo
+def _invalidar_cache_catalogo(alterados):
+    cache_catalogo.invalidar()
+
+@ao_alterar_popularidade
+def _invalidar_cache_popularidade(livros):
+    cache_catalogo.invalidar_popularidade()
+
+def _responder(corpo, etag):
+    if request.if_none_match.contains(etag):
+        resposta = make_response('', 304)
+    else:
+        resposta = make_response(corpo, 200)
+        resposta.mimetype = 'application/json'
+    resposta.set_etag(etag)
+    # O navegador pode guardar a resposta, mas deve revalidá-la a cada uso
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def com_cache_catalogo(view=None, popularidade=None):
+    """Serve a resposta do cache e responde 304 quando o cliente já tem a versão atual
+
+    A chave inclui o caminho e todos os parâmetros da query string, de modo
+    que filtros, ordenação e cursores diferentes têm entradas próprias. Só
+    respostas 200 são guardadas.
+
+    `popularidade` recebe os parâmetros da requisição e indica as respostas
+    que dependem também dos contadores de leitura dos livros; essas valem
+    só até o próximo commit que altere os contadores.
+    """
+    if view is None:
+        return lambda view: com_cache_catalogo(view, popularidade)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        depende_popularidade = popularidade is not None and popularidade(request.args)
+        chave = (request.path, tuple(sorted(request.args.items(multi=True))))
+        versao = cache_catalogo.versao_atual(depende_popularidade)
+
+        entrada = cache_catalogo.obter(chave, versao)
+        if entrada is not None:
+            _, corpo, etag = entrada
+            return _responder(corpo, etag)
+
+        resposta = make_response(view(*args, **kwargs))
+        if resposta.status_code != 200:
+            return resposta
+
+        corpo = resposta.get_data()
+        etag = hashlib.sha256(corpo).hexdigest()[:32]
+        cache_catalogo.guardar(chave, versao, corpo, etag, depende_popularidade)
+        return _responder(corpo, etag)
+
+    return wrapper
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from src.models.minasle_models import db, AtividadeGamificacao, ConquistaUsuario
+from src.services.paginacao import ParametroInvalido
+
+# Limite de ids por consulta IN, abaixo do máximo de parâmetros do SQLite
+TAMANHO_BLOCO_IDS = 500
+
+def carregar_por_id(modelo, ids):
+    """Busca as linhas de `modelo` com os ids informados; retorna {id: objeto}
+
+    Uma consulta IN por bloco de ids, qualquer que seja o tamanho da lista,
+    no lugar de um `Modelo.query.get` por item.
+    """
+    ids = sorted({i for i in ids if i is not None})
+    objetos = {}
+    for inicio in range(0, len(ids), TAMANHO_BLOCO_IDS):
+        bloco = ids[inicio:inicio + TAMANHO_BLOCO_IDS]
+        for objeto in modelo.query.filter(modelo.id.in_(bloco)):
+            objetos[objeto.id] = objeto
+    return objetos
+
+def anexar_relacionado(itens, dicionarios, nome, modelo, chave_estrangeira):
+    """Inclui em cada dicionário o objeto relacionado (`to_dict`) sob a chave `nome`
+
+    `itens` e `dicionarios` andam em paralelo; o id do relacionado vem do
+    atributo `chave_estrangeira` de cada item.
+    """
+    relacionados = carregar_por_id(modelo, (getattr(item, chave_estrangeira) for item in itens))
+    for item, dicionario in zip(itens, dicionarios):
+        relacionado = relacionados.get(getattr(item, chave_estrangeira))
+        if relacionado is not None:
+            dicionario[nome] = relacionado.to_dict()
+
+def carregar_conquistas(usuario_ids):
+    """Conquistas dos usuários com os dados da atividade, em uma única consulta
+
+    Retorna {usuario_id: [conquista]}.
+    """
+    usuario_ids = sorted(set(usuario_ids))
+    conquistas = defaultdict(list)
+    for inicio in range(0, len(usuario_ids), TAMANHO_BLOCO_IDS):
+        bloco = usuario_ids[inicio:inicio + TAMANHO_BLOCO_IDS]
+        linhas = db.session.query(ConquistaUsuario, AtividadeGamificacao)\
+                           .join(AtividadeGamificacao)\
+                           .filter(ConquistaUsuario.usuario_id.in_(bloco))\
+                           .order_by(ConquistaUsuario.usuario_id, ConquistaUsuario.atividade_id)
+        for conquista, atividade in linhas:
+            conquista_dict = conquista.to_dict()
+            conquista_dict['atividade'] = atividade.to_dict()
+            conquistas[conquista.usuario_id].append(conquista_dict)
+    return conquistas
+
+def ler_inclusoes(args, disponiveis, padrao=()):
+    """Lê `include` da query string: relações a anexar aos itens da resposta
+
+    Sem o parâmetro valem as relações de `padrao`; `include=` vazio não
+    inclui nenhuma.
+    """
+    valor = args.get('include')
+    if valor is None:
+        return set(padrao)
+
+    inclusoes = {nome.strip() for nome in valor.split(',') if nome.strip()}
+    invalidas = inclusoes - set(disponiveis)
+    if invalidas:
+        raise ParametroInvalido(f"include inválido: {', '.join(sorted(invalidas))}. Use: {', '.join(disponiveis)}")
+    return inclusoes
+
+def ler_campos(args):
+    """Lê `fields` da query string: campos a manter em cada item
+
+    `fields=id,progresso,livro.titulo` mantém id e progresso do item e só o
+    título do livro incluído. Retorna {relacao ou None: campos}, ou None
+    quando o parâmetro não foi enviado.
+    """
+    valor = args.get('fields')
+    if valor is None:
+        return None
+
+    campos = defaultdict(set)
+    for campo in valor.split(','):
+        campo = campo.strip()
+        if not campo:
+            continue
+        relacao, _, nome = campo.rpartition('.')
+        campos[relacao or None].add(nome)
+    return campos
+
+def aplicar_campos(dicionarios, campos, inclusoes=()):
+    """Remove dos dicionários os campos não pedidos em `fields`
+
+    Relações incluídas continuam na resposta mesmo sem aparecer em `fields`;
+    seus próprios campos são filtrados por `relacao.campo`.
+    """
+    if campos is None:
+        return dicionarios
+
+    principais = campos.get(None)
+    filtrados = []
+    for dicionario in dicionarios:
+        if principais:
+            dicionario = {
+                chave: valor for chave, valor in dicionario.items()
+                if chave in principais or chave in inclusoes
+            }
+        for relacao in inclusoes:
+            if campos.get(relacao) and isinstance(dicionario.get(relacao), dict):
+                dicionario[relacao] = {
+                    chave: valor for chave, valor in dicionario[relacao].items()
+                    if chave in campos[relacao]
+                }
+        filtrados.append(dicionario)
+    return filtrados
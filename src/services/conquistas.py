@@ -0,0 +1,259 @@
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from src.models.minasle_models import (
+    db, AtividadeDiaria, AtividadeGamificacao, ContadoresConquista, EstatisticaUsuario, MembroClube, Usuario
+)
+from src.services.estatisticas_usuarios import ao_alterar_resumo
+
+# Contador comparado com o limite de cada tipo de atividade; em tempo_leitura
+# o limite é em minutos
+CONTADORES_POR_TIPO = {
+    'leitura_completa': 'leituras_completas',
+    'leitura_multipla': 'leituras_completas',
+    'obra_regional': 'livros_regionais_completos',
+    'participacao_clube': 'clubes',
+    'sequencia_leitura': 'maior_sequencia',
+    'tempo_leitura': 'minutos_leitura'
+}
+
+class RegrasConquistas:
+    """Limites de cada contador, lidos das atividades uma vez e mantidos em memória
+
+    Para cada contador, uma lista de (limite, atividade_id) em ordem de limite;
+    avaliar um contador percorre só as regras que ele já alcançou.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._regras = None
+
+    def descartar(self):
+        with self._trava:
+            self._regras = None
+
+    def _carregar(self, connection):
+        regras = defaultdict(list)
+        atividades = connection.execute(
+            select(AtividadeGamificacao.id, AtividadeGamificacao.tipo, AtividadeGamificacao.limite)
+        ).all()
+        for atividade in atividades:
+            contador = CONTADORES_POR_TIPO.get(atividade.tipo)
+            if contador:
+                regras[contador].append((atividade.limite, atividade.id))
+        for lista in regras.values():
+            lista.sort()
+        return regras
+
+    def alcancadas(self, connection, contador, valor):
+        """Ids das atividades do contador cujo limite é no máximo `valor`"""
+        regras = self._regras
+        if regras is None:
+            # Lidas sob a trava: um descarte feito durante a leitura espera por
+            # ela, em vez de ser desfeito por regras já desatualizadas
+            with self._trava:
+                if self._regras is None:
+                    self._regras = self._carregar(connection)
+                regras = self._regras
+        lista = regras.get(contador, [])
+        return [atividade_id for _, atividade_id in lista[:bisect_right(lista, (valor, float('inf')))]]
+
+regras_conquistas = RegrasConquistas()
+
+def conceder_alcancadas(connection, usuario_id, valores):
+    """Concede as conquistas cujos limites os contadores do usuário alcançaram
+
+    Recebe {contador: valor}. Conquistas já concedidas são ignoradas pela
+    própria inserção, sem consultar o histórico do usuário. Como no backfill,
+    só alunos recebem conquistas.
+    """
+    agora = datetime.utcnow()
+    linhas = [
+        (atividade_id, agora, usuario_id)
+        for contador, valor in valores.items()
+        for atividade_id in regras_conquistas.alcancadas(connection, contador, valor or 0)
+    ]
+    if linhas:
+        connection.exec_driver_sql(
+            'INSERT INTO conquistas_usuario (usuario_id, atividade_id, data_conquista) '
+            "SELECT id, ?, ? FROM usuarios WHERE id = ? AND tipo_usuario = 'aluno' "
+            'ON CONFLICT (usuario_id, atividade_id) DO NOTHING',
+            linhas
+        )
+
+def _avaliar_leituras(connection, usuario_id):
+    resumo = connection.execute(
+        select(EstatisticaUsuario.leituras_completas, EstatisticaUsuario.livros_regionais_completos)
+        .where(EstatisticaUsuario.usuario_id == usuario_id)
+    ).first()
+    if resumo is not None:
+        conceder_alcancadas(connection, usuario_id, {
+            'leituras_completas': resumo.leituras_completas,
+            'livros_regionais_completos': resumo.livros_regionais_completos
+        })
+
+def _sequencia_em_torno(connection, usuario_id, dia):
+    """(primeiro, último) dia da sequência de atividade que contém `dia`
+
+    Percorre os dias a partir de `dia` nas duas direções e para no primeiro
+    intervalo; lê só a própria sequência, não o histórico inteiro.
+    """
+    limites = []
+    for passo, condicao, ordem in (
+        (-1, AtividadeDiaria.dia <= dia, AtividadeDiaria.dia.desc()),
+        (1, AtividadeDiaria.dia >= dia, AtividadeDiaria.dia)
+    ):
+        extremo = dia
+        dias = connection.execute(
+            select(AtividadeDiaria.dia).where(AtividadeDiaria.usuario_id == usuario_id, condicao).order_by(ordem)
+        ).scalars()
+        for atual in dias:
+            if atual == extremo or atual == extremo + timedelta(days=passo):
+                extremo = atual
+            else:
+                break
+        dias.close()
+        limites.append(extremo)
+    return limites[0], limites[1]
+
+def registrar_atividade(connection, dias):
+    """Atualiza tempo de leitura e sequências com os dias de atividade de um lote de eventos
+
+    Recebe {(usuario_id, dia): segundos}, com os dias já gravados em
+    atividade_diaria. Um dia seguinte ao último estende a sequência e um dia
+    mais distante recomeça; um dia anterior ao último (sincronização atrasada)
+    relê só a sequência que passa por ele.
+    """
+    por_usuario = defaultdict(dict)
+    for (usuario_id, dia), segundos in dias.items():
+        por_usuario[usuario_id][dia] = segundos
+    if not por_usuario:
+        return
+
+    tabela = ContadoresConquista.__table__
+    contadores = {
+        linha.usuario_id: linha
+        for linha in connection.execute(select(tabela).where(tabela.c.usuario_id.in_(list(por_usuario))))
+    }
+    for usuario_id, segundos_por_dia in por_usuario.items():
+        atual = contadores.get(usuario_id)
+        if atual is None:
+            continue
+        sequencia, maior, ultimo = atual.sequencia_atual, atual.maior_sequencia, atual.ultimo_dia
+        for dia in sorted(segundos_por_dia):
+            if ultimo is not None and dia < ultimo:
+                # Um dia atrasado pode unir duas sequências já gravadas
+                inicio, fim = _sequencia_em_torno(connection, usuario_id, dia)
+                maior = max(maior, (fim - inicio).days + 1)
+                if fim == ultimo:
+                    sequencia = (fim - inicio).days + 1
+                continue
+            if dia == ultimo:
+                continue
+            sequencia = sequencia + 1 if ultimo is not None and dia - ultimo == timedelta(days=1) else 1
+            maior = max(maior, sequencia)
+            ultimo = dia
+        segundos = atual.segundos_leitura + sum(segundos_por_dia.values())
+
+        connection.execute(
+            update(tabela).where(tabela.c.usuario_id == usuario_id)
+            .values(segundos_leitura=segundos, sequencia_atual=sequencia, maior_sequencia=maior, ultimo_dia=ultimo)
+        )
+        conceder_alcancadas(connection, usuario_id, {'maior_sequencia': maior, 'minutos_leitura': segundos // 60})
+
+def recalcular_contadores(connection):
+    """Recalcula os contadores de todos os usuários a partir de clubes e atividade diária"""
+    tabela = ContadoresConquista.__table__
+    connection.execute(delete(tabela))
+    clubes = (
+        select(func.count()).where(MembroClube.usuario_id == Usuario.id).scalar_subquery()
+    )
+    segundos = (
+        select(func.coalesce(func.sum(AtividadeDiaria.segundos), 0))
+        .where(AtividadeDiaria.usuario_id == Usuario.id).scalar_subquery()
+    )
+    connection.execute(
+        insert(tabela).from_select(['usuario_id', 'clubes', 'segundos_leitura'], select(Usuario.id, clubes, segundos))
+    )
+
+    # Sequências: um único percurso pelos dias de atividade, em ordem
+    sequencias = {}
+    dias = connection.execute(
+        select(AtividadeDiaria.usuario_id, AtividadeDiaria.dia)
+        .order_by(AtividadeDiaria.usuario_id, AtividadeDiaria.dia)
+    )
+    for usuario_id, dia in dias:
+        sequencia, maior, ultimo = sequencias.get(usuario_id, (0, 0, None))
+        sequencia = sequencia + 1 if ultimo is not None and dia - ultimo == timedelta(days=1) else 1
+        sequencias[usuario_id] = (sequencia, max(maior, sequencia), dia)
+    if sequencias:
+        connection.exec_driver_sql(
+            'UPDATE usuarios_contadores SET sequencia_atual = ?, maior_sequencia = ?, ultimo_dia = ? WHERE usuario_id = ?',
+            [(sequencia, maior, ultimo.isoformat(), usuario_id) for usuario_id, (sequencia, maior, ultimo) in sequencias.items()]
+        )
+
+def reparar_contadores():
+    """Recalcula os contadores das conquistas e retorna quantos usuários foram gravados"""
+    recalcular_contadores(db.session.connection())
+    db.session.commit()
+    return db.session.query(func.count(ContadoresConquista.usuario_id)).scalar()
+
+@event.listens_for(Usuario, 'after_insert')
+def _criar_contadores_usuario(mapper, connection, usuario):
+    connection.execute(insert(ContadoresConquista.__table__), {'usuario_id': usuario.id})
+
+@event.listens_for(Usuario, 'after_delete')
+def _remover_contadores_usuario(mapper, connection, usuario):
+    connection.execute(delete(ContadoresConquista.__table__).where(ContadoresConquista.usuario_id == usuario.id))
+
+@ao_alterar_resumo
+def _avaliar_resumo(connection, usuario_id, variacao, total_leituras):
+    # Só conclusões novas, inclusive de livros que passaram a ser regionais,
+    # podem alcançar um limite de leituras
+    if variacao['leituras_completas'] > 0 or variacao['livros_regionais_completos'] > 0:
+        _avaliar_leituras(connection, usuario_id)
+
+def _ajustar_clubes(connection, usuario_id, variacao):
+    tabela = ContadoresConquista.__table__
+    return connection.execute(
+        update(tabela).where(tabela.c.usuario_id == usuario_id)
+        .values(clubes=tabela.c.clubes + variacao).returning(tabela.c.clubes)
+    ).scalar()
+
+@event.listens_for(MembroClube, 'after_insert')
+def _avaliar_entrada_clube(mapper, connection, membro):
+    clubes = _ajustar_clubes(connection, membro.usuario_id, 1)
+    if clubes is not None:
+        conceder_alcancadas(connection, membro.usuario_id, {'clubes': clubes})
+
+@event.listens_for(MembroClube, 'after_delete')
+def _descontar_saida_clube(mapper, connection, membro):
+    _ajustar_clubes(connection, membro.usuario_id, -1)
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_atividades_alteradas(session, flush_context):
+    if any(isinstance(obj, AtividadeGamificacao) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['regras_conquistas_alteradas'] = True
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_atividades_alteradas(session):
+    # As regras podem ter sido lidas com as alterações que foram desfeitas
+    if session.info.pop('regras_conquistas_alteradas', False):
+        regras_conquistas.descartar()
+
+@event.listens_for(Session, 'after_commit')
+def _recarregar_regras(session):
+    if session.info.pop('regras_conquistas_alteradas', False):
+        regras_conquistas.descartar()
+
+def _criar_contadores(target, connection, **kw):
+    """Preenche os contadores em bancos criados antes deles existirem"""
+    com_contadores = connection.execute(select(func.count()).select_from(ContadoresConquista.__table__)).scalar()
+    cadastrados = connection.execute(select(func.count()).select_from(Usuario.__table__)).scalar()
+    if com_contadores != cadastrados:
+        recalcular_contadores(connection)
+
+event.listen(db.metadata, 'after_create', _criar_contadores)
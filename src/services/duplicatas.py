@@ -0,0 +1,161 @@
+import random
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+from sqlalchemy import select
+from src.models.minasle_models import db, LivroNormalizado
+from src.services.texto import trigramas
+
+# Assinaturas MinHash com BANDAS x LINHAS_POR_BANDA funções de hash. Dois
+# títulos com Jaccard j caem no mesmo balde com probabilidade
+# 1 - (1 - j^2)^8: cerca de 84% para j = 0,45 e 99% para j = 0,7.
+BANDAS = 8
+LINHAS_POR_BANDA = 2
+
+PESO_TITULO = 0.7
+PESO_AUTOR = 0.3
+
+LIMIAR_PADRAO = 0.6
+
+# Baldes maiores que isso são títulos genéricos ou muito repetidos; os
+# livros seguintes vão para um balde dividido por uma banda extra, tirada da
+# assinatura do autor. Só quando também ele enche há livros descartados,
+# contados no relatório.
+TAMANHO_MAXIMO_BALDE = 50
+
+# Candidatos conferidos por consulta, escolhidos pelo número de bandas em
+# comum, que estima o Jaccard entre as assinaturas
+MAXIMO_CANDIDATOS = 20
+
+# Sugestões guardadas por livro no relatório em lote
+MAXIMO_SUGESTOES_POR_LIVRO = 5
+
+_PRIMO = (1 << 61) - 1
+_gerador = random.Random(20240601)
+_FUNCOES = [
+    (_gerador.randrange(1, _PRIMO), _gerador.randrange(0, _PRIMO))
+    for _ in range(BANDAS * LINHAS_POR_BANDA)
+]
+
+@lru_cache(maxsize=65536)
+def _hash_trigrama(trigrama):
+    return zlib.crc32(trigrama.encode('utf-8'))
+
+def assinatura_minhash(conjunto):
+    """Assinatura MinHash de um conjunto de trigramas"""
+    hashes = [_hash_trigrama(t) for t in conjunto]
+    return tuple(min((a * h + b) % _PRIMO for h in hashes) for a, b in _FUNCOES)
+
+def _bandas(assinatura):
+    for i in range(BANDAS):
+        yield i, assinatura[i * LINHAS_POR_BANDA:(i + 1) * LINHAS_POR_BANDA]
+
+def _banda_extra(conjunto_autor):
+    """Primeira banda da assinatura do autor, que divide os baldes cheios"""
+    if not conjunto_autor:
+        return ()
+    return assinatura_minhash(conjunto_autor)[:LINHAS_POR_BANDA]
+
+def _sobreposicao(a, b):
+    """Coeficiente de sobreposição: tolera títulos com subtítulo ou autor abreviado"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+def _similaridade(titulo_a, autor_a, titulo_b, autor_b):
+    """Retorna (total, titulo, autor) a partir dos conjuntos de trigramas"""
+    s_titulo = _sobreposicao(titulo_a, titulo_b)
+    s_autor = _sobreposicao(autor_a, autor_b)
+    total = PESO_TITULO * s_titulo + PESO_AUTOR * s_autor
+    return round(total, 4), round(s_titulo, 4), round(s_autor, 4)
+
+class IndiceSemelhanca:
+    """Índice LSH em memória para achar livros parecidos sem comparar todos os pares
+
+    Cada título vira uma assinatura MinHash, dividida em bandas; só livros
+    que coincidem em alguma banda são comparados de fato. Inserir e consultar
+    custam O(1) em relação ao tamanho do catálogo.
+    """
+
+    def __init__(self):
+        self._baldes = defaultdict(list)
+        self._livros = {}
+        self.descartados = 0
+
+    def adicionar(self, chave, titulo, autor):
+        """Inclui um livro com título e autor já normalizados"""
+        conjunto = trigramas(titulo)
+        if not conjunto:
+            return
+        conjunto_autor = trigramas(autor)
+        self._livros[chave] = (conjunto, conjunto_autor)
+        extra = _banda_extra(conjunto_autor)
+        for banda in _bandas(assinatura_minhash(conjunto)):
+            for balde in (self._baldes[banda], self._baldes[banda, extra]):
+                if len(balde) < TAMANHO_MAXIMO_BALDE:
+                    balde.append(chave)
+                    break
+            else:
+                self.descartados += 1
+
+    def semelhantes(self, titulo, autor, limiar=LIMIAR_PADRAO):
+        """Livros do índice parecidos com o informado, do mais ao menos similar"""
+        conjunto = trigramas(titulo)
+        if not conjunto:
+            return []
+
+        conjunto_autor = trigramas(autor)
+        extra = _banda_extra(conjunto_autor)
+        bandas_em_comum = Counter()
+        for banda in _bandas(assinatura_minhash(conjunto)):
+            balde = self._baldes.get(banda, ())
+            bandas_em_comum.update(balde)
+            if len(balde) >= TAMANHO_MAXIMO_BALDE:
+                bandas_em_comum.update(self._baldes.get((banda, extra), ()))
+
+        resultados = []
+        for chave, _ in bandas_em_comum.most_common(MAXIMO_CANDIDATOS):
+            titulo_b, autor_b = self._livros[chave]
+            total, s_titulo, s_autor = _similaridade(conjunto, conjunto_autor, titulo_b, autor_b)
+            if total >= limiar:
+                resultados.append((chave, total, s_titulo, s_autor))
+        resultados.sort(key=lambda r: (-r[1], str(r[0])))
+        return resultados
+
+def carregar_indice_catalogo():
+    """Monta o índice LSH com todos os livros do catálogo, indexados pelo id"""
+    indice = IndiceSemelhanca()
+    for livro_id, titulo, autor in db.session.execute(
+        select(LivroNormalizado.livro_id, LivroNormalizado.titulo, LivroNormalizado.autor)
+    ):
+        indice.adicionar(livro_id, titulo, autor)
+    return indice
+
+def relatorio_duplicatas(limiar=LIMIAR_PADRAO):
+    """Pares de livros possivelmente duplicados no catálogo, com sugestão de mesclagem
+
+    O livro mais antigo (menor id) é sugerido como o registro a manter.
+    Retorna (pares, descartados); descartados conta as entradas que não
+    couberam em nenhum balde e por isso podem ter deixado pares de fora.
+    """
+    indice = IndiceSemelhanca()
+    pares = []
+    linhas = db.session.execute(
+        select(LivroNormalizado.livro_id, LivroNormalizado.titulo, LivroNormalizado.autor)
+        .order_by(LivroNormalizado.livro_id)
+    )
+    # Cada livro é comparado só com os anteriores, então cada par aparece uma vez
+    for livro_id, titulo, autor in linhas:
+        semelhantes = indice.semelhantes(titulo, autor, limiar)[:MAXIMO_SUGESTOES_POR_LIVRO]
+        for outro_id, total, s_titulo, s_autor in semelhantes:
+            pares.append({
+                'manter_livro_id': outro_id,
+                'mesclar_livro_id': livro_id,
+                'similaridade': total,
+                'similaridade_titulo': s_titulo,
+                'similaridade_autor': s_autor
+            })
+        indice.adicionar(livro_id, titulo, autor)
+
+    pares.sort(key=lambda p: (-p['similaridade'], p['manter_livro_id'], p['mesclar_livro_id']))
+    return pares, indice.descartados
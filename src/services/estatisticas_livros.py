@@ -0,0 +1,172 @@
+import logging
+from sqlalchemy import case, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, EstatisticaLivro, Leitura, Livro
+
+logger = logging.getLogger(__name__)
+
+# Funções chamadas depois de cada commit que altera os contadores de livros.
+# Cada uma recebe o conjunto de ids dos livros afetados, ou None quando
+# todos os contadores foram recalculados.
+_assinantes = []
+
+def ao_alterar_popularidade(funcao):
+    """Registra uma função para ser notificada quando os contadores de livros mudarem"""
+    _assinantes.append(funcao)
+    return funcao
+
+def marcar_popularidade_alterada(session, ids=None):
+    """Marca os contadores dos livros como alterados na transação atual
+
+    Necessário para escritas fora dos eventos do ORM; sem ids, vale para todos.
+    """
+    atual = session.info.get('popularidade_alterada', set())
+    session.info['popularidade_alterada'] = None if ids is None or atual is None else atual | set(ids)
+
+def _contribuicao(progresso):
+    """Quanto uma leitura soma em (leitores, conclusoes, soma_progresso)"""
+    progresso = progresso or 0
+    return 1, 1 if progresso == 100 else 0, progresso
+
+def _aplicar(connection, livro_id, sinal, progresso):
+    leitores, conclusoes, soma_progresso = _contribuicao(progresso)
+    tabela = EstatisticaLivro.__table__
+    connection.execute(
+        update(tabela)
+        .where(tabela.c.livro_id == livro_id)
+        .values(
+            leitores=tabela.c.leitores + sinal * leitores,
+            conclusoes=tabela.c.conclusoes + sinal * conclusoes,
+            soma_progresso=tabela.c.soma_progresso + sinal * soma_progresso
+        )
+    )
+
+def ajustar_progressos(connection, alteracoes):
+    """Aplica em lote mudanças de progresso feitas fora do ORM
+
+    Recebe tuplas (livro_id, progresso_anterior, progresso_novo) e grava uma
+    única variação por livro.
+    """
+    variacoes = {}
+    for livro_id, anterior, novo in alteracoes:
+        _, conclusoes_antes, soma_antes = _contribuicao(anterior)
+        _, conclusoes_depois, soma_depois = _contribuicao(novo)
+        conclusoes, soma = variacoes.get(livro_id, (0, 0))
+        variacoes[livro_id] = (
+            conclusoes + conclusoes_depois - conclusoes_antes,
+            soma + soma_depois - soma_antes
+        )
+    variacoes = [(conclusoes, soma, livro_id) for livro_id, (conclusoes, soma) in variacoes.items()
+                 if conclusoes or soma]
+    if variacoes:
+        connection.exec_driver_sql(
+            'UPDATE livros_estatisticas SET conclusoes = conclusoes + ?, '
+            'soma_progresso = soma_progresso + ? WHERE livro_id = ?',
+            variacoes
+        )
+
+def criar_estatisticas(connection, ids):
+    """Cria os contadores zerados de livros recém-cadastrados
+
+    Usada pelos eventos do ORM e pelas inserções em lote, que não os disparam.
+    """
+    if ids:
+        connection.execute(insert(EstatisticaLivro.__table__), [{'livro_id': livro_id} for livro_id in ids])
+
+def recalcular_estatisticas(connection):
+    """Recalcula todos os contadores a partir da tabela leituras, em uma única instrução"""
+    connection.execute(delete(EstatisticaLivro.__table__))
+    agregados = (
+        select(
+            Livro.id,
+            func.count(Leitura.id),
+            func.coalesce(func.sum(case((Leitura.progresso == 100, 1), else_=0)), 0),
+            func.coalesce(func.sum(Leitura.progresso), 0)
+        )
+        .select_from(Livro)
+        .outerjoin(Leitura, Leitura.livro_id == Livro.id)
+        .group_by(Livro.id)
+    )
+    connection.execute(
+        insert(EstatisticaLivro.__table__).from_select(
+            ['livro_id', 'leitores', 'conclusoes', 'soma_progresso'], agregados
+        )
+    )
+
+def reparar_estatisticas_livros():
+    """Recalcula os contadores de popularidade de todos os livros e retorna quantos foram gravados"""
+    recalcular_estatisticas(db.session.connection())
+    marcar_popularidade_alterada(db.session)
+    db.session.commit()
+    return db.session.query(func.count(EstatisticaLivro.livro_id)).scalar()
+
+@event.listens_for(Livro, 'after_insert')
+def _criar_estatisticas_livro(mapper, connection, livro):
+    criar_estatisticas(connection, [livro.id])
+
+@event.listens_for(Livro, 'after_delete')
+def _remover_estatisticas_livro(mapper, connection, livro):
+    connection.execute(delete(EstatisticaLivro.__table__).where(EstatisticaLivro.livro_id == livro.id))
+
+# Os contadores são atualizados no flush, na mesma transação da leitura:
+# o commit grava os dois juntos ou nenhum deles
+
+@event.listens_for(Leitura, 'after_insert')
+def _contar_leitura_inserida(mapper, connection, leitura):
+    _aplicar(connection, leitura.livro_id, 1, leitura.progresso)
+
+@event.listens_for(Leitura, 'after_update')
+def _contar_leitura_atualizada(mapper, connection, leitura):
+    estado = db.inspect(leitura)
+    progresso = estado.attrs.progresso.history
+    livro = estado.attrs.livro_id.history
+    if not progresso.has_changes() and not livro.has_changes():
+        return
+
+    progresso_anterior = progresso.deleted[0] if progresso.deleted else leitura.progresso
+    livro_anterior = livro.deleted[0] if livro.deleted else leitura.livro_id
+    _aplicar(connection, livro_anterior, -1, progresso_anterior)
+    _aplicar(connection, leitura.livro_id, 1, leitura.progresso)
+
+@event.listens_for(Leitura, 'after_delete')
+def _descontar_leitura_removida(mapper, connection, leitura):
+    _aplicar(connection, leitura.livro_id, -1, leitura.progresso)
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_popularidade_alterada(session, flush_context):
+    livros = set()
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Leitura):
+            livros.add(obj.livro_id)
+    for obj in session.dirty:
+        if isinstance(obj, Leitura):
+            estado = db.inspect(obj)
+            livro = estado.attrs.livro_id.history
+            if livro.has_changes() or estado.attrs.progresso.history.has_changes():
+                livros.update((obj.livro_id, *livro.deleted))
+    if livros:
+        marcar_popularidade_alterada(session, livros)
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_popularidade_alterada(session):
+    session.info.pop('popularidade_alterada', None)
+
+@event.listens_for(Session, 'after_commit')
+def _notificar_popularidade_alterada(session):
+    if 'popularidade_alterada' not in session.info:
+        return
+    livros = session.info.pop('popularidade_alterada')
+    for assinante in _assinantes:
+        try:
+            assinante(livros)
+        except Exception:
+            logger.exception('Falha ao propagar contadores de livros para %s', assinante.__name__)
+
+def _criar_estatisticas_livros(target, connection, **kw):
+    """Preenche os contadores de bancos criados antes deles existirem"""
+    com_estatisticas = connection.execute(select(func.count()).select_from(EstatisticaLivro.__table__)).scalar()
+    cadastrados = connection.execute(select(func.count()).select_from(Livro.__table__)).scalar()
+    if com_estatisticas != cadastrados:
+        recalcular_estatisticas(connection)
+
+event.listen(db.metadata, 'after_create', _criar_estatisticas_livros)
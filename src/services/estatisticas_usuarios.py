@@ -0,0 +1,149 @@
+from collections import defaultdict
+from sqlalchemy import and_, case, delete, event, func, insert, select, update
+from src.models.minasle_models import db, EstatisticaUsuario, Leitura, Livro, Usuario
+
+_CAMPOS = ('total_leituras', 'leituras_completas', 'pontuacao_total', 'soma_progresso', 'livros_regionais_completos')
+
+def _livro_regional(connection, livro_id):
+    return bool(connection.execute(select(Livro.obra_regional).where(Livro.id == livro_id)).scalar())
+
+def _contribuicao(connection, livro_id, progresso, pontuacao):
+    """Quanto uma leitura soma em cada campo do resumo do usuário"""
+    progresso = progresso or 0
+    completa = progresso == 100
+    regional = completa and _livro_regional(connection, livro_id)
+    return (1, 1 if completa else 0, pontuacao or 0, progresso, 1 if regional else 0)
+
+# Funções chamadas, dentro da transação, a cada variação no resumo de um
+# usuário. Cada uma recebe (connection, usuario_id, {campo: variação},
+# total_leituras depois da variação).
+_assinantes = []
+
+def ao_alterar_resumo(funcao):
+    """Registra uma função para acompanhar as variações nos resumos dos usuários"""
+    _assinantes.append(funcao)
+    return funcao
+
+def _aplicar(connection, usuario_id, variacao):
+    if not any(variacao):
+        return
+    tabela = EstatisticaUsuario.__table__
+    total_leituras = connection.execute(
+        update(tabela)
+        .where(tabela.c.usuario_id == usuario_id)
+        .values({campo: tabela.c[campo] + valor for campo, valor in zip(_CAMPOS, variacao) if valor})
+        .returning(tabela.c.total_leituras)
+    ).scalar()
+    if total_leituras is None:
+        return
+    for assinante in _assinantes:
+        assinante(connection, usuario_id, dict(zip(_CAMPOS, variacao)), total_leituras)
+
+def ajustar_progressos_usuarios(connection, alteracoes):
+    """Aplica em lote mudanças de progresso feitas fora do ORM
+
+    Recebe tuplas (usuario_id, livro_id, progresso_anterior, progresso_novo),
+    com a pontuação inalterada, e grava uma única variação por usuário.
+    """
+    variacoes = defaultdict(lambda: [0] * len(_CAMPOS))
+    for usuario_id, livro_id, anterior, novo in alteracoes:
+        antes = _contribuicao(connection, livro_id, anterior, 0)
+        depois = _contribuicao(connection, livro_id, novo, 0)
+        variacao = variacoes[usuario_id]
+        for i in range(len(_CAMPOS)):
+            variacao[i] += depois[i] - antes[i]
+    for usuario_id, variacao in variacoes.items():
+        _aplicar(connection, usuario_id, variacao)
+
+def criar_estatisticas_usuarios(connection, ids):
+    """Cria o resumo zerado de usuários recém-cadastrados"""
+    if ids:
+        connection.execute(insert(EstatisticaUsuario.__table__), [{'usuario_id': usuario_id} for usuario_id in ids])
+
+def recalcular_estatisticas_usuarios(connection):
+    """Recalcula o resumo de todos os usuários a partir da tabela leituras, em uma única instrução"""
+    connection.execute(delete(EstatisticaUsuario.__table__))
+    completa = Leitura.progresso == 100
+    agregados = (
+        select(
+            Usuario.id,
+            func.count(Leitura.id),
+            func.coalesce(func.sum(case((completa, 1), else_=0)), 0),
+            func.coalesce(func.sum(Leitura.pontuacao), 0),
+            func.coalesce(func.sum(Leitura.progresso), 0),
+            func.coalesce(func.sum(case((and_(completa, Livro.obra_regional == True), 1), else_=0)), 0)
+        )
+        .select_from(Usuario)
+        .outerjoin(Leitura, Leitura.usuario_id == Usuario.id)
+        .outerjoin(Livro, Livro.id == Leitura.livro_id)
+        .group_by(Usuario.id)
+    )
+    connection.execute(
+        insert(EstatisticaUsuario.__table__).from_select(['usuario_id', *_CAMPOS], agregados)
+    )
+
+def reparar_estatisticas_usuarios():
+    """Recalcula o resumo de leituras de todos os usuários e retorna quantos foram gravados"""
+    recalcular_estatisticas_usuarios(db.session.connection())
+    db.session.commit()
+    return db.session.query(func.count(EstatisticaUsuario.usuario_id)).scalar()
+
+@event.listens_for(Usuario, 'after_insert')
+def _criar_estatisticas_usuario(mapper, connection, usuario):
+    criar_estatisticas_usuarios(connection, [usuario.id])
+
+@event.listens_for(Usuario, 'after_delete')
+def _remover_estatisticas_usuario(mapper, connection, usuario):
+    connection.execute(delete(EstatisticaUsuario.__table__).where(EstatisticaUsuario.usuario_id == usuario.id))
+
+@event.listens_for(Leitura, 'after_insert')
+def _somar_leitura_inserida(mapper, connection, leitura):
+    _aplicar(connection, leitura.usuario_id,
+             _contribuicao(connection, leitura.livro_id, leitura.progresso, leitura.pontuacao))
+
+@event.listens_for(Leitura, 'after_update')
+def _somar_leitura_atualizada(mapper, connection, leitura):
+    estado = db.inspect(leitura)
+    historicos = {campo: estado.attrs[campo].history for campo in ('usuario_id', 'livro_id', 'progresso', 'pontuacao')}
+    if not any(historico.has_changes() for historico in historicos.values()):
+        return
+
+    anterior = {
+        campo: historico.deleted[0] if historico.deleted else getattr(leitura, campo)
+        for campo, historico in historicos.items()
+    }
+    antes = _contribuicao(connection, anterior['livro_id'], anterior['progresso'], anterior['pontuacao'])
+    depois = _contribuicao(connection, leitura.livro_id, leitura.progresso, leitura.pontuacao)
+    if anterior['usuario_id'] == leitura.usuario_id:
+        _aplicar(connection, leitura.usuario_id, [d - a for a, d in zip(antes, depois)])
+    else:
+        _aplicar(connection, anterior['usuario_id'], [-a for a in antes])
+        _aplicar(connection, leitura.usuario_id, depois)
+
+@event.listens_for(Leitura, 'after_delete')
+def _descontar_leitura_removida(mapper, connection, leitura):
+    antes = _contribuicao(connection, leitura.livro_id, leitura.progresso, leitura.pontuacao)
+    _aplicar(connection, leitura.usuario_id, [-a for a in antes])
+
+@event.listens_for(Livro, 'after_update')
+def _ajustar_obra_regional(mapper, connection, livro):
+    # Quem já concluiu o livro ganha ou perde um regional completo
+    if not db.inspect(livro).attrs.obra_regional.history.has_changes():
+        return
+    sinal = 1 if livro.obra_regional else -1
+    concluintes = connection.execute(
+        select(Leitura.usuario_id, func.count())
+        .where(Leitura.livro_id == livro.id, Leitura.progresso == 100)
+        .group_by(Leitura.usuario_id)
+    ).all()
+    for usuario_id, quantidade in concluintes:
+        _aplicar(connection, usuario_id, (0, 0, 0, 0, sinal * quantidade))
+
+def _criar_estatisticas_usuarios(target, connection, **kw):
+    """Preenche o resumo de bancos criados antes dele existir"""
+    com_estatisticas = connection.execute(select(func.count()).select_from(EstatisticaUsuario.__table__)).scalar()
+    cadastrados = connection.execute(select(func.count()).select_from(Usuario.__table__)).scalar()
+    if com_estatisticas != cadastrados:
+        recalcular_estatisticas_usuarios(connection)
+
+event.listen(db.metadata, 'after_create', _criar_estatisticas_usuarios)
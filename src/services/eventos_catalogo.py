@@ -0,0 +1,55 @@
+import logging
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, Livro
+
+logger = logging.getLogger(__name__)
+
+# Funções chamadas depois de cada commit que altera livros. Cada uma recebe
+# {livro_id: livro.to_dict()} com o estado confirmado, ou None se o livro
+# foi removido.
+_assinantes = []
+
+def ao_alterar_catalogo(funcao):
+    """Registra uma função para ser notificada quando livros forem alterados"""
+    _assinantes.append(funcao)
+    return funcao
+
+def marcar_livros_alterados(session, ids):
+    """Marca livros como alterados na transação atual
+
+    Necessário para escritas em lote que não passam pelos eventos do ORM.
+    """
+    session.info.setdefault('livros_alterados', set()).update(ids)
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_livros_alterados(session, flush_context):
+    ids = [
+        obj.id for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Livro) and obj.id is not None
+    ]
+    if ids:
+        marcar_livros_alterados(session, ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_livros_alterados(session):
+    session.info.pop('livros_alterados', None)
+
+@event.listens_for(Session, 'after_commit')
+def _notificar_livros_alterados(session):
+    ids = session.info.pop('livros_alterados', None)
+    if not ids or not _assinantes:
+        return
+
+    # A sessão que acabou de confirmar não pode emitir SQL neste evento
+    with Session(db.engine) as leitura:
+        livros = leitura.scalars(select(Livro).where(Livro.id.in_(ids)))
+        alterados = {livro.id: livro.to_dict() for livro in livros}
+    for livro_id in ids:
+        alterados.setdefault(livro_id, None)
+
+    for assinante in _assinantes:
+        try:
+            assinante(alterados)
+        except Exception:
+            logger.exception('Falha ao propagar alteração do catálogo para %s', assinante.__name__)
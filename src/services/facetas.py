@@ -0,0 +1,117 @@
+import threading
+from collections import Counter
+from functools import lru_cache
+from sqlalchemy import select
+from src.models.minasle_models import db, Livro
+from src.services.eventos_catalogo import ao_alterar_catalogo
+from src.services.texto import normalizar
+
+FACETAS = ('genero', 'autor', 'obra_regional')
+
+# Os valores das facetas se repetem muito; normalizá-los uma vez basta
+_normalizar_valor = lru_cache(maxsize=65536)(normalizar)
+
+def _combinacao(genero, autor, obra_regional):
+    return (genero or None, autor, bool(obra_regional))
+
+def _casa(valor, filtro):
+    if filtro is None:
+        return True
+    if isinstance(filtro, bool):
+        return valor == filtro
+    return valor is not None and _normalizar_valor(valor) == filtro
+
+class IndiceFacetas:
+    """Contagem de livros por combinação de gênero, autor e obra regional
+
+    Guardar a contagem por combinação (e não por faceta isolada) permite
+    responder cada faceta já filtrada pelas outras somando só as combinações,
+    que são bem menos numerosas que os livros.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._combinacoes = None
+        self._livros = None
+
+    def carregado(self):
+        return self._combinacoes is not None
+
+    def carregar(self):
+        """Monta o índice a partir do banco de dados, se ainda não estiver montado
+
+        Como em IndicePrefixos, a leitura acontece sob a trava, para que um
+        commit confirmado durante a montagem seja aplicado depois dela.
+        """
+        with self._trava:
+            if self._combinacoes is not None:
+                return
+            livros = {
+                livro_id: _combinacao(genero, autor, obra_regional)
+                for livro_id, genero, autor, obra_regional in db.session.execute(
+                    select(Livro.id, Livro.genero, Livro.autor, Livro.obra_regional)
+                )
+            }
+            self._livros = livros
+            self._combinacoes = Counter(livros.values())
+
+    def descartar(self):
+        with self._trava:
+            self._combinacoes = None
+            self._livros = None
+
+    def atualizar(self, alterados):
+        """Aplica livros inseridos, editados ou removidos ({id: dict ou None})"""
+        with self._trava:
+            if self._combinacoes is None:
+                return
+            combinacoes = Counter(self._combinacoes)
+            for livro_id, livro in alterados.items():
+                anterior = self._livros.pop(livro_id, None)
+                if anterior is not None:
+                    combinacoes[anterior] -= 1
+                    if not combinacoes[anterior]:
+                        del combinacoes[anterior]
+                if livro is not None:
+                    atual = _combinacao(livro['genero'], livro['autor'], livro['obra_regional'])
+                    self._livros[livro_id] = atual
+                    combinacoes[atual] += 1
+            self._combinacoes = combinacoes
+
+    def contar(self, genero=None, autor=None, obra_regional=None):
+        """Contagens de cada faceta, filtradas pelas demais facetas informadas
+
+        Retorna ({faceta: [{'valor', 'total'}]}, total de livros que atendem
+        a todos os filtros).
+        """
+        filtros = (
+            normalizar(genero) if genero else None,
+            normalizar(autor) if autor else None,
+            obra_regional
+        )
+        contagens = {faceta: Counter() for faceta in FACETAS}
+        total = 0
+
+        for combinacao, quantidade in self._combinacoes.items():
+            casamentos = [_casa(valor, filtro) for valor, filtro in zip(combinacao, filtros)]
+            if all(casamentos):
+                total += quantidade
+            for i, faceta in enumerate(FACETAS):
+                # Cada faceta ignora o próprio filtro para listar as alternativas
+                if all(casou for j, casou in enumerate(casamentos) if j != i) and combinacao[i] is not None:
+                    contagens[faceta][combinacao[i]] += quantidade
+
+        facetas = {
+            faceta: [
+                {'valor': valor, 'total': quantidade}
+                for valor, quantidade in sorted(contador.items(), key=lambda item: (-item[1], str(item[0])))
+            ]
+            for faceta, contador in contagens.items()
+        }
+        return facetas, total
+
+indice_facetas = IndiceFacetas()
+
+@ao_alterar_catalogo
+def _atualizar_indice_facetas(alterados):
+    indice_facetas.atualizar(alterados)
@@ -0,0 +1,216 @@
+import csv
+import json
+from sqlalchemy import insert, select, tuple_
+from src.models.minasle_models import db, Livro, LivroNormalizado
+from src.services.busca import indexar_livros
+from src.services.carregamento import TAMANHO_BLOCO_IDS
+from src.services.duplicatas import carregar_indice_catalogo
+from src.services.estatisticas_livros import criar_estatisticas
+from src.services.eventos_catalogo import marcar_livros_alterados
+from src.services.texto import normalizar
+
+TAMANHO_LOTE_PADRAO = 5000
+
+# Erros e semelhanças detalhados no relatório; os demais só entram na contagem
+MAXIMO_ERROS_RELATADOS = 1000
+MAXIMO_SEMELHANTES_RELATADOS = 1000
+
+FORMATOS = ('csv', 'jsonl')
+
+CAMPOS_TEXTO = {
+    'titulo': 300,
+    'autor': 200,
+    'genero': 100,
+    'url_conteudo': 500,
+    'capa_url': 500,
+    'descricao': None
+}
+
+VALORES_VERDADEIROS = {'true', '1', 'sim', 's', 'yes', 'y', 'x'}
+
+class ErroLinha(ValueError):
+    """Linha do arquivo de importação com dados inválidos"""
+
+def detectar_formato(nome_arquivo=None, tipo_conteudo=None):
+    """Deduz o formato pelo nome do arquivo ou pelo Content-Type"""
+    nome_arquivo = (nome_arquivo or '').lower()
+    tipo_conteudo = (tipo_conteudo or '').lower()
+    if nome_arquivo.endswith(('.jsonl', '.ndjson')) or 'ndjson' in tipo_conteudo or 'jsonl' in tipo_conteudo:
+        return 'jsonl'
+    return 'csv'
+
+def ler_linhas(arquivo, formato):
+    """Percorre o arquivo de texto uma linha por vez, gerando (numero_linha, dados ou erro)"""
+    if formato == 'jsonl':
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                dados = json.loads(linha)
+            except ValueError as e:
+                yield numero, ErroLinha(f'JSON inválido: {e}')
+                continue
+            if not isinstance(dados, dict):
+                yield numero, ErroLinha('Cada linha deve ser um objeto JSON')
+                continue
+            yield numero, dados
+    else:
+        leitor = csv.DictReader(arquivo)
+        for dados in leitor:
+            # line_num aponta para a última linha física lida, contando o cabeçalho
+            yield leitor.line_num, dados
+
+def validar_linha(dados):
+    """Converte uma linha em valores para a tabela livros ou levanta ErroLinha"""
+    livro = {}
+    for campo, tamanho in CAMPOS_TEXTO.items():
+        valor = dados.get(campo)
+        if valor is not None and not isinstance(valor, str):
+            valor = str(valor)
+        valor = (valor or '').strip() or None
+        if tamanho and valor and len(valor) > tamanho:
+            raise ErroLinha(f'Campo {campo} excede {tamanho} caracteres')
+        livro[campo] = valor
+
+    if not livro['titulo'] or not livro['autor']:
+        raise ErroLinha('Título e autor são obrigatórios')
+
+    obra_regional = dados.get('obra_regional', False)
+    if isinstance(obra_regional, str):
+        obra_regional = obra_regional.strip().lower() in VALORES_VERDADEIROS
+    livro['obra_regional'] = bool(obra_regional)
+    return livro
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.linhas = 0
+        self.inseridos = 0
+        self.duplicados = 0
+        self.total_erros = 0
+        self.erros = []
+        self.total_semelhantes = 0
+        self.semelhantes = []
+        # Entradas que não couberam nos baldes do índice de semelhança; acima de zero, pode faltar alguma semelhança
+        self.semelhantes_descartados = 0
+
+    def registrar_erro(self, numero, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAXIMO_ERROS_RELATADOS:
+            self.erros.append({'linha': numero, 'erro': mensagem})
+
+    def registrar_semelhante(self, numero, livro, chave, similaridade):
+        self.total_semelhantes += 1
+        if len(self.semelhantes) >= MAXIMO_SEMELHANTES_RELATADOS:
+            return
+        # Chaves inteiras são livros do catálogo; as demais, linhas anteriores do arquivo
+        origem = {'livro_id': chave} if isinstance(chave, int) else {'linha': chave[1]}
+        self.semelhantes.append({
+            'linha': numero,
+            'titulo': livro['titulo'],
+            'autor': livro['autor'],
+            'semelhante_a': origem,
+            'similaridade': similaridade
+        })
+
+    def to_dict(self):
+        return {
+            'linhas': self.linhas,
+            'inseridos': self.inseridos,
+            'duplicados': self.duplicados,
+            'total_erros': self.total_erros,
+            'erros': self.erros,
+            'total_semelhantes': self.total_semelhantes,
+            'semelhantes': self.semelhantes,
+            'semelhantes_descartados': self.semelhantes_descartados
+        }
+
+def _chave(livro):
+    return normalizar(livro['titulo']), normalizar(livro['autor'])
+
+def _inserir_lote(lote, relatorio):
+    """Insere um lote em uma única transação, descartando livros já cadastrados
+
+    `lote` mapeia a chave normalizada (titulo, autor) de cada livro aos seus dados.
+    Os lotes anteriores já estão gravados, então a consulta ao catálogo também
+    descarta repetições de linhas anteriores do arquivo.
+    """
+    chaves = list(lote)
+    existentes = set()
+    for inicio in range(0, len(chaves), TAMANHO_BLOCO_IDS):
+        existentes.update(db.session.execute(
+            select(LivroNormalizado.titulo, LivroNormalizado.autor)
+            .where(tuple_(LivroNormalizado.titulo, LivroNormalizado.autor).in_(chaves[inicio:inicio + TAMANHO_BLOCO_IDS]))
+        ).all())
+
+    novos = []
+    for chave, livro in lote.items():
+        if chave in existentes:
+            relatorio.duplicados += 1
+        else:
+            novos.append(livro)
+
+    if novos:
+        # A inserção em lote não dispara os eventos do ORM: índices de busca,
+        # contadores e notificações do catálogo são atualizados aqui, na mesma transação
+        inseridos = db.session.execute(
+            insert(Livro).returning(Livro.id, Livro.titulo, Livro.autor), novos
+        ).all()
+        indexar_livros(db.session.connection(), [tuple(linha) for linha in inseridos], novos=True)
+        criar_estatisticas(db.session.connection(), [linha.id for linha in inseridos])
+        marcar_livros_alterados(db.session, [linha.id for linha in inseridos])
+        relatorio.inseridos += len(inseridos)
+
+    db.session.commit()
+
+def importar_catalogo(arquivo, formato='csv', tamanho_lote=TAMANHO_LOTE_PADRAO, verificar_semelhantes=False):
+    """Importa livros de um arquivo CSV ou JSONL em lotes
+
+    O arquivo é lido como fluxo e só um lote fica em memória por vez. Cada
+    lote é validado, comparado com o catálogo pelo título e autor
+    normalizados e gravado em uma única transação; repetições dentro do
+    lote caem na mesma chave.
+
+    Com `verificar_semelhantes` (desligado por padrão, pois monta o índice de
+    trigramas do catálogo inteiro), livros parecidos (mas não idênticos) com
+    algum do catálogo ou do próprio arquivo são importados e listados no
+    relatório como possíveis duplicatas.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido. Use: {', '.join(FORMATOS)}")
+
+    relatorio = RelatorioImportacao()
+    lote = {}
+    indice = carregar_indice_catalogo() if verificar_semelhantes else None
+
+    for numero, dados in ler_linhas(arquivo, formato):
+        relatorio.linhas += 1
+        try:
+            if isinstance(dados, ErroLinha):
+                raise dados
+            livro = validar_linha(dados)
+        except ErroLinha as e:
+            relatorio.registrar_erro(numero, str(e))
+            continue
+
+        chave = _chave(livro)
+        if chave in lote:
+            relatorio.duplicados += 1
+            continue
+
+        if indice is not None:
+            titulo, autor = chave
+            for semelhante, total, _, _ in indice.semelhantes(titulo, autor)[:1]:
+                relatorio.registrar_semelhante(numero, livro, semelhante, total)
+            indice.adicionar(('linha', numero), titulo, autor)
+
+        lote[chave] = livro
+        if len(lote) >= tamanho_lote:
+            _inserir_lote(lote, relatorio)
+            lote = {}
+
+    if lote:
+        _inserir_lote(lote, relatorio)
+
+    if indice is not None:
+        relatorio.semelhantes_descartados = indice.descartados
+    return relatorio.to_dict()
@@ -0,0 +1,145 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+class ParametroInvalido(ValueError):
+    """Parâmetro de paginação ou ordenação inválido enviado pelo cliente"""
+
+def _codificar_valor(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+def _decodificar_valor(coluna, valor):
+    if valor is not None and isinstance(coluna.type, DateTime):
+        return datetime.fromisoformat(valor)
+    return valor
+
+def codificar_cursor(valores):
+    """Cursor opaco com os valores de ordenação da última linha da página"""
+    dados = json.dumps([_codificar_valor(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+def _ler_cursor(cursor, tamanho):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(dados)
+        if not isinstance(valores, list) or len(valores) != tamanho:
+            raise ValueError
+        return valores
+    except (ValueError, TypeError):
+        raise ParametroInvalido('Cursor inválido')
+
+def decodificar_cursor(cursor, colunas):
+    valores = _ler_cursor(cursor, len(colunas))
+    try:
+        return [_decodificar_valor(coluna, valor) for coluna, valor in zip(colunas, valores)]
+    except (ValueError, TypeError):
+        raise ParametroInvalido('Cursor inválido')
+
+def ler_parametros(args, ordenacoes, padrao, direcoes=None):
+    """Lê limit, cursor, ordenar, direcao e total da query string
+
+    `ordenacoes` mapeia cada nome aceito em `ordenar` para a lista de colunas
+    da ordenação, terminando sempre em uma coluna única (normalmente o id).
+    `direcoes` define a direção padrão das ordenações que não são ascendentes.
+    """
+    ordenar = args.get('ordenar', padrao)
+    if ordenar not in ordenacoes:
+        raise ParametroInvalido(f"Ordenação inválida. Use: {', '.join(ordenacoes)}")
+
+    direcao = args.get('direcao', (direcoes or {}).get(ordenar, 'asc'))
+    if direcao not in ('asc', 'desc'):
+        raise ParametroInvalido('Direção deve ser asc ou desc')
+
+    try:
+        limite = int(args.get('limit', LIMITE_PADRAO))
+    except ValueError:
+        raise ParametroInvalido('limit deve ser um número inteiro')
+    if limite < 1:
+        raise ParametroInvalido('limit deve ser maior que zero')
+
+    return {
+        'colunas': ordenacoes[ordenar],
+        'descendente': direcao == 'desc',
+        'limite': min(limite, LIMITE_MAXIMO),
+        'cursor': args.get('cursor'),
+        # A contagem custa uma consulta a mais; só com total=true
+        'incluir_total': args.get('total', '').lower() == 'true'
+    }
+
+def paginar(query, colunas, descendente=False, limite=LIMITE_PADRAO, cursor=None, incluir_total=False):
+    """Pagina uma query por keyset: cada página continua depois da última linha da anterior
+
+    Em vez de OFFSET, o cursor guarda os valores de ordenação da última linha
+    e a próxima página começa com uma comparação de tupla nessas colunas, que
+    o índice resolve com uma busca direta. Páginas profundas custam o mesmo
+    que a primeira.
+
+    Retorna (itens, proximo_cursor, total); total é None se não solicitado.
+    """
+    total = query.order_by(None).count() if incluir_total else None
+
+    if cursor:
+        valores = decodificar_cursor(cursor, colunas)
+        chave = tuple_(*colunas)
+        query = query.filter(chave < tuple_(*valores) if descendente else chave > tuple_(*valores))
+
+    # As colunas de ordenação vêm junto de cada entidade para montar o cursor,
+    # inclusive quando não pertencem a ela (como o rank da busca textual)
+    ordem = [coluna.desc() if descendente else coluna.asc() for coluna in colunas]
+    linhas = query.add_columns(*colunas).order_by(*ordem).limit(limite + 1).all()
+
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(linhas[-1][1:])
+
+    return [linha[0] for linha in linhas], proximo_cursor, total
+
+def _chave_lista(valores):
+    # Nulos antes de qualquer valor, como no SQLite
+    return tuple((0, 0) if valor is None else (1, valor) for valor in valores)
+
+def paginar_lista(itens, colunas, descendente=False, limite=LIMITE_PADRAO, cursor=None, incluir_total=False):
+    """Pagina por keyset uma lista de dicionários já carregada, com o mesmo cursor de `paginar`
+
+    Para conjuntos pequenos e limitados, como os alunos de uma escola,
+    ordenados por valores calculados que nenhum índice cobre. `colunas` são
+    as chaves dos dicionários usadas na ordenação, terminando em uma chave
+    única; os valores precisam ser serializáveis em JSON.
+
+    Retorna (itens, proximo_cursor, total); total é None se não solicitado.
+    """
+    total = len(itens) if incluir_total else None
+
+    def chave(item):
+        return _chave_lista(item[coluna] for coluna in colunas)
+
+    itens = sorted(itens, key=chave, reverse=descendente)
+    if cursor:
+        ultimo = _chave_lista(_ler_cursor(cursor, len(colunas)))
+        try:
+            itens = [item for item in itens if (chave(item) < ultimo if descendente else chave(item) > ultimo)]
+        except TypeError:
+            raise ParametroInvalido('Cursor inválido')
+
+    proximo_cursor = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo_cursor = codificar_cursor([itens[-1][coluna] for coluna in colunas])
+
+    return itens, proximo_cursor, total
+
+def resposta_paginada(chave, itens, proximo_cursor, total):
+    """Corpo JSON padrão das listagens paginadas"""
+    resposta = {
+        'sucesso': True,
+        chave: itens,
+        'proximo_cursor': proximo_cursor
+    }
+    if total is not None:
+        resposta['total'] = total
+    return resposta
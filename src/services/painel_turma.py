@@ -0,0 +1,76 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from src.models.minasle_models import (
+    db, AcompanhamentoPedagogico, ConquistaUsuario, EstatisticaUsuario, EventoLeitura, Leitura, Usuario
+)
+from src.services.carregamento import TAMANHO_BLOCO_IDS
+
+def _maior(*momentos):
+    momentos = [momento for momento in momentos if momento is not None]
+    return max(momentos) if momentos else None
+
+def metricas_turma(escola_id):
+    """Métricas de todos os alunos da escola, em uma única consulta
+
+    Contagens e progresso vêm de usuarios_estatisticas; conquistas e última
+    atividade (início ou conclusão de leitura, ou sessão de leitura) são
+    subconsultas por aluno resolvidas pelos índices de usuario_id. Retorna
+    uma lista de dicionários com valores prontos para ordenar e serializar.
+    """
+    conquistas = (
+        select(func.count()).select_from(ConquistaUsuario)
+        .where(ConquistaUsuario.usuario_id == Usuario.id).scalar_subquery()
+    )
+    inicio = select(func.max(Leitura.data_inicio)).where(Leitura.usuario_id == Usuario.id).scalar_subquery()
+    conclusao = select(func.max(Leitura.data_conclusao)).where(Leitura.usuario_id == Usuario.id).scalar_subquery()
+    sessao = select(func.max(EventoLeitura.momento)).where(EventoLeitura.usuario_id == Usuario.id).scalar_subquery()
+
+    linhas = db.session.execute(
+        select(
+            Usuario.id, Usuario.nome,
+            EstatisticaUsuario.total_leituras, EstatisticaUsuario.leituras_completas,
+            EstatisticaUsuario.soma_progresso, EstatisticaUsuario.pontuacao_total,
+            conquistas, inicio, conclusao, sessao
+        )
+        .select_from(Usuario)
+        .outerjoin(EstatisticaUsuario, EstatisticaUsuario.usuario_id == Usuario.id)
+        .where(Usuario.escola_id == escola_id, Usuario.tipo_usuario == 'aluno')
+    )
+
+    alunos = []
+    for usuario_id, nome, total, completas, soma_progresso, pontuacao, conquistas, *momentos in linhas:
+        total = total or 0
+        ultima_atividade = _maior(*momentos)
+        alunos.append({
+            'id': usuario_id,
+            'nome': nome,
+            'total_leituras': total,
+            'leituras_completas': completas or 0,
+            'leituras_em_andamento': total - (completas or 0),
+            'progresso_medio': round(soma_progresso / total, 2) if total > 0 else 0.0,
+            'pontuacao_total': pontuacao or 0,
+            'total_conquistas': conquistas,
+            'ultima_atividade': ultima_atividade.isoformat() if ultima_atividade else None
+        })
+    return alunos
+
+def ultimos_acompanhamentos(aluno_ids):
+    """Acompanhamento pedagógico mais recente de cada aluno; retorna {aluno_id: acompanhamento}
+
+    Uma consulta por bloco de ids: cada aluno acha o seu registro mais
+    recente descendo o índice (aluno_id, data).
+    """
+    anterior = aliased(AcompanhamentoPedagogico)
+    mais_recente = (
+        select(anterior.id).where(anterior.aluno_id == AcompanhamentoPedagogico.aluno_id)
+        .order_by(anterior.data.desc(), anterior.id.desc()).limit(1).scalar_subquery()
+    )
+    aluno_ids = sorted(set(aluno_ids))
+    acompanhamentos = {}
+    for inicio in range(0, len(aluno_ids), TAMANHO_BLOCO_IDS):
+        bloco = aluno_ids[inicio:inicio + TAMANHO_BLOCO_IDS]
+        for acompanhamento in AcompanhamentoPedagogico.query.filter(
+            AcompanhamentoPedagogico.aluno_id.in_(bloco), AcompanhamentoPedagogico.id == mais_recente
+        ):
+            acompanhamentos[acompanhamento.aluno_id] = acompanhamento
+    return acompanhamentos
@@ -0,0 +1,200 @@
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, delete, event, func, or_, select
+from src.models.minasle_models import db, Escola, Leitura, MembroClube, PontuacaoPeriodo, Usuario
+from src.services.atividade_leitura import dia_local, hoje
+from src.services.paginacao import ParametroInvalido
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+# Baldes de dia e semana mais antigos que isto são descartados; os pontos
+# deles continuam somados no balde do mês, que nunca é descartado
+RETENCAO_DIAS = 62
+RETENCAO_SEMANAS = 26
+
+def inicio_periodo(granularidade, dia):
+    """Primeiro dia do período que contém `dia`; semanas começam na segunda-feira"""
+    if granularidade == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+def fim_periodo(granularidade, inicio):
+    """Último dia do período que começa em `inicio`"""
+    if granularidade == 'semana':
+        return inicio + timedelta(days=6)
+    if granularidade == 'mes':
+        proximo = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return proximo - timedelta(days=1)
+    return inicio
+
+def _limites_retencao(referencia):
+    """Início mais antigo mantido em cada granularidade (None: sem limite)"""
+    return {
+        'dia': referencia - timedelta(days=RETENCAO_DIAS),
+        'semana': inicio_periodo('semana', referencia) - timedelta(weeks=RETENCAO_SEMANAS),
+        'mes': None
+    }
+
+def _baldes(dia, limites):
+    for granularidade in GRANULARIDADES:
+        inicio = inicio_periodo(granularidade, dia)
+        limite = limites[granularidade]
+        if limite is None or inicio >= limite:
+            yield granularidade, inicio
+
+_compactado_em = None
+
+def registrar_pontos(connection, pontos):
+    """Soma pontos nos baldes de dia, semana e mês de cada usuário
+
+    Recebe tuplas (usuario_id, momento em UTC, pontos). Cada balde recebe uma
+    única atualização; pontos negativos (pontuação desfeita) só descontam de
+    baldes que ainda existem. Uma vez por dia, também compacta os baldes antigos.
+    """
+    referencia = hoje()
+    limites = _limites_retencao(referencia)
+    totais = defaultdict(int)
+    for usuario_id, momento, valor in pontos:
+        if not valor:
+            continue
+        for granularidade, inicio in _baldes(dia_local(momento), limites):
+            totais[(usuario_id, granularidade, inicio.isoformat())] += valor
+
+    positivos = [(*balde, valor) for balde, valor in totais.items() if valor > 0]
+    negativos = [(valor, *balde) for balde, valor in totais.items() if valor < 0]
+    if positivos:
+        connection.exec_driver_sql(
+            'INSERT INTO pontuacoes_periodo (usuario_id, granularidade, inicio, pontos) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (usuario_id, granularidade, inicio) DO UPDATE SET pontos = pontos + excluded.pontos',
+            positivos
+        )
+    if negativos:
+        connection.exec_driver_sql(
+            'UPDATE pontuacoes_periodo SET pontos = pontos + ? '
+            'WHERE usuario_id = ? AND granularidade = ? AND inicio = ?',
+            negativos
+        )
+
+    global _compactado_em
+    if totais and _compactado_em != referencia:
+        compactar_pontuacoes(connection, referencia)
+        _compactado_em = referencia
+
+def compactar_pontuacoes(connection, referencia=None):
+    """Descarta os baldes de dia e semana fora da retenção"""
+    tabela = PontuacaoPeriodo.__table__
+    limites = _limites_retencao(referencia or hoje())
+    connection.execute(delete(tabela).where(or_(*(
+        and_(tabela.c.granularidade == granularidade, tabela.c.inicio < limite)
+        for granularidade, limite in limites.items() if limite is not None
+    ))))
+
+def recalcular_pontuacoes_periodo(connection):
+    """Refaz todos os baldes a partir das leituras pontuadas, datadas pela conclusão"""
+    connection.execute(delete(PontuacaoPeriodo.__table__))
+    pontuadas = connection.execute(
+        select(Leitura.usuario_id, func.coalesce(Leitura.data_conclusao, Leitura.data_inicio), Leitura.pontuacao)
+        .where(Leitura.pontuacao > 0)
+    ).all()
+    registrar_pontos(connection, [
+        (usuario_id, momento or datetime.utcnow(), pontos) for usuario_id, momento, pontos in pontuadas
+    ])
+
+def reparar_pontuacoes_periodo():
+    """Recalcula os baldes de pontuação e retorna quantos foram gravados"""
+    recalcular_pontuacoes_periodo(db.session.connection())
+    db.session.commit()
+    return db.session.query(func.count()).select_from(PontuacaoPeriodo).scalar()
+
+def ler_periodo(args):
+    """Lê `periodo` da query string; retorna (granularidade, inicio) ou None para todo o tempo
+
+    dia, semana e mes são os períodos em curso; YYYY-MM é um mês qualquer.
+    """
+    valor = args.get('periodo')
+    if not valor:
+        return None
+    if valor in GRANULARIDADES:
+        return valor, inicio_periodo(valor, hoje())
+
+    mes = re.fullmatch(r'(\d{4})-(\d{2})', valor)
+    if mes and 1 <= int(mes.group(2)) <= 12:
+        return 'mes', date(int(mes.group(1)), int(mes.group(2)), 1)
+    raise ParametroInvalido(f"periodo inválido: {valor}. Use: {', '.join(GRANULARIDADES)} ou YYYY-MM")
+
+def ranking_periodo(granularidade, inicio, quantidade, escopo=None, chave=None):
+    """[(posicao, usuario_id, pontos)] dos alunos que mais pontuaram no período
+
+    Lê um único balde por aluno, na ordem do índice do ranking; escopo e
+    chave restringem a uma escola, cidade ou clube como no ranking geral.
+    """
+    consulta = (
+        select(PontuacaoPeriodo.usuario_id, PontuacaoPeriodo.pontos)
+        .join(Usuario, Usuario.id == PontuacaoPeriodo.usuario_id)
+        .where(
+            PontuacaoPeriodo.granularidade == granularidade,
+            PontuacaoPeriodo.inicio == inicio,
+            PontuacaoPeriodo.pontos > 0,
+            Usuario.tipo_usuario == 'aluno'
+        )
+    )
+    if escopo == 'escola':
+        consulta = consulta.where(Usuario.escola_id == chave)
+    elif escopo == 'cidade':
+        consulta = consulta.join(Escola, Escola.id == Usuario.escola_id).where(Escola.cidade == chave)
+    elif escopo == 'clube':
+        consulta = consulta.join(MembroClube, and_(
+            MembroClube.usuario_id == PontuacaoPeriodo.usuario_id, MembroClube.clube_id == chave
+        ))
+    consulta = consulta.order_by(PontuacaoPeriodo.pontos.desc(), PontuacaoPeriodo.usuario_id).limit(quantidade)
+    return [
+        (posicao, usuario_id, pontos)
+        for posicao, (usuario_id, pontos) in enumerate(db.session.execute(consulta), 1)
+    ]
+
+def _momento(data_conclusao):
+    # Os pontos de uma leitura contam no período em que ela foi concluída
+    return data_conclusao or datetime.utcnow()
+
+@event.listens_for(Leitura, 'after_insert')
+def _pontuar_leitura_inserida(mapper, connection, leitura):
+    if leitura.pontuacao:
+        registrar_pontos(connection, [(leitura.usuario_id, _momento(leitura.data_conclusao), leitura.pontuacao)])
+
+@event.listens_for(Leitura, 'after_update')
+def _pontuar_leitura_atualizada(mapper, connection, leitura):
+    estado = db.inspect(leitura)
+    historicos = {campo: estado.attrs[campo].history for campo in ('usuario_id', 'pontuacao', 'data_conclusao')}
+    if not any(historico.has_changes() for historico in historicos.values()):
+        return
+
+    anterior = {
+        campo: historico.deleted[0] if historico.deleted else getattr(leitura, campo)
+        for campo, historico in historicos.items()
+    }
+    registrar_pontos(connection, [
+        (anterior['usuario_id'], _momento(anterior['data_conclusao']), -(anterior['pontuacao'] or 0)),
+        (leitura.usuario_id, _momento(leitura.data_conclusao), leitura.pontuacao or 0)
+    ])
+
+@event.listens_for(Leitura, 'after_delete')
+def _descontar_pontos_leitura(mapper, connection, leitura):
+    if leitura.pontuacao:
+        registrar_pontos(connection, [(leitura.usuario_id, _momento(leitura.data_conclusao), -leitura.pontuacao)])
+
+def _criar_pontuacoes_periodo(target, connection, **kw):
+    """Preenche os baldes em bancos criados antes deles existirem
+
+    Os baldes de mês nunca são descartados, então somam toda a pontuação das leituras.
+    """
+    nos_meses = connection.execute(
+        select(func.coalesce(func.sum(PontuacaoPeriodo.pontos), 0)).where(PontuacaoPeriodo.granularidade == 'mes')
+    ).scalar()
+    nas_leituras = connection.execute(select(func.coalesce(func.sum(Leitura.pontuacao), 0))).scalar()
+    if nos_meses != nas_leituras:
+        recalcular_pontuacoes_periodo(connection)
+
+event.listen(db.metadata, 'after_create', _criar_pontuacoes_periodo)
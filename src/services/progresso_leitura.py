@@ -0,0 +1,52 @@
+from datetime import datetime
+from sqlalchemy import select
+from src.models.minasle_models import db, SincronizacaoLeitura
+from src.services.carregamento import TAMANHO_BLOCO_IDS
+# As conquistas de leitura são concedidas pelo motor de regras, assinante do resumo de cada usuário
+from src.services import conquistas
+
+PONTOS_LEITURA_COMPLETA = 100  # Pontos base por completar um livro
+
+def concluir_leitura(leitura):
+    """Marca a conclusão e dá os pontos da leitura
+
+    Só age na primeira conclusão da leitura; retorna se ela foi concluída agora.
+    As conquistas são concedidas pelo motor de regras quando a leitura é gravada.
+    """
+    if leitura.data_conclusao:
+        return False
+
+    leitura.data_conclusao = datetime.utcnow()
+    leitura.pontuacao = PONTOS_LEITURA_COMPLETA
+    return True
+
+def aplicar_progresso(leitura, progresso):
+    """Atualiza o progresso na sessão e conclui a leitura ao chegar a 100%"""
+    leitura.progresso = progresso
+    if progresso == 100:
+        concluir_leitura(leitura)
+
+def carregar_momentos(leitura_ids, sessao=None):
+    """Registros de sincronização das leituras informadas; retorna {leitura_id: registro}"""
+    sessao = sessao or db.session
+    leitura_ids = sorted(set(leitura_ids))
+    registros = {}
+    for inicio in range(0, len(leitura_ids), TAMANHO_BLOCO_IDS):
+        bloco = leitura_ids[inicio:inicio + TAMANHO_BLOCO_IDS]
+        for registro in sessao.scalars(
+            select(SincronizacaoLeitura).where(SincronizacaoLeitura.leitura_id.in_(bloco))
+        ):
+            registros[registro.leitura_id] = registro
+    return registros
+
+def registrar_momento(leitura_id, momento, registros=None, sessao=None):
+    """Guarda o momento da última atualização aplicada à leitura"""
+    sessao = sessao or db.session
+    registro = (registros or {}).get(leitura_id) or sessao.get(SincronizacaoLeitura, leitura_id)
+    if registro is None:
+        registro = SincronizacaoLeitura(leitura_id=leitura_id, atualizado_em=momento)
+        sessao.add(registro)
+        if registros is not None:
+            registros[leitura_id] = registro
+    elif momento > registro.atualizado_em:
+        registro.atualizado_em = momento
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, Leitura
+from src.services.atividade_leitura import registrar_eventos
+from src.services.estatisticas_livros import ajustar_progressos, marcar_popularidade_alterada
+from src.services.estatisticas_usuarios import ajustar_progressos_usuarios
+from src.services.progresso_leitura import carregar_momentos, registrar_momento
+
+logger = logging.getLogger(__name__)
+
+# Configurações do modo write-behind (app.config):
+#   PROGRESSO_WRITE_BEHIND     liga o modo; desligado, todo progresso é gravado na hora
+#   PROGRESSO_INTERVALO_MS     maior tempo que um progresso fica só em memória
+#   PROGRESSO_MAXIMO_PENDENTES leituras pendentes que disparam a gravação antes do prazo
+INTERVALO_PADRAO_MS = 500
+MAXIMO_PENDENTES_PADRAO = 500
+
+def write_behind_ativo(config):
+    return bool(config.get('PROGRESSO_WRITE_BEHIND', False))
+
+class BufferProgresso:
+    """Guarda em memória o último progresso de cada leitura e grava tudo em lote
+
+    Durante uma sessão de leitura o cliente envia o progresso a cada página;
+    só o valor mais recente importa. Em vez de uma transação por página, os
+    valores se acumulam e vão para o banco em uma única transação a cada
+    intervalo ou quando há leituras pendentes demais.
+
+    Um progresso pendente pode ser perdido se o processo cair antes da
+    gravação; por isso conclusões (100%) nunca passam por aqui.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._pendentes = {}
+        self._agendada = None
+        self._app = None
+
+    def registrar(self, app, leitura_id, progresso):
+        """Guarda o progresso; grava o lote se o limite de pendentes foi atingido"""
+        intervalo = app.config.get('PROGRESSO_INTERVALO_MS', INTERVALO_PADRAO_MS) / 1000
+        maximo = app.config.get('PROGRESSO_MAXIMO_PENDENTES', MAXIMO_PENDENTES_PADRAO)
+
+        with self._trava:
+            self._app = app
+            self._pendentes[leitura_id] = (progresso, datetime.utcnow())
+            cheio = len(self._pendentes) >= maximo
+            if not cheio and self._agendada is None:
+                self._agendada = threading.Timer(intervalo, self.gravar)
+                self._agendada.daemon = True
+                self._agendada.start()
+
+        if cheio:
+            self.gravar()
+
+    def pendente(self, leitura_id):
+        """Progresso ainda não gravado da leitura, ou None"""
+        pendente = self._pendentes.get(leitura_id)
+        return pendente[0] if pendente else None
+
+    def descartar(self, leitura_id):
+        """Esquece o progresso pendente de uma leitura que vai ser gravada diretamente"""
+        with self._trava:
+            self._pendentes.pop(leitura_id, None)
+
+    def gravar(self):
+        """Grava todos os progressos pendentes em uma única transação"""
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, {}
+            if self._agendada is not None:
+                self._agendada.cancel()
+                self._agendada = None
+            app = self._app
+        if not pendentes or app is None:
+            return
+
+        try:
+            with app.app_context(), Session(db.engine) as sessao, sessao.begin():
+                _gravar_lote(sessao, pendentes)
+        except Exception:
+            logger.exception('Falha ao gravar progressos de leitura pendentes')
+            # Devolve ao buffer o que não foi substituído por um valor mais novo
+            with self._trava:
+                for leitura_id, pendente in pendentes.items():
+                    self._pendentes.setdefault(leitura_id, pendente)
+
+def _gravar_lote(sessao, pendentes):
+    connection = sessao.connection()
+    # Leituras concluídas enquanto o progresso esperava já foram gravadas
+    # pelo caminho síncrono e não podem voltar para um valor anterior
+    atuais = connection.execute(
+        select(Leitura.id, Leitura.usuario_id, Leitura.livro_id, Leitura.progresso)
+        .where(Leitura.id.in_(list(pendentes)), Leitura.data_conclusao.is_(None))
+    ).all()
+
+    # O momento de cada progresso entra no registro usado pela sincronização
+    # offline, como na gravação direta, para que operações mais antigas que
+    # ele sejam descartadas
+    momentos = carregar_momentos((leitura_id for leitura_id, _, _, _ in atuais), sessao)
+    for leitura_id, _, _, _ in atuais:
+        registrar_momento(leitura_id, pendentes[leitura_id][1], momentos, sessao)
+
+    alteracoes = [
+        (leitura_id, usuario_id, livro_id, progresso) + pendentes[leitura_id]
+        for leitura_id, usuario_id, livro_id, progresso in atuais
+        if progresso != pendentes[leitura_id][0]
+    ]
+    if not alteracoes:
+        return
+
+    connection.exec_driver_sql(
+        'UPDATE leituras SET progresso = ? WHERE id = ? AND data_conclusao IS NULL',
+        [(novo, leitura_id) for leitura_id, _, _, _, novo, _ in alteracoes]
+    )
+    ajustar_progressos(connection, [(livro_id, anterior, novo) for _, _, livro_id, anterior, novo, _ in alteracoes])
+    marcar_popularidade_alterada(sessao, {livro_id for _, _, livro_id, _, _, _ in alteracoes})
+    ajustar_progressos_usuarios(connection, [
+        (usuario_id, livro_id, anterior, novo) for _, usuario_id, livro_id, anterior, novo, _ in alteracoes
+    ])
+    registrar_eventos(connection, [
+        (usuario_id, livro_id, momento, 0, 0) for _, usuario_id, livro_id, _, _, momento in alteracoes
+    ])
+
+buffer_progresso = BufferProgresso()
+
+# Grava o que estiver pendente quando o processo termina normalmente
+atexit.register(buffer_progresso.gravar)
@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, Livro
+from src.services.eventos_catalogo import ao_alterar_catalogo
+
+logger = logging.getLogger(__name__)
+
+PASTA_CATALOGO = 'catalogo'
+ARQUIVO_MANIFESTO = 'manifest.json'
+
+# Versões antigas continuam disponíveis por algum tempo para clientes que
+# leram o manifesto anterior e ainda vão baixar o arquivo
+VERSOES_MANTIDAS = 3
+
+# Segundos de espera para agrupar várias escritas em uma única publicação
+ATRASO_PADRAO = 1.0
+
+# Publicações deste processo (a agendada e as manuais) rodam uma de cada vez
+_trava_publicacao = threading.Lock()
+
+def _gravar(caminho, conteudo):
+    """Grava o arquivo de forma atômica, para nunca servir um arquivo pela metade
+
+    Cada gravação usa o próprio temporário, então outro processo (a linha de
+    comando, por exemplo) gravando o mesmo arquivo não trunca o dela.
+    """
+    pasta, nome = os.path.split(caminho)
+    with tempfile.NamedTemporaryFile(dir=pasta, prefix=f'.{nome}.', suffix='.tmp', delete=False) as arquivo:
+        temporario = arquivo.name
+    try:
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except OSError:
+        os.remove(temporario)
+        raise
+
+def _publicar_instantaneo(pasta, nome, livros):
+    """Grava <nome>.<hash>.json e o irmão .json.gz; retorna o nome do arquivo"""
+    corpo = json.dumps(
+        {'sucesso': True, 'livros': livros, 'total': len(livros)},
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    versao = hashlib.sha256(corpo).hexdigest()[:16]
+    arquivo = f'{nome}.{versao}.json'
+
+    caminho = os.path.join(pasta, arquivo)
+    if not os.path.exists(caminho):
+        # mtime fixo deixa o .gz idêntico para o mesmo conteúdo
+        _gravar(f'{caminho}.gz', gzip.compress(corpo, compresslevel=9, mtime=0))
+        _gravar(caminho, corpo)
+    return arquivo, versao
+
+def _remover_versoes_antigas(pasta, nome, atual):
+    versoes = sorted(
+        (entrada for entrada in os.scandir(pasta)
+         if entrada.name.startswith(f'{nome}.') and entrada.name.endswith('.json')
+         and entrada.name != atual),
+        key=lambda entrada: entrada.stat().st_mtime,
+        reverse=True
+    )
+    for entrada in versoes[VERSOES_MANTIDAS - 1:]:
+        for caminho in (entrada.path, f'{entrada.path}.gz'):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+def publicar_catalogo(pasta_static):
+    """Gera os instantâneos JSON do catálogo completo e das obras regionais
+
+    Os arquivos têm o hash do conteúdo no nome, então podem ser servidos com
+    cache permanente; o manifesto aponta para a versão atual.
+    """
+    with _trava_publicacao:
+        return _publicar_catalogo(pasta_static)
+
+def _publicar_catalogo(pasta_static):
+    pasta = os.path.join(pasta_static, PASTA_CATALOGO)
+    os.makedirs(pasta, exist_ok=True)
+
+    with Session(db.engine) as leitura:
+        livros = [livro.to_dict() for livro in leitura.scalars(select(Livro).order_by(Livro.id))]
+    regionais = [livro for livro in livros if livro['obra_regional']]
+
+    arquivo_livros, versao_livros = _publicar_instantaneo(pasta, 'livros', livros)
+    arquivo_regionais, versao_regionais = _publicar_instantaneo(pasta, 'regionais', regionais)
+
+    manifesto = {
+        'versao': versao_livros,
+        'gerado_em': datetime.utcnow().isoformat(),
+        'livros': {
+            'arquivo': f'{PASTA_CATALOGO}/{arquivo_livros}',
+            'versao': versao_livros,
+            'total': len(livros)
+        },
+        'regionais': {
+            'arquivo': f'{PASTA_CATALOGO}/{arquivo_regionais}',
+            'versao': versao_regionais,
+            'total': len(regionais)
+        }
+    }
+    _gravar(os.path.join(pasta, ARQUIVO_MANIFESTO),
+            json.dumps(manifesto, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    _remover_versoes_antigas(pasta, 'livros', arquivo_livros)
+    _remover_versoes_antigas(pasta, 'regionais', arquivo_regionais)
+    return manifesto
+
+class PublicadorCatalogo:
+    """Agrupa alterações próximas do catálogo em uma única publicação em segundo plano"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._agendada = None
+
+    def agendar(self, app, atraso):
+        with self._trava:
+            if self._agendada is not None:
+                return
+            self._agendada = threading.Timer(atraso, self._publicar, args=(app,))
+            self._agendada.daemon = True
+            self._agendada.start()
+
+    def _publicar(self, app):
+        with self._trava:
+            self._agendada = None
+        with app.app_context():
+            try:
+                publicar_catalogo(app.static_folder)
+            except Exception:
+                logger.exception('Falha ao publicar os instantâneos do catálogo')
+
+publicador_catalogo = PublicadorCatalogo()
+
+@ao_alterar_catalogo
+def _publicar_apos_alteracao(alterados):
+    if not has_app_context() or not current_app.static_folder:
+        return
+
+    atraso = current_app.config.get('CATALOGO_PUBLICACAO_ATRASO', ATRASO_PADRAO)
+    if atraso:
+        publicador_catalogo.agendar(current_app._get_current_object(), atraso)
+    else:
+        publicar_catalogo(current_app.static_folder)
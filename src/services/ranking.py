@@ -0,0 +1,262 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, ClubeLeitura, Escola, EstatisticaUsuario, Leitura, MembroClube, Usuario
+from src.services.paginacao import ParametroInvalido
+
+logger = logging.getLogger(__name__)
+
+# Escopos com classificação própria, além da geral
+ESCOPOS = ('escola', 'cidade', 'clube')
+
+class Classificacao:
+    """Pontuações em um vetor ordenado por (-pontos, usuario_id)
+
+    Posição, topo e vizinhos saem de uma bisseção ou de um recorte do vetor;
+    alterar a pontuação de um usuário remove e reinsere só a chave dele.
+    """
+
+    def __init__(self, pontuacoes=()):
+        self._pontos = dict(pontuacoes)
+        self._chaves = sorted((-pontos, usuario_id) for usuario_id, pontos in self._pontos.items())
+
+    def __len__(self):
+        return len(self._chaves)
+
+    def definir(self, usuario_id, pontos):
+        """Atualiza a pontuação do usuário; None o retira da classificação"""
+        anterior = self._pontos.pop(usuario_id, None)
+        if anterior is not None:
+            del self._chaves[bisect_left(self._chaves, (-anterior, usuario_id))]
+        if pontos is not None:
+            self._pontos[usuario_id] = pontos
+            insort(self._chaves, (-pontos, usuario_id))
+
+    def _itens(self, inicio, fim):
+        return [
+            (posicao, usuario_id, -negativo)
+            for posicao, (negativo, usuario_id) in enumerate(self._chaves[inicio:fim], inicio + 1)
+        ]
+
+    def topo(self, quantidade):
+        """[(posicao, usuario_id, pontos)] dos primeiros colocados"""
+        return self._itens(0, quantidade)
+
+    def indice(self, usuario_id):
+        pontos = self._pontos.get(usuario_id)
+        if pontos is None:
+            return None
+        return bisect_left(self._chaves, (-pontos, usuario_id))
+
+    def ao_redor(self, usuario_id, vizinhos):
+        """(item do usuário, [itens de até `vizinhos` acima e abaixo]) ou (None, [])"""
+        indice = self.indice(usuario_id)
+        if indice is None:
+            return None, []
+        itens = self._itens(max(indice - vizinhos, 0), indice + vizinhos + 1)
+        proprio = next(item for item in itens if item[1] == usuario_id)
+        return proprio, itens
+
+def _participantes(sessao, usuario_ids=None):
+    """{usuario_id: (pontos, {escopo: chaves})} dos alunos com ao menos uma leitura
+
+    As chaves de cada escopo são a escola, a cidade da escola e os clubes
+    de que o aluno participa.
+    """
+    consulta = (
+        select(EstatisticaUsuario.usuario_id, EstatisticaUsuario.pontuacao_total, Usuario.escola_id, Escola.cidade)
+        .join(Usuario, Usuario.id == EstatisticaUsuario.usuario_id)
+        .join(Escola, Escola.id == Usuario.escola_id)
+        .where(Usuario.tipo_usuario == 'aluno', EstatisticaUsuario.total_leituras > 0)
+    )
+    clubes = select(MembroClube.usuario_id, MembroClube.clube_id)
+    if usuario_ids is not None:
+        consulta = consulta.where(EstatisticaUsuario.usuario_id.in_(usuario_ids))
+        clubes = clubes.where(MembroClube.usuario_id.in_(usuario_ids))
+
+    participantes = {
+        usuario_id: (pontos, {'escola': [escola_id], 'cidade': [cidade], 'clube': []})
+        for usuario_id, pontos, escola_id, cidade in sessao.execute(consulta)
+    }
+    for usuario_id, clube_id in sessao.execute(clubes):
+        if usuario_id in participantes:
+            participantes[usuario_id][1]['clube'].append(clube_id)
+    return participantes
+
+class Classificacoes:
+    """Classificação geral e uma por escola, cidade e clube, sobre as mesmas pontuações"""
+
+    def __init__(self, participantes=None):
+        participantes = participantes or {}
+        self.geral = Classificacao((usuario_id, pontos) for usuario_id, (pontos, _) in participantes.items())
+        agrupados = {escopo: defaultdict(list) for escopo in ESCOPOS}
+        for usuario_id, (pontos, grupos) in participantes.items():
+            for escopo, chaves in grupos.items():
+                for chave in chaves:
+                    agrupados[escopo][chave].append((usuario_id, pontos))
+        self.escopos = {
+            escopo: {chave: Classificacao(pontuacoes) for chave, pontuacoes in por_chave.items()}
+            for escopo, por_chave in agrupados.items()
+        }
+        self.grupos = {usuario_id: grupos for usuario_id, (_, grupos) in participantes.items()}
+
+    def definir(self, usuario_id, participante):
+        """Reposiciona o usuário em todos os escopos; None o retira de todos"""
+        pontos, grupos = participante if participante is not None else (None, {})
+        self.geral.definir(usuario_id, pontos)
+        for escopo, chaves in self.grupos.pop(usuario_id, {}).items():
+            for chave in chaves:
+                classificacao = self.escopos[escopo].get(chave)
+                if classificacao is None:
+                    continue
+                classificacao.definir(usuario_id, None)
+                if not classificacao:
+                    del self.escopos[escopo][chave]
+        if pontos is None:
+            return
+        self.grupos[usuario_id] = grupos
+        for escopo, chaves in grupos.items():
+            for chave in chaves:
+                self.escopos[escopo].setdefault(chave, Classificacao()).definir(usuario_id, pontos)
+
+    def classificacao(self, escopo=None, chave=None):
+        if escopo is None:
+            return self.geral
+        return self.escopos[escopo].get(chave) or Classificacao()
+
+def ler_escopo(args):
+    """Lê `escopo` e `id` da query string; retorna (None, None) para o ranking geral
+
+    `id` é o id da escola ou do clube, ou o nome da cidade.
+    """
+    escopo = args.get('escopo', 'geral')
+    if escopo == 'geral':
+        return None, None
+    if escopo not in ESCOPOS:
+        raise ParametroInvalido(f"escopo inválido: {escopo}. Use: geral, {', '.join(ESCOPOS)}")
+
+    chave = (args.get('id') or '').strip()
+    if not chave:
+        raise ParametroInvalido(f'id é obrigatório no escopo {escopo}')
+    if escopo == 'cidade':
+        return escopo, chave
+    try:
+        return escopo, int(chave)
+    except ValueError:
+        raise ParametroInvalido(f'id do escopo {escopo} deve ser um número inteiro')
+
+class RankingPontuacao:
+    """Classificações dos alunos, montadas uma vez e mantidas pelos commits
+
+    A pontuação de cada aluno vem de usuarios_estatisticas, que já é
+    atualizada na transação de cada leitura; depois do commit só os alunos
+    afetados são relidos e reposicionados em cada escopo a que pertencem.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._classificacoes = None
+        # Avança a cada atualização ou descarte, montadas ou não
+        self._versao = 0
+
+    def carregado(self):
+        return self._classificacoes is not None
+
+    def carregar(self):
+        """Monta as classificações a partir do banco de dados e as retorna
+
+        A leitura é feita fora da trava. Se um commit chegou durante ela (a
+        versão avançou), o resultado serve só a esta consulta e não é
+        guardado: a próxima monta de novo com a pontuação confirmada.
+        """
+        with self._trava:
+            versao = self._versao
+        classificacoes = Classificacoes(_participantes(db.session))
+        with self._trava:
+            if self._versao == versao:
+                self._classificacoes = classificacoes
+        return classificacoes
+
+    def descartar(self):
+        """Força a remontagem na próxima consulta"""
+        with self._trava:
+            self._versao += 1
+            self._classificacoes = None
+
+    def atualizar(self, participantes):
+        """Aplica {usuario_id: (pontos, {escopo: chaves}) ou None}"""
+        with self._trava:
+            self._versao += 1
+            if self._classificacoes is None:
+                return
+            for usuario_id, participante in participantes.items():
+                self._classificacoes.definir(usuario_id, participante)
+
+    def _carregadas(self):
+        # Montadas na primeira consulta, ou de novo depois de descartadas
+        classificacoes = self._classificacoes
+        if classificacoes is None:
+            classificacoes = self.carregar()
+        return classificacoes
+
+    def topo(self, quantidade, escopo=None, chave=None):
+        classificacoes = self._carregadas()
+        with self._trava:
+            return classificacoes.classificacao(escopo, chave).topo(quantidade)
+
+    def ao_redor(self, usuario_id, vizinhos, escopo=None, chave=None):
+        """Posição do usuário e colocados ao redor; também retorna o total de participantes"""
+        classificacoes = self._carregadas()
+        with self._trava:
+            classificacao = classificacoes.classificacao(escopo, chave)
+            proprio, itens = classificacao.ao_redor(usuario_id, vizinhos)
+            return proprio, itens, len(classificacao)
+
+ranking_pontuacao = RankingPontuacao()
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_pontuacoes_alteradas(session, flush_context):
+    ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Leitura, MembroClube)):
+            ids.add(obj.usuario_id)
+        elif isinstance(obj, Usuario) and obj.id is not None:
+            ids.add(obj.id)
+        elif isinstance(obj, (Escola, ClubeLeitura)) and (
+                obj in session.deleted or
+                (obj in session.dirty and session.is_modified(obj, include_collections=False))):
+            # Mudam a cidade ou os membros de muitos alunos de uma vez; raras
+            # o bastante para remontar tudo
+            session.info['ranking_remontar'] = True
+    if ids:
+        session.info.setdefault('pontuacoes_alteradas', set()).update(ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pontuacoes_alteradas(session):
+    session.info.pop('pontuacoes_alteradas', None)
+    session.info.pop('ranking_remontar', None)
+
+@event.listens_for(Session, 'after_commit')
+def _atualizar_ranking(session):
+    ids = session.info.pop('pontuacoes_alteradas', None)
+    if session.info.pop('ranking_remontar', False):
+        ranking_pontuacao.descartar()
+        return
+    if not ids:
+        return
+    if not ranking_pontuacao.carregado():
+        # Uma montagem em andamento pode ter lido a pontuação anterior
+        ranking_pontuacao.descartar()
+        return
+
+    try:
+        # A sessão que acabou de confirmar não pode emitir SQL neste evento
+        with Session(db.engine) as leitura:
+            participantes = _participantes(leitura, ids)
+        ranking_pontuacao.atualizar({usuario_id: participantes.get(usuario_id) for usuario_id in ids})
+    except Exception:
+        logger.exception('Falha ao atualizar o ranking de pontuação')
+        ranking_pontuacao.descartar()
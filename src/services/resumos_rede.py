@@ -0,0 +1,253 @@
+from sqlalchemy import and_, case, delete, event, func, insert, literal, or_, select, update
+from sqlalchemy.orm import aliased
+from src.models.minasle_models import db, Escola, EstatisticaUsuario, ResumoRede, Usuario
+from src.services.estatisticas_usuarios import ao_alterar_resumo
+
+_CAMPOS = ('total_escolas', 'total_alunos', 'alunos_ativos', 'total_leituras', 'leituras_completas',
+           'livros_regionais_completos', 'pontuacao_total')
+
+def _chaves(estado, cidade, escola_id):
+    """Chaves dos nós da escola, da cidade e do estado"""
+    return [('escola', estado, cidade, escola_id), ('cidade', estado, cidade, 0), ('estado', estado, '', 0)]
+
+def _garantir_nos(connection, estado, cidade, escola_id):
+    connection.exec_driver_sql(
+        f'INSERT INTO resumos_rede (nivel, estado, cidade, escola_id, {", ".join(_CAMPOS)}) '
+        f'VALUES (?, ?, ?, ?{", 0" * len(_CAMPOS)}) ON CONFLICT DO NOTHING',
+        _chaves(estado, cidade, escola_id)
+    )
+
+def _aplicar(connection, estado, cidade, escola_id, variacao):
+    """Soma {campo: variação} nos nós da escola, da cidade e do estado, em uma única atualização"""
+    variacao = {campo: valor for campo, valor in variacao.items() if valor}
+    if not variacao:
+        return
+    tabela = ResumoRede.__table__
+    connection.execute(
+        update(tabela)
+        .where(or_(*(
+            and_(tabela.c.nivel == nivel, tabela.c.estado == e, tabela.c.cidade == c, tabela.c.escola_id == i)
+            for nivel, e, c, i in _chaves(estado, cidade, escola_id)
+        )))
+        .values({campo: tabela.c[campo] + valor for campo, valor in variacao.items()})
+    )
+
+def _local_escola(connection, escola_id):
+    return connection.execute(select(Escola.estado, Escola.cidade).where(Escola.id == escola_id)).first()
+
+def _contribuicao_aluno(connection, usuario_id, sinal):
+    """Tudo o que um aluno soma nos nós acima dele, com o sinal pedido"""
+    resumo = connection.execute(
+        select(EstatisticaUsuario.total_leituras, EstatisticaUsuario.leituras_completas,
+               EstatisticaUsuario.livros_regionais_completos, EstatisticaUsuario.pontuacao_total)
+        .where(EstatisticaUsuario.usuario_id == usuario_id)
+    ).first()
+    contribuicao = {'total_alunos': 1}
+    if resumo is not None:
+        contribuicao.update(resumo._asdict(), alunos_ativos=1 if resumo.total_leituras > 0 else 0)
+    return {campo: sinal * valor for campo, valor in contribuicao.items()}
+
+def recalcular_resumos_rede(connection):
+    """Recalcula todos os nós a partir dos resumos dos alunos: escolas primeiro, depois cidades e estados"""
+    tabela = ResumoRede.__table__
+    connection.execute(delete(tabela))
+
+    alunos = (
+        select(
+            Usuario.escola_id,
+            func.count(Usuario.id).label('total_alunos'),
+            func.sum(case((EstatisticaUsuario.total_leituras > 0, 1), else_=0)).label('alunos_ativos'),
+            func.sum(EstatisticaUsuario.total_leituras).label('total_leituras'),
+            func.sum(EstatisticaUsuario.leituras_completas).label('leituras_completas'),
+            func.sum(EstatisticaUsuario.livros_regionais_completos).label('livros_regionais_completos'),
+            func.sum(EstatisticaUsuario.pontuacao_total).label('pontuacao_total')
+        )
+        .select_from(Usuario)
+        .outerjoin(EstatisticaUsuario, EstatisticaUsuario.usuario_id == Usuario.id)
+        .where(Usuario.tipo_usuario == 'aluno')
+        .group_by(Usuario.escola_id)
+        .subquery()
+    )
+    connection.execute(insert(tabela).from_select(
+        ['nivel', 'estado', 'cidade', 'escola_id', *_CAMPOS],
+        select(
+            literal('escola'), Escola.estado, Escola.cidade, Escola.id, literal(1),
+            *(func.coalesce(alunos.c[campo], 0) for campo in _CAMPOS[1:])
+        ).select_from(Escola).outerjoin(alunos, alunos.c.escola_id == Escola.id)
+    ))
+
+    escolas = aliased(ResumoRede)
+    somas = [func.sum(getattr(escolas, campo)) for campo in _CAMPOS]
+    connection.execute(insert(tabela).from_select(
+        ['nivel', 'estado', 'cidade', 'escola_id', *_CAMPOS],
+        select(literal('cidade'), escolas.estado, escolas.cidade, literal(0), *somas)
+        .where(escolas.nivel == 'escola').group_by(escolas.estado, escolas.cidade)
+    ))
+    connection.execute(insert(tabela).from_select(
+        ['nivel', 'estado', 'cidade', 'escola_id', *_CAMPOS],
+        select(literal('estado'), escolas.estado, literal(''), literal(0), *somas)
+        .where(escolas.nivel == 'escola').group_by(escolas.estado)
+    ))
+
+def reparar_resumos_rede():
+    """Recalcula os totais da rede e retorna quantas escolas foram resumidas"""
+    recalcular_resumos_rede(db.session.connection())
+    db.session.commit()
+    return db.session.query(func.count()).select_from(ResumoRede).filter(ResumoRede.nivel == 'escola').scalar()
+
+def nos_rede(nivel, estado=None, cidade=None):
+    """Nós de um nível, filtrados pelo prefixo da chave, no formato de ResumoRede.to_dict
+
+    Os filtros seguem a ordem da chave primária, então a listagem é uma
+    leitura contínua do índice. As linhas vêm sem passar pelo ORM, que
+    custaria mais que a própria consulta no painel de um estado inteiro;
+    nas escolas, cada nó traz também o nome.
+    """
+    tabela = ResumoRede.__table__
+    consulta = select(tabela).where(tabela.c.nivel == nivel)
+    if nivel == 'escola':
+        consulta = consulta.add_columns(Escola.nome).join(Escola, Escola.id == tabela.c.escola_id)
+    if estado is not None:
+        consulta = consulta.where(tabela.c.estado == estado)
+    if cidade is not None:
+        consulta = consulta.where(tabela.c.cidade == cidade)
+    linhas = db.session.execute(consulta.order_by(tabela.c.estado, tabela.c.cidade, tabela.c.escola_id))
+    if nivel != 'escola':
+        return [ResumoRede.to_dict(linha) for linha in linhas]
+    return [dict(ResumoRede.to_dict(linha), nome=linha.nome) for linha in linhas]
+
+def _estatisticas_escola(total_alunos, alunos_ativos, total_leituras, leituras_completas, pontuacao_total):
+    return {
+        'total_alunos': total_alunos,
+        'alunos_ativos': alunos_ativos,
+        'taxa_engajamento': round((alunos_ativos / total_alunos * 100), 2) if total_alunos > 0 else 0,
+        'pontuacao_media': round(pontuacao_total / total_leituras, 2) if total_leituras > 0 else 0.0,
+        'livros_completos': leituras_completas
+    }
+
+def estatisticas_escolas(escola_ids):
+    """Estatísticas de gamificação de cada escola, lidas dos nós de escola
+
+    Uma única consulta, pela chave de cada nó; a pontuação média é a média
+    por leitura. Retorna {escola_id: estatisticas}, com zeros para escolas
+    inexistentes.
+    """
+    tabela = ResumoRede.__table__
+    linhas = db.session.execute(
+        select(Escola.id, tabela.c.total_alunos, tabela.c.alunos_ativos, tabela.c.total_leituras,
+               tabela.c.leituras_completas, tabela.c.pontuacao_total)
+        .join(tabela, and_(tabela.c.nivel == 'escola', tabela.c.estado == Escola.estado,
+                           tabela.c.cidade == Escola.cidade, tabela.c.escola_id == Escola.id))
+        .where(Escola.id.in_(escola_ids))
+    )
+    estatisticas = {escola_id: _estatisticas_escola(0, 0, 0, 0, 0) for escola_id in escola_ids}
+    for escola_id, *valores in linhas:
+        estatisticas[escola_id] = _estatisticas_escola(*valores)
+    return estatisticas
+
+@ao_alterar_resumo
+def _somar_variacao_aluno(connection, usuario_id, variacao, total_leituras):
+    anterior = total_leituras - variacao['total_leituras']
+    rede = {
+        'alunos_ativos': (total_leituras > 0) - (anterior > 0),
+        'total_leituras': variacao['total_leituras'],
+        'leituras_completas': variacao['leituras_completas'],
+        'livros_regionais_completos': variacao['livros_regionais_completos'],
+        'pontuacao_total': variacao['pontuacao_total']
+    }
+    # Mudanças só no progresso em andamento não aparecem nos totais da rede
+    if not any(rede.values()):
+        return
+    local = connection.execute(
+        select(Usuario.tipo_usuario, Usuario.escola_id, Escola.estado, Escola.cidade)
+        .join(Escola, Escola.id == Usuario.escola_id)
+        .where(Usuario.id == usuario_id)
+    ).first()
+    if local is not None and local.tipo_usuario == 'aluno':
+        _aplicar(connection, local.estado, local.cidade, local.escola_id, rede)
+
+@event.listens_for(Usuario, 'after_insert')
+def _somar_aluno_cadastrado(mapper, connection, usuario):
+    local = _local_escola(connection, usuario.escola_id) if usuario.tipo_usuario == 'aluno' else None
+    if local is not None:
+        _aplicar(connection, local.estado, local.cidade, usuario.escola_id, {'total_alunos': 1})
+
+@event.listens_for(Usuario, 'before_delete')
+def _descontar_aluno_removido(mapper, connection, usuario):
+    # Antes do DELETE, enquanto o resumo do aluno ainda existe
+    local = _local_escola(connection, usuario.escola_id) if usuario.tipo_usuario == 'aluno' else None
+    if local is not None:
+        _aplicar(connection, local.estado, local.cidade, usuario.escola_id,
+                 _contribuicao_aluno(connection, usuario.id, -1))
+
+@event.listens_for(Usuario, 'after_update')
+def _mover_aluno(mapper, connection, usuario):
+    estado = db.inspect(usuario)
+    historicos = {campo: estado.attrs[campo].history for campo in ('escola_id', 'tipo_usuario')}
+    if not any(historico.has_changes() for historico in historicos.values()):
+        return
+
+    anterior = {
+        campo: historico.deleted[0] if historico.deleted else getattr(usuario, campo)
+        for campo, historico in historicos.items()
+    }
+    for tipo, escola_id, sinal in (
+        (anterior['tipo_usuario'], anterior['escola_id'], -1),
+        (usuario.tipo_usuario, usuario.escola_id, 1)
+    ):
+        local = _local_escola(connection, escola_id) if tipo == 'aluno' else None
+        if local is not None:
+            _aplicar(connection, local.estado, local.cidade, escola_id,
+                     _contribuicao_aluno(connection, usuario.id, sinal))
+
+@event.listens_for(Escola, 'after_insert')
+def _criar_nos_escola(mapper, connection, escola):
+    _garantir_nos(connection, escola.estado, escola.cidade, escola.id)
+    _aplicar(connection, escola.estado, escola.cidade, escola.id, {'total_escolas': 1})
+
+def _retirar_escola(connection, estado, cidade, escola_id):
+    """Desconta a escola da cidade e do estado e apaga o nó dela; retorna os totais que ela tinha
+
+    A cidade e o estado que ficam sem escolas também são apagados, para não
+    aparecerem vazios na navegação.
+    """
+    tabela = ResumoRede.__table__
+    escola, *acima = (
+        and_(tabela.c.nivel == nivel, tabela.c.estado == e, tabela.c.cidade == c, tabela.c.escola_id == i)
+        for nivel, e, c, i in _chaves(estado, cidade, escola_id)
+    )
+    linha = connection.execute(select(*(tabela.c[campo] for campo in _CAMPOS)).where(escola)).first()
+    totais = linha._asdict() if linha is not None else {'total_escolas': 1}
+    _aplicar(connection, estado, cidade, escola_id, {campo: -valor for campo, valor in totais.items()})
+    connection.execute(delete(tabela).where(or_(escola, and_(or_(*acima), tabela.c.total_escolas <= 0))))
+    return totais
+
+@event.listens_for(Escola, 'after_update')
+def _mover_escola(mapper, connection, escola):
+    estado = db.inspect(escola)
+    historicos = {campo: estado.attrs[campo].history for campo in ('estado', 'cidade')}
+    if not any(historico.has_changes() for historico in historicos.values()):
+        return
+
+    anterior = {
+        campo: historico.deleted[0] if historico.deleted else getattr(escola, campo)
+        for campo, historico in historicos.items()
+    }
+    totais = _retirar_escola(connection, anterior['estado'], anterior['cidade'], escola.id)
+    _garantir_nos(connection, escola.estado, escola.cidade, escola.id)
+    _aplicar(connection, escola.estado, escola.cidade, escola.id, totais)
+
+@event.listens_for(Escola, 'after_delete')
+def _remover_escola(mapper, connection, escola):
+    _retirar_escola(connection, escola.estado, escola.cidade, escola.id)
+
+def _criar_resumos_rede(target, connection, **kw):
+    """Preenche os totais da rede em bancos criados antes deles existirem"""
+    resumidas = connection.execute(
+        select(func.count()).select_from(ResumoRede.__table__).where(ResumoRede.nivel == 'escola')
+    ).scalar()
+    cadastradas = connection.execute(select(func.count()).select_from(Escola.__table__)).scalar()
+    if resumidas != cadastradas:
+        recalcular_resumos_rede(connection)
+
+event.listen(db.metadata, 'after_create', _criar_resumos_rede)
@@ -0,0 +1,178 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models.minasle_models import db, EstatisticaLivro, Livro
+from src.services.estatisticas_livros import ao_alterar_popularidade
+from src.services.eventos_catalogo import ao_alterar_catalogo
+from src.services.texto import normalizar
+
+# Prefixos curtos casam com boa parte do catálogo; o resultado deles fica
+# guardado até a próxima alteração de livros.
+TAMANHO_PREFIXO_CACHEADO = 2
+
+# Acima deste número de chaves alteradas em um commit, intercalar o vetor
+# inteiro custa menos que inserir e remover uma a uma
+MAXIMO_ALTERACOES_PONTUAIS = 2000
+
+def _chaves(titulo, autor):
+    """Chaves de busca de um livro: cada sufixo do título e do autor que começa em uma palavra"""
+    chaves = set()
+    for texto in (normalizar(titulo), normalizar(autor)):
+        palavras = texto.split()
+        for i in range(len(palavras)):
+            chaves.add(' '.join(palavras[i:]))
+    return chaves
+
+def _entradas(livros):
+    """Pares (chave, livro_id) de todos os livros informados"""
+    for livro in livros:
+        for chave in _chaves(livro['titulo'], livro['autor']):
+            yield chave, livro['id']
+
+class IndicePrefixos:
+    """Índice em memória de títulos e autores para sugestões enquanto o usuário digita
+
+    As chaves ficam em um vetor ordenado de pares (chave, livro_id) e cada
+    busca faz uma bisseção até o intervalo com o prefixo digitado. Poucos
+    livros alterados entram e saem do vetor um a um, com insort e remoção
+    por bisseção; lotes maiores, como os da importação, são intercalados
+    com ele de uma vez. A trava protege o vetor nas escritas e nas buscas.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._entradas = None
+        self._livros = {}
+        self._cache = {}
+
+    def carregado(self):
+        return self._entradas is not None
+
+    def carregar(self):
+        """Monta o índice a partir do banco de dados, se ainda não estiver montado
+
+        A leitura acontece sob a trava: quem chega durante a montagem espera
+        por ela, e um commit confirmado nesse meio-tempo é aplicado depois.
+        """
+        with self._trava:
+            if self._entradas is not None:
+                return
+            leitores = dict(db.session.execute(
+                select(EstatisticaLivro.livro_id, EstatisticaLivro.leitores)
+            ).all())
+            livros = {}
+            for livro_id, titulo, autor in db.session.execute(select(Livro.id, Livro.titulo, Livro.autor)):
+                livros[livro_id] = {
+                    'id': livro_id,
+                    'titulo': titulo,
+                    'autor': autor,
+                    'popularidade': leitores.get(livro_id, 0)
+                }
+            self._livros = livros
+            self._entradas = sorted(_entradas(livros.values()))
+            self._cache = {}
+
+    def descartar(self):
+        with self._trava:
+            self._entradas = None
+            self._livros = {}
+            self._cache = {}
+
+    def atualizar(self, alterados):
+        """Aplica livros inseridos, editados ou removidos ({id: dict ou None})
+
+        Só as chaves que mudaram saem ou entram no vetor; a popularidade de
+        um livro editado é mantida.
+        """
+        with self._trava:
+            if self._entradas is None:
+                return
+            removidas, inseridas = [], []
+            for livro_id, livro in alterados.items():
+                anterior = self._livros.pop(livro_id, None)
+                antes = _chaves(anterior['titulo'], anterior['autor']) if anterior else set()
+                depois = set()
+                if livro is not None:
+                    self._livros[livro_id] = {
+                        'id': livro_id,
+                        'titulo': livro['titulo'],
+                        'autor': livro['autor'],
+                        'popularidade': anterior['popularidade'] if anterior else 0
+                    }
+                    depois = _chaves(livro['titulo'], livro['autor'])
+                removidas.extend((chave, livro_id) for chave in antes - depois)
+                inseridas.extend((chave, livro_id) for chave in depois - antes)
+
+            if len(removidas) + len(inseridas) <= MAXIMO_ALTERACOES_PONTUAIS:
+                for entrada in removidas:
+                    posicao = bisect_left(self._entradas, entrada)
+                    if posicao < len(self._entradas) and self._entradas[posicao] == entrada:
+                        del self._entradas[posicao]
+                for entrada in inseridas:
+                    insort(self._entradas, entrada)
+            else:
+                removidas = set(removidas)
+                mantidas = [entrada for entrada in self._entradas if entrada not in removidas]
+                self._entradas = list(heapq.merge(mantidas, sorted(inseridas)))
+            self._cache = {}
+
+    def atualizar_popularidade(self, leitores):
+        """Aplica a nova contagem de leitores dos livros informados ({id: leitores})"""
+        with self._trava:
+            if self._entradas is None:
+                return
+            for livro_id, quantidade in leitores.items():
+                livro = self._livros.get(livro_id)
+                if livro is not None and livro['popularidade'] != quantidade:
+                    # Um dicionário novo: resultados já devolvidos continuam intactos
+                    self._livros[livro_id] = dict(livro, popularidade=quantidade)
+            self._cache = {}
+
+    def sugerir(self, prefixo, limite=10):
+        """Retorna até `limite` livros mais populares com título ou autor começando pelo prefixo"""
+        prefixo = normalizar(prefixo)
+        if not prefixo:
+            return []
+
+        with self._trava:
+            if self._entradas is None:
+                return []
+            cacheavel = len(prefixo) <= TAMANHO_PREFIXO_CACHEADO
+            if cacheavel and (prefixo, limite) in self._cache:
+                return self._cache[(prefixo, limite)]
+
+            inicio = bisect_left(self._entradas, (prefixo,))
+            fim = bisect_left(self._entradas, (prefixo + '\uffff',), inicio)
+            ids = {livro_id for _, livro_id in self._entradas[inicio:fim]}
+
+            resultado = heapq.nsmallest(
+                limite,
+                (self._livros[livro_id] for livro_id in ids),
+                key=lambda l: (-l['popularidade'], l['titulo'], l['id'])
+            )
+            if cacheavel:
+                self._cache[(prefixo, limite)] = resultado
+            return resultado
+
+indice_sugestoes = IndicePrefixos()
+
+@ao_alterar_catalogo
+def _atualizar_indice_sugestoes(alterados):
+    indice_sugestoes.atualizar(alterados)
+
+# A popularidade é a contagem de leitores de livros_estatisticas, relida
+# depois de cada commit que altera esses contadores
+
+@ao_alterar_popularidade
+def _atualizar_popularidade(livros):
+    if not indice_sugestoes.carregado():
+        return
+    consulta = select(EstatisticaLivro.livro_id, EstatisticaLivro.leitores)
+    if livros is not None:
+        consulta = consulta.where(EstatisticaLivro.livro_id.in_(livros))
+    # A sessão que acabou de confirmar não pode emitir SQL neste evento
+    with Session(db.engine) as leitura:
+        leitores = dict(leitura.execute(consulta).all())
+    indice_sugestoes.atualizar_popularidade(leitores)
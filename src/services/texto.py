@@ -0,0 +1,27 @@
+import re
+import unicodedata
+
+_PALAVRAS = re.compile(r'\w+')
+
+def normalizar(texto):
+    """Remove acentos, converte para minúsculas e compacta espaços e pontuação"""
+    if not texto:
+        return ''
+    # Texto só com ASCII não tem acentos a remover
+    if not texto.isascii():
+        decomposto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(_PALAVRAS.findall(texto.casefold()))
+
+def trigramas(texto):
+    """Conjunto de trigramas de um texto já normalizado
+
+    Assim como no pg_trgm, cada palavra recebe dois espaços antes e um depois,
+    o que valoriza o início das palavras.
+    """
+    resultado = set()
+    for palavra in texto.split():
+        palavra = f'  {palavra} '
+        for i in range(len(palavra) - 2):
+            resultado.add(palavra[i:i + 3])
+    return resultado
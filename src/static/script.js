@@ -40,13 +40,43 @@ function showSection(sectionId) {
     }
 }
 
-// Carregar livros da API
+// Carregar livros do catálogo publicado (arquivo estático), com a API como alternativa
+async function fetchCatalog() {
+    try {
+        const manifestResponse = await fetch('/catalogo/manifest.json', { cache: 'no-cache' });
+        if (manifestResponse.ok) {
+            const manifest = await manifestResponse.json();
+            const response = await fetch('/' + manifest.livros.arquivo);
+            if (response.ok) {
+                return await response.json();
+            }
+        }
+    } catch (error) {
+        console.warn('Catálogo estático indisponível, usando a API:', error);
+    }
+    
+    // A API entrega o catálogo em páginas: segue o cursor até a última
+    const livros = [];
+    let cursor = null;
+    do {
+        const url = '/api/livros?limit=200' + (cursor ? '&cursor=' + encodeURIComponent(cursor) : '');
+        const response = await fetch(url);
+        const data = await response.json();
+        if (!data.sucesso) {
+            return data;
+        }
+        livros.push(...data.livros);
+        cursor = data.proximo_cursor;
+    } while (cursor);
+
+    return { sucesso: true, livros: livros };
+}
+
 async function loadBooks() {
     try {
         showLoading('livros-container');
         
-        const response = await fetch('/api/livros');
-        const data = await response.json();
+        const data = await fetchCatalog();
         
         if (data.sucesso) {
             allBooks = data.livros;
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.minasle_models import db, AtividadeGamificacao, Escola, Livro, Usuario
+from src.services.cache_catalogo import cache_catalogo
+from src.services.conquistas import regras_conquistas
+from src.services.facetas import indice_facetas
+from src.services.ranking import ranking_pontuacao
+from src.services.sugestoes import indice_sugestoes
+
+SENHA = 'senha123'
+
+def criar_app(pasta_static):
+    """App de teste com os blueprints da API, sem depender de src/main.py"""
+    from src.routes.auth import auth_bp
+    from src.routes.gamificacao import gamificacao_bp
+    from src.routes.leituras import leituras_bp
+    from src.routes.livros import livros_bp
+
+    app = Flask(__name__, static_folder=pasta_static)
+    app.config['SECRET_KEY'] = 'teste'
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['CATALOGO_PUBLICACAO_ATRASO'] = 0
+    for blueprint in (auth_bp, livros_bp, leituras_bp, gamificacao_bp):
+        app.register_blueprint(blueprint, url_prefix='/api')
+    db.init_app(app)
+    return app
+
+def popular(app):
+    """Escola, um pedagogo, alunos, livros e a atividade de leitura completa"""
+    with app.app_context():
+        escola = Escola(nome='Escola Estadual Tiradentes', cidade='Pouso Alegre')
+        db.session.add(escola)
+        db.session.flush()
+
+        usuarios = [Usuario(nome='Pedagoga', email='pedagoga@minasle.com',
+                            tipo_usuario='pedagogo', escola_id=escola.id)]
+        usuarios += [
+            Usuario(nome=f'Aluno {i}', email=f'aluno{i}@minasle.com', tipo_usuario='aluno', escola_id=escola.id)
+            for i in range(1, 6)
+        ]
+        for usuario in usuarios:
+            usuario.set_senha(SENHA)
+        db.session.add_all(usuarios)
+
+        livros = [
+            ('Grande Sertão: Veredas', 'João Guimarães Rosa', 'Romance', True),
+            ('O Cortiço', 'Aluísio Azevedo', 'Romance', False),
+            ('Dom Casmurro', 'Machado de Assis', 'Romance', False),
+            ('Sentimento do Mundo', 'Carlos Drummond de Andrade', 'Poesia', True),
+        ]
+        for titulo, autor, genero, regional in livros * 5:
+            db.session.add(Livro(titulo=titulo, autor=autor, genero=genero, obra_regional=regional))
+
+        db.session.add(AtividadeGamificacao(nome='Primeira Leitura', descricao='Complete sua primeira leitura',
+                                            pontos=50, tipo='leitura_completa'))
+        db.session.commit()
+
+@pytest.fixture
+def app(tmp_path):
+    app = criar_app(str(tmp_path))
+    with app.app_context():
+        db.create_all()
+    popular(app)
+    cache_catalogo.invalidar()
+    ranking_pontuacao.descartar()
+    regras_conquistas.descartar()
+    indice_facetas.descartar()
+    indice_sugestoes.descartar()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+def entrar(cliente, email):
+    resposta = cliente.post('/api/login', json={'email': email, 'senha': SENHA})
+    assert resposta.status_code == 200
+    return resposta.get_json()['usuario']
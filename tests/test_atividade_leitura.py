@@ -0,0 +1,114 @@
+"""Eventos de leitura, totais diários e sequências de dias"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.minasle_models import db, AtividadeDiaria, EventoLeitura
+from src.services.atividade_leitura import dia_local, hoje
+
+from tests.conftest import entrar
+
+def ha(dias):
+    """client_timestamp de `dias` dias atrás, em UTC"""
+    return (datetime.utcnow() - timedelta(days=dias)).isoformat() + 'Z'
+
+def enviar(cliente, *eventos):
+    return cliente.post('/api/leituras/eventos', json=list(eventos))
+
+def atividade(cliente, consulta=''):
+    resposta = cliente.get('/api/leituras/atividade' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()['atividade']
+
+@pytest.fixture
+def aluno(cliente):
+    return entrar(cliente, 'aluno1@minasle.com')
+
+def test_eventos_somam_nos_totais_do_dia(app, cliente, aluno):
+    resposta = enviar(
+        cliente,
+        {'livro_id': 1, 'paginas': 10, 'segundos': 600},
+        {'livro_id': 2, 'paginas': 5, 'segundos': 300},
+        {'livro_id': 1, 'paginas': 3, 'segundos': 120, 'client_timestamp': ha(3)},
+    )
+    assert resposta.status_code == 201
+    assert resposta.get_json()['registrados'] == 3
+
+    with app.app_context():
+        assert EventoLeitura.query.count() == 3
+        dia = db.session.get(AtividadeDiaria, (aluno['id'], hoje()))
+        assert (dia.paginas, dia.segundos, dia.eventos) == (15, 900, 2)
+
+    corpo = atividade(cliente)
+    assert corpo['dias_ativos'] == 2
+    assert (corpo['paginas'], corpo['segundos']) == (18, 1020)
+    assert [dia['paginas'] for dia in corpo['calendario']] == [3, 15]
+
+def test_sequencia_atual_e_maior_sequencia(app, cliente, aluno):
+    # Cinco dias seguidos há uma semana, uma falha, e três dias até ontem
+    enviar(cliente, *({'livro_id': 1, 'paginas': 1, 'client_timestamp': ha(dias)} for dias in (11, 10, 9, 8, 7)))
+    enviar(cliente, *({'livro_id': 1, 'paginas': 1, 'client_timestamp': ha(dias)} for dias in (3, 2, 1)))
+
+    corpo = atividade(cliente)
+    # Sem leitura hoje, a sequência que terminou ontem ainda vale
+    assert corpo['sequencia_atual'] == 3
+    assert corpo['maior_sequencia'] == 5
+
+    enviar(cliente, {'livro_id': 1, 'paginas': 1})
+    assert atividade(cliente)['sequencia_atual'] == 4
+
+def test_sequencia_interrompida(app, cliente, aluno):
+    enviar(cliente, {'livro_id': 1, 'client_timestamp': ha(2)})
+    assert atividade(cliente)['sequencia_atual'] == 0
+    assert atividade(cliente)['maior_sequencia'] == 1
+
+def test_atualizacao_de_progresso_conta_como_dia_de_leitura(app, cliente, aluno):
+    cliente.post('/api/leituras', json={'livro_id': 1})
+    # A sincronização registra o evento no momento em que o aluno leu
+    cliente.post('/api/leituras/sync', json=[
+        {'leitura_id': 1, 'progresso': 10, 'client_timestamp': ha(1)}
+    ])
+    cliente.put('/api/leituras/1', json={'progresso': 20})
+
+    corpo = atividade(cliente)
+    assert corpo['dias_ativos'] == 2
+    assert corpo['sequencia_atual'] == 2
+
+def test_dia_segue_o_fuso_configurado(app):
+    # 02:00 UTC ainda é o dia anterior em Brasília
+    momento = datetime(2024, 3, 2, 2, 0)
+    with app.app_context():
+        assert dia_local(momento).isoformat() == '2024-03-01'
+        app.config['ATIVIDADE_FUSO_HORAS'] = 0
+        assert dia_local(momento).isoformat() == '2024-03-02'
+
+def test_calendario_por_periodo_e_acesso(app, cliente, aluno):
+    enviar(cliente, *({'livro_id': 1, 'paginas': 1, 'client_timestamp': ha(dias)} for dias in (40, 20, 0)))
+    fim = hoje() - timedelta(days=10)
+    corpo = atividade(cliente, f'?inicio={(fim - timedelta(days=60)).isoformat()}&fim={fim.isoformat()}')
+    assert corpo['dias_ativos'] == 2
+
+    assert cliente.get('/api/leituras/atividade?inicio=2024-13-01').status_code == 400
+    assert cliente.get('/api/leituras/atividade?inicio=2024-03-02&fim=2024-03-01').status_code == 400
+    outro = aluno['id'] + 1
+    assert cliente.get(f'/api/leituras/atividade?usuario_id={outro}').status_code == 403
+
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert atividade(cliente, f"?usuario_id={aluno['id']}")['dias_ativos'] == 3
+
+@pytest.mark.parametrize('evento', [
+    {'livro_id': True},
+    {'paginas': 3},
+    {'livro_id': 1, 'paginas': -1},
+    {'livro_id': 1, 'segundos': 1.5},
+    {'livro_id': 1, 'client_timestamp': 'ontem'},
+])
+def test_eventos_invalidos_recusam_o_lote(app, cliente, aluno, evento):
+    assert enviar(cliente, {'livro_id': 1}, evento).status_code == 400
+    with app.app_context():
+        assert EventoLeitura.query.count() == 0
+
+def test_livro_inexistente(app, cliente, aluno):
+    resposta = enviar(cliente, {'livro_id': 999})
+    assert resposta.status_code == 404
+    assert '999' in resposta.get_json()['erro']
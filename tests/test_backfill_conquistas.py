@@ -0,0 +1,102 @@
+"""Concessão retroativa de conquistas em lotes por faixa de usuario_id"""
+import pytest
+
+from src.models.minasle_models import db, AtividadeGamificacao, BackfillConquista, ConquistaUsuario
+from src.services.backfill_conquistas import executar_backfill
+
+from tests.conftest import entrar
+
+def concluir(cliente, email, livros):
+    usuario_id = entrar(cliente, email)['id']
+    for livro_id in livros:
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    return usuario_id
+
+def premiados(app, atividade_id):
+    with app.app_context():
+        return {conquista.usuario_id for conquista in ConquistaUsuario.query.filter_by(atividade_id=atividade_id)}
+
+@pytest.fixture
+def leitores(app, cliente):
+    """Dois livros concluídos por aluno1, aluno2, aluno4 e pela pedagoga; um por aluno3"""
+    ids = {
+        email: concluir(cliente, f'{email}@minasle.com', livros)
+        for email, livros in (('pedagoga', (1, 2)), ('aluno1', (1, 2)), ('aluno2', (3, 4)),
+                              ('aluno3', (1,)), ('aluno4', (2, 3)))
+    }
+    return ids
+
+@pytest.fixture
+def atividade(app, leitores):
+    with app.app_context():
+        atividade = AtividadeGamificacao(nome='Dois Livros', descricao='Complete duas leituras',
+                                         pontos=20, tipo='leitura_multipla', limite=2)
+        db.session.add(atividade)
+        db.session.commit()
+        return atividade.id
+
+def test_concede_so_aos_alunos_que_cumprem_a_regra(app, leitores, atividade):
+    with app.app_context():
+        progresso = executar_backfill(atividade, tamanho_lote=2)
+
+    assert progresso['status'] == 'concluido'
+    assert progresso['progresso'] == 100
+    esperados = {leitores['aluno1'], leitores['aluno2'], leitores['aluno4']}
+    assert premiados(app, atividade) == esperados
+    assert progresso['concedidas'] == 3
+
+def test_retoma_do_ultimo_lote_gravado(app, leitores, atividade):
+    def interromper(progresso):
+        raise RuntimeError('processo interrompido')
+
+    with app.app_context():
+        progresso = executar_backfill(atividade, tamanho_lote=2, ao_progredir=interromper)
+    assert progresso['status'] == 'falhou'
+    assert progresso['erro'] == 'processo interrompido'
+    # O primeiro lote (ids 1 e 2) ficou gravado junto com o cursor
+    assert progresso['ultimo_usuario_id'] == 2
+    assert premiados(app, atividade) == {leitores['aluno1']}
+
+    vistos = []
+    with app.app_context():
+        progresso = executar_backfill(atividade, tamanho_lote=2, ao_progredir=vistos.append)
+    assert [lote['ultimo_usuario_id'] for lote in vistos] == [4, 6]
+    assert progresso['status'] == 'concluido'
+    assert progresso['concedidas'] == 3
+    assert premiados(app, atividade) == {leitores['aluno1'], leitores['aluno2'], leitores['aluno4']}
+
+def test_rotas_de_acompanhamento_e_reinicio(app, cliente, leitores, atividade):
+    app.config['CONQUISTAS_BACKFILL_SEGUNDO_PLANO'] = False
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert cliente.get(f'/api/gamificacao/atividades/{atividade}/backfill').status_code == 404
+
+    resposta = cliente.post(f'/api/gamificacao/atividades/{atividade}/backfill')
+    assert resposta.status_code == 202
+    assert resposta.get_json()['backfill']['status'] == 'concluido'
+    assert len(premiados(app, atividade)) == 3
+
+    # Depois de concluída, refazer recomeça do primeiro usuário; quem já
+    # tem a conquista não a recebe de novo
+    with app.app_context():
+        db.session.query(ConquistaUsuario).filter_by(usuario_id=leitores['aluno2']).delete()
+        db.session.commit()
+    corpo = cliente.post(f'/api/gamificacao/atividades/{atividade}/backfill').get_json()['backfill']
+    assert (corpo['status'], corpo['concedidas']) == ('concluido', 1)
+    assert cliente.get(f'/api/gamificacao/atividades/{atividade}/backfill').get_json()['backfill'] == corpo
+
+    assert cliente.post('/api/gamificacao/atividades/999/backfill').status_code == 404
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.get(f'/api/gamificacao/atividades/{atividade}/backfill').status_code == 403
+
+def test_criar_atividade_inicia_a_concessao(app, cliente, leitores):
+    app.config['CONQUISTAS_BACKFILL_SEGUNDO_PLANO'] = False
+    entrar(cliente, 'pedagoga@minasle.com')
+    corpo = cliente.post('/api/gamificacao/atividades', json={
+        'nome': 'Um Livro', 'descricao': 'Conclua uma leitura', 'tipo': 'leitura_completa'
+    }).get_json()
+    atividade = corpo['atividade']['id']
+
+    assert premiados(app, atividade) == {leitores[f'aluno{i}'] for i in range(1, 5)}
+    with app.app_context():
+        assert db.session.get(BackfillConquista, atividade).status == 'concluido'
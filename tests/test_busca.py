@@ -0,0 +1,112 @@
+"""Busca no catálogo: FTS5 (?q=) e busca aproximada (?busca=)"""
+from sqlalchemy import text
+
+from src.models.minasle_models import db, Livro, LivroNormalizado
+
+def adicionar_livros(app, *livros):
+    with app.app_context():
+        objetos = [Livro(**dados) for dados in livros]
+        db.session.add_all(objetos)
+        db.session.commit()
+        return [livro.id for livro in objetos]
+
+def titulos(resposta):
+    assert resposta.status_code == 200, resposta.get_json()
+    return [livro['titulo'] for livro in resposta.get_json()['livros']]
+
+def test_busca_textual_pesa_titulo_acima_da_descricao(app, cliente):
+    adicionar_livros(
+        app,
+        {'titulo': 'Contos do interior', 'autor': 'Fulano', 'genero': 'Contos',
+         'descricao': 'Histórias do sertão mineiro'},
+        {'titulo': 'Sertão de dentro', 'autor': 'Ciclano', 'genero': 'Romance'},
+    )
+
+    encontrados = titulos(cliente.get('/api/livros?q=sertao'))
+
+    # Cinco exemplares de Grande Sertão no conftest, mais os dois acima
+    assert len(encontrados) == 7
+    assert encontrados[0] == 'Sertão de dentro'
+    assert encontrados[-1] == 'Contos do interior'
+
+def test_busca_textual_aceita_prefixo_e_ignora_acentos(app, cliente):
+    assert set(titulos(cliente.get('/api/livros?q=drumm'))) == {'Sentimento do Mundo'}
+    assert set(titulos(cliente.get('/api/livros?q=CORTIÇO'))) == {'O Cortiço'}
+    assert titulos(cliente.get('/api/livros?q=inexistente')) == []
+
+def test_busca_textual_acompanha_alteracoes_e_remocoes(app, cliente):
+    livro_id, = adicionar_livros(app, {'titulo': 'Vidas Secas', 'autor': 'Graciliano Ramos', 'genero': 'Romance'})
+
+    with app.app_context():
+        db.session.get(Livro, livro_id).titulo = 'Angústia'
+        db.session.commit()
+    assert titulos(cliente.get('/api/livros?q=vidas')) == []
+    assert titulos(cliente.get('/api/livros?q=angustia')) == ['Angústia']
+
+    with app.app_context():
+        db.session.delete(db.session.get(Livro, livro_id))
+        db.session.commit()
+    assert titulos(cliente.get('/api/livros?q=angustia')) == []
+
+def test_busca_textual_pagina_na_ordem_de_relevancia(app, cliente):
+    completa = cliente.get('/api/livros?q=romance&limit=200').get_json()['livros']
+
+    paginas, cursor = [], None
+    while True:
+        url = '/api/livros?q=romance&limit=4' + (f'&cursor={cursor}' if cursor else '')
+        corpo = cliente.get(url).get_json()
+        paginas += corpo['livros']
+        cursor = corpo['proximo_cursor']
+        if not cursor:
+            break
+
+    assert len(completa) == 15
+    assert [livro['id'] for livro in paginas] == [livro['id'] for livro in completa]
+
+def test_busca_aproximada_tolera_acentos_e_erros(app, cliente):
+    corpo = cliente.get('/api/livros?busca=grande sertao').get_json()
+    assert corpo['livros'][0]['titulo'] == 'Grande Sertão: Veredas'
+    assert corpo['livros'][0]['similaridade'] == 1.0
+
+    encontrados = titulos(cliente.get('/api/livros?busca=drumond'))
+    assert encontrados and set(encontrados) == {'Sentimento do Mundo'}
+
+def test_busca_aproximada_aplica_filtros_antes_de_limitar(app, cliente):
+    adicionar_livros(app, *(
+        {'titulo': f'Sertão {i}', 'autor': 'Autor Romance', 'genero': 'Romance'} for i in range(30)
+    ), {'titulo': 'Sertão em versos', 'autor': 'Poeta', 'genero': 'Poesia'})
+
+    assert titulos(cliente.get('/api/livros?busca=sertao&genero=Poesia&limit=2')) == ['Sertão em versos']
+    assert titulos(cliente.get('/api/livros?busca=sertao&autor=poeta&limit=2')) == ['Sertão em versos']
+
+def test_busca_aproximada_pagina_sem_repetir_nem_pular(app, cliente):
+    completa = cliente.get('/api/livros?busca=sertao&limit=200').get_json()['livros']
+
+    paginas, cursor = [], None
+    while True:
+        url = '/api/livros?busca=sertao&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        corpo = cliente.get(url).get_json()
+        paginas += corpo['livros']
+        cursor = corpo['proximo_cursor']
+        if not cursor:
+            break
+
+    assert len(completa) == 5
+    assert [livro['id'] for livro in paginas] == [livro['id'] for livro in completa]
+
+def test_filtro_de_autor_encontra_livros_sem_indice_normalizado(app, cliente):
+    with app.app_context():
+        # Inserção direta, sem os eventos do ORM que mantêm livros_normalizados
+        db.session.execute(text(
+            "INSERT INTO livros (titulo, autor, genero, obra_regional) "
+            "VALUES ('Menino de Engenho', 'José Lins do Rego', 'Romance', 0)"
+        ))
+        db.session.commit()
+
+    assert titulos(cliente.get('/api/livros?autor=Lins do Rego')) == ['Menino de Engenho']
+
+    # O create_all de bancos antigos completa o índice, e o filtro normalizado passa a valer
+    with app.app_context():
+        db.create_all()
+        assert db.session.query(LivroNormalizado).count() == db.session.query(Livro).count()
+    assert titulos(cliente.get('/api/livros?autor=jose lins&genero=Romance')) == ['Menino de Engenho']
@@ -0,0 +1,46 @@
+"""Cache das respostas do catálogo e revalidação por ETag"""
+from src.models.minasle_models import db, Livro
+from src.services.cache_catalogo import cache_catalogo
+
+def test_etag_devolve_304_enquanto_o_catalogo_nao_muda(app, cliente):
+    primeira = cliente.get('/api/livros?limit=5')
+    assert primeira.status_code == 200
+    etag = primeira.headers['ETag']
+    assert primeira.headers['Cache-Control'] == 'no-cache'
+
+    revalidada = cliente.get('/api/livros?limit=5', headers={'If-None-Match': etag})
+    assert revalidada.status_code == 304
+    assert revalidada.headers['ETag'] == etag
+    assert revalidada.get_data() == b''
+
+    # Sem If-None-Match, o mesmo corpo sai do cache
+    assert cliente.get('/api/livros?limit=5').get_data() == primeira.get_data()
+
+def test_alteracao_de_livro_invalida_o_cache(app, cliente):
+    etag = cliente.get('/api/livros/1').headers['ETag']
+    versao = cache_catalogo.versao
+
+    with app.app_context():
+        db.session.get(Livro, 1).titulo = 'Grande Sertão'
+        db.session.commit()
+
+    assert cache_catalogo.versao > versao
+    resposta = cliente.get('/api/livros/1', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+    assert resposta.get_json()['livro']['titulo'] == 'Grande Sertão'
+
+def test_cada_query_string_tem_sua_entrada(app, cliente):
+    romances = cliente.get('/api/livros?genero=Romance&limit=50')
+    poesias = cliente.get('/api/livros?genero=Poesia&limit=50')
+
+    assert romances.headers['ETag'] != poesias.headers['ETag']
+    assert len(romances.get_json()['livros']) == 15
+    assert len(poesias.get_json()['livros']) == 5
+    # A ordem dos parâmetros não muda a chave
+    assert cliente.get('/api/livros?limit=50&genero=Poesia').headers['ETag'] == poesias.headers['ETag']
+
+def test_erros_nao_sao_guardados(app, cliente):
+    assert cliente.get('/api/livros/999').status_code == 404
+    assert 'ETag' not in cliente.get('/api/livros/999').headers
+    assert cliente.get('/api/livros?cursor=invalido').status_code == 400
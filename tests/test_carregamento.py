@@ -0,0 +1,78 @@
+"""Relações carregadas em lote nas listagens, com include e fields"""
+from sqlalchemy import event
+
+from src.models.minasle_models import db
+
+from tests.conftest import entrar
+
+def contar_consultas(app, chamada):
+    """Executa `chamada` e retorna (resposta, número de SELECTs feitos)"""
+    consultas = []
+
+    def registrar(conn, cursor, sql, parametros, contexto, executemany):
+        if sql.lstrip().upper().startswith('SELECT'):
+            consultas.append(sql)
+
+    with app.app_context():
+        motor = db.engine
+    event.listen(motor, 'before_cursor_execute', registrar)
+    try:
+        resposta = chamada()
+    finally:
+        event.remove(motor, 'before_cursor_execute', registrar)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json(), len(consultas)
+
+def iniciar_leituras(cliente, livro_ids):
+    for livro_id in livro_ids:
+        assert cliente.post('/api/leituras', json={'livro_id': livro_id}).status_code == 201
+
+def test_livro_vem_por_padrao_e_include_vazio_o_remove(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    iniciar_leituras(cliente, [1, 2])
+
+    leituras = cliente.get('/api/leituras').get_json()['leituras']
+    assert [leitura['livro']['titulo'] for leitura in leituras] == ['Grande Sertão: Veredas', 'O Cortiço']
+
+    corpo = cliente.get('/api/leituras?include=').get_json()
+    assert all('livro' not in leitura for leitura in corpo['leituras'])
+    assert 'conquistas' not in corpo
+
+def test_conquistas_do_usuario_vem_uma_vez_na_resposta(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    iniciar_leituras(cliente, [1])
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+
+    corpo = cliente.get('/api/leituras?include=livro,conquistas').get_json()
+    assert [conquista['atividade']['nome'] for conquista in corpo['conquistas']] == ['Primeira Leitura']
+    assert corpo['leituras'][0]['livro']['id'] == 1
+
+def test_fields_recorta_a_leitura_e_o_livro(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    iniciar_leituras(cliente, [3])
+
+    leitura, = cliente.get('/api/leituras?fields=id,progresso,livro.titulo').get_json()['leituras']
+    assert leitura == {'id': 1, 'progresso': 0, 'livro': {'titulo': 'Dom Casmurro'}}
+
+def test_include_invalido(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    resposta = cliente.get('/api/leituras?include=livro,escola')
+    assert resposta.status_code == 400
+    assert 'escola' in resposta.get_json()['erro']
+
+def test_consultas_nao_crescem_com_a_pagina(app, cliente):
+    aluno = entrar(cliente, 'aluno1@minasle.com')
+    iniciar_leituras(cliente, [1, 2])
+    url = '/api/leituras?include=livro,conquistas'
+    _, com_duas = contar_consultas(app, lambda: cliente.get(url))
+
+    iniciar_leituras(cliente, range(3, 13))
+    corpo, com_doze = contar_consultas(app, lambda: cliente.get(url))
+    assert len(corpo['leituras']) == 12
+    assert com_doze == com_duas
+
+    # O mesmo vale para o pedagogo consultando o aluno
+    entrar(cliente, 'pedagoga@minasle.com')
+    corpo, consultas = contar_consultas(app, lambda: cliente.get(f"/api/leituras/{aluno['id']}?{url.split('?')[1]}"))
+    assert len(corpo['leituras']) == 12
+    assert consultas <= com_doze + 1
@@ -0,0 +1,165 @@
+"""Motor de regras das conquistas: contadores comparados ao limite de cada atividade"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.minasle_models import (
+    db, AtividadeGamificacao, ClubeLeitura, ConquistaUsuario, ContadoresConquista, Livro, MembroClube
+)
+
+from src.services.conquistas import RegrasConquistas, reparar_contadores
+
+from tests.conftest import entrar
+
+def criar_atividade(app, nome, tipo, limite=1, descricao=''):
+    with app.app_context():
+        atividade = AtividadeGamificacao(nome=nome, descricao=descricao, pontos=10, tipo=tipo, limite=limite)
+        db.session.add(atividade)
+        db.session.commit()
+        return atividade.id
+
+def conquistas(app, usuario_id):
+    with app.app_context():
+        return {conquista.atividade.nome for conquista in ConquistaUsuario.query.filter_by(usuario_id=usuario_id)}
+
+def concluir(cliente, livro_id):
+    leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+    cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+
+@pytest.fixture
+def aluno(cliente):
+    return entrar(cliente, 'aluno1@minasle.com')['id']
+
+def test_regra_usa_o_limite_da_atividade_e_nao_o_texto(app, cliente, aluno):
+    criar_atividade(app, 'Complete 5 leituras', 'leitura_multipla', limite=2, descricao='Leia 5 livros')
+
+    cliente.post('/api/leituras', json={'livro_id': 3})
+    assert conquistas(app, aluno) == set()
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+    assert conquistas(app, aluno) == {'Primeira Leitura'}
+
+    concluir(cliente, 2)
+    assert conquistas(app, aluno) == {'Primeira Leitura', 'Complete 5 leituras'}
+
+def test_obra_regional_inclusive_quando_o_livro_passa_a_ser_regional(app, cliente, aluno):
+    criar_atividade(app, 'Explorador Regional', 'obra_regional', limite=2)
+    concluir(cliente, 1)
+    concluir(cliente, 2)
+    assert 'Explorador Regional' not in conquistas(app, aluno)
+
+    with app.app_context():
+        db.session.get(Livro, 2).obra_regional = True
+        db.session.commit()
+    assert 'Explorador Regional' in conquistas(app, aluno)
+
+def test_sincronizacao_tambem_concede(app, cliente, aluno):
+    cliente.post('/api/leituras/sync', json=[
+        {'livro_id': 3, 'progresso': 100, 'client_timestamp': '2024-03-01T10:00:00Z'}
+    ])
+    assert conquistas(app, aluno) == {'Primeira Leitura'}
+
+def test_clube_sequencia_e_tempo_de_leitura(app, cliente, aluno):
+    criar_atividade(app, 'Participação Ativa', 'participacao_clube')
+    criar_atividade(app, 'Três Dias', 'sequencia_leitura', limite=3)
+    criar_atividade(app, 'Meia Hora', 'tempo_leitura', limite=30)
+
+    with app.app_context():
+        clube = ClubeLeitura(nome='Clube', pedagogo_id=1)
+        db.session.add(clube)
+        db.session.flush()
+        db.session.add(MembroClube(clube_id=clube.id, usuario_id=aluno))
+        db.session.add(MembroClube(clube_id=clube.id, usuario_id=1))
+        db.session.commit()
+    assert conquistas(app, aluno) == {'Participação Ativa'}
+    # A pedagoga também é membro, mas conquistas são só dos alunos
+    assert conquistas(app, 1) == set()
+
+    def evento(dias, segundos):
+        momento = (datetime.utcnow() - timedelta(days=dias)).isoformat() + 'Z'
+        return {'livro_id': 1, 'segundos': segundos, 'client_timestamp': momento}
+
+    cliente.post('/api/leituras/eventos', json=[evento(2, 600), evento(1, 600)])
+    assert conquistas(app, aluno) == {'Participação Ativa'}
+    cliente.post('/api/leituras/eventos', json=[evento(0, 600)])
+    assert conquistas(app, aluno) == {'Participação Ativa', 'Três Dias', 'Meia Hora'}
+
+def test_reparar_contadores(app, cliente, aluno):
+    with app.app_context():
+        clube = ClubeLeitura(nome='Clube', pedagogo_id=1)
+        db.session.add(clube)
+        db.session.flush()
+        db.session.add(MembroClube(clube_id=clube.id, usuario_id=aluno))
+        db.session.commit()
+    momento = datetime.utcnow().isoformat() + 'Z'
+    cliente.post('/api/leituras/eventos', json=[{'livro_id': 1, 'segundos': 600, 'client_timestamp': momento}])
+
+    with app.app_context():
+        db.session.execute(db.update(ContadoresConquista).values(clubes=0, segundos_leitura=0, maior_sequencia=0))
+        db.session.commit()
+
+        assert reparar_contadores() == 6
+        contadores = db.session.get(ContadoresConquista, aluno)
+        assert (contadores.clubes, contadores.segundos_leitura, contadores.maior_sequencia) == (1, 600, 1)
+
+def test_criar_atividade_com_limite(app, cliente, aluno):
+    app.config['CONQUISTAS_BACKFILL_SEGUNDO_PLANO'] = False
+    concluir(cliente, 1)
+    concluir(cliente, 2)
+
+    entrar(cliente, 'pedagoga@minasle.com')
+    resposta = cliente.post('/api/gamificacao/atividades', json={
+        'nome': 'Dois Livros', 'descricao': 'Complete 10 leituras', 'tipo': 'leitura_multipla', 'limite': 2
+    })
+    assert resposta.status_code == 201
+    assert resposta.get_json()['atividade']['limite'] == 2
+    assert 'Dois Livros' in conquistas(app, aluno)
+
+    for limite in (0, True, '3'):
+        resposta = cliente.post('/api/gamificacao/atividades', json={
+            'nome': 'Inválida', 'descricao': 'x', 'tipo': 'leitura_multipla', 'limite': limite
+        })
+        assert resposta.status_code == 400
+
+def test_bancos_antigos_recebem_o_limite_lido_do_texto(app):
+    with app.app_context():
+        conexao = db.session.connection()
+        conexao.exec_driver_sql('ALTER TABLE atividades_gamificacao DROP COLUMN limite')
+        conexao.exec_driver_sql(
+            "INSERT INTO atividades_gamificacao (nome, descricao, pontos, tipo) VALUES "
+            "('Leitor Assíduo', 'Complete 5 leituras', 200, 'leitura_multipla'), "
+            "('Participação Ativa', 'Participe de um clube de leitura', 75, 'participacao_clube')"
+        )
+        db.session.commit()
+
+        db.create_all()
+        limites = {atividade.nome: atividade.limite for atividade in AtividadeGamificacao.query}
+        assert limites == {'Primeira Leitura': 1, 'Leitor Assíduo': 5, 'Participação Ativa': 1}
+
+        # Só na criação da coluna: depois, o limite gravado é o que vale
+        db.session.query(AtividadeGamificacao).filter_by(nome='Leitor Assíduo').update({'limite': 3})
+        db.session.commit()
+        db.create_all()
+        assert db.session.query(AtividadeGamificacao.limite).filter_by(nome='Leitor Assíduo').scalar() == 3
+
+def test_descarte_durante_a_leitura_das_regras_nao_se_perde(app, monkeypatch):
+    regras = RegrasConquistas()
+    carregar = regras._carregar
+    concorrentes = []
+
+    def carregar_com_descarte_no_meio(connection):
+        lidas = carregar(connection)
+        # Uma atividade é alterada e confirmada enquanto as regras são lidas
+        concorrente = threading.Thread(target=regras.descartar)
+        concorrente.start()
+        concorrente.join(0.2)
+        concorrentes.append(concorrente)
+        return lidas
+
+    monkeypatch.setattr(regras, '_carregar', carregar_com_descarte_no_meio)
+    with app.app_context(), db.engine.connect() as conexao:
+        assert regras.alcancadas(conexao, 'leituras_completas', 1) == [1]
+    for concorrente in concorrentes:
+        concorrente.join()
+
+    assert regras._regras is None
@@ -0,0 +1,75 @@
+"""Concessão de uma conquista a uma lista de alunos, a uma escola ou a um clube"""
+import pytest
+
+from src.models.minasle_models import db, ClubeLeitura, ConquistaUsuario, Escola, MembroClube, Usuario
+
+from tests.conftest import entrar
+
+def conceder(cliente, **corpo):
+    return cliente.post('/api/gamificacao/conquistas/lote', json={'atividade_id': 1, **corpo})
+
+def premiados(app):
+    with app.app_context():
+        return sorted(conquista.usuario_id for conquista in ConquistaUsuario.query.filter_by(atividade_id=1))
+
+@pytest.fixture
+def pedagoga(cliente):
+    return entrar(cliente, 'pedagoga@minasle.com')['id']
+
+def test_lista_de_usuarios(app, cliente, pedagoga):
+    resposta = conceder(cliente, usuario_ids=[2, 3, 3, pedagoga, 999])
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    assert (corpo['concedidas'], corpo['ignoradas']) == (2, 0)
+    assert (corpo['excluidos'], corpo['nao_encontrados']) == ([pedagoga], 1)
+    assert premiados(app) == [2, 3]
+
+    # Quem já tem a conquista é contado como ignorado
+    corpo = conceder(cliente, usuario_ids=[3, 4]).get_json()
+    assert (corpo['concedidas'], corpo['ignoradas'], corpo['excluidos'], corpo['nao_encontrados']) == (1, 1, [], 0)
+    assert premiados(app) == [2, 3, 4]
+
+def test_escola_concede_so_aos_alunos_dela(app, cliente, pedagoga):
+    with app.app_context():
+        outra = Escola(nome='Escola Municipal Varginha', cidade='Varginha')
+        db.session.add(outra)
+        db.session.flush()
+        db.session.get(Usuario, 6).escola_id = outra.id
+        db.session.commit()
+
+    corpo = conceder(cliente, escola_id=1).get_json()
+    assert (corpo['concedidas'], corpo['ignoradas']) == (4, 0)
+    assert 'nao_encontrados' not in corpo
+    assert premiados(app) == [2, 3, 4, 5]
+
+def test_clube(app, cliente, pedagoga):
+    with app.app_context():
+        clube = ClubeLeitura(nome='Clube do Sertão', pedagogo_id=pedagoga)
+        db.session.add(clube)
+        db.session.flush()
+        # A pedagoga (id 1) participa do clube, mas não é aluna
+        db.session.add_all([MembroClube(clube_id=clube.id, usuario_id=usuario_id) for usuario_id in (1, 4, 6)])
+        db.session.add(ConquistaUsuario(usuario_id=6, atividade_id=1))
+        db.session.commit()
+        clube_id = clube.id
+
+    corpo = conceder(cliente, clube_id=clube_id).get_json()
+    assert (corpo['concedidas'], corpo['ignoradas']) == (1, 1)
+    assert premiados(app) == [4, 6]
+
+@pytest.mark.parametrize('corpo, status', [
+    ({'usuario_ids': [2, True]}, 400),
+    ({'usuario_ids': '2,3'}, 400),
+    ({'usuario_ids': [2], 'escola_id': 1}, 400),
+    ({}, 400),
+    ({'escola_id': 99}, 404),
+    ({'clube_id': 99}, 404),
+    ({'atividade_id': 99, 'usuario_ids': [2]}, 404),
+])
+def test_pedidos_invalidos_nao_concedem(app, cliente, pedagoga, corpo, status):
+    assert conceder(cliente, **corpo).status_code == status
+    assert premiados(app) == []
+
+def test_apenas_pedagogos(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    assert conceder(cliente, usuario_ids=[2]).status_code == 403
@@ -0,0 +1,67 @@
+"""Detecção de livros possivelmente duplicados"""
+import pytest
+
+from src.models.minasle_models import db, Livro
+from src.services import duplicatas
+from src.services.duplicatas import IndiceSemelhanca
+from src.services.texto import normalizar
+
+from tests.conftest import entrar
+
+def adicionar(indice, chave, titulo, autor):
+    indice.adicionar(chave, normalizar(titulo), normalizar(autor))
+
+def chaves(indice, titulo, autor):
+    return [chave for chave, *_ in indice.semelhantes(normalizar(titulo), normalizar(autor))]
+
+def test_titulos_com_erro_de_digitacao_sao_semelhantes():
+    indice = IndiceSemelhanca()
+    adicionar(indice, 1, 'Memórias Póstumas de Brás Cubas', 'Machado de Assis')
+    adicionar(indice, 2, 'Vidas Secas', 'Graciliano Ramos')
+
+    assert chaves(indice, 'Memorias Postumas de Bras Cuba', 'M. de Assis') == [1]
+    assert chaves(indice, 'Iracema', 'José de Alencar') == []
+
+def test_balde_cheio_e_dividido_pelo_autor(monkeypatch):
+    monkeypatch.setattr(duplicatas, 'TAMANHO_MAXIMO_BALDE', 3)
+    indice = IndiceSemelhanca()
+    poetas = ['Cecília Meireles', 'Manuel Bandeira', 'Adélia Prado', 'Murilo Mendes', 'Ferreira Gullar',
+              'Cora Coralina', 'Hilda Hilst', 'Mário Quintana', 'Ana Cristina Cesar', 'Paulo Leminski']
+    for i, poeta in enumerate(poetas):
+        adicionar(indice, i, 'Poemas', poeta)
+
+    # O último "Poemas" não cabe no balde do título, mas cabe no do autor
+    assert 9 in chaves(indice, 'Poemas', 'Paulo Leminski')
+    assert indice.descartados == 0
+
+def test_entradas_que_nao_cabem_sao_contadas(monkeypatch):
+    monkeypatch.setattr(duplicatas, 'TAMANHO_MAXIMO_BALDE', 2)
+    indice = IndiceSemelhanca()
+    for i in range(5):
+        adicionar(indice, i, 'Dom Casmurro', 'Machado de Assis')
+
+    # Dois no balde do título, dois no do autor; o quinto fica de fora em cada banda
+    assert indice.descartados == duplicatas.BANDAS
+    assert sorted(chaves(indice, 'Dom Casmurro', 'Machado de Assis')) == [0, 1, 2, 3]
+
+def test_relatorio_sugere_manter_o_livro_mais_antigo(app, cliente):
+    with app.app_context():
+        db.session.add(Livro(titulo='Dom Casmuro', autor='Machado de Assis', genero='Romance'))
+        db.session.commit()
+
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.get('/api/livros/duplicatas').status_code == 403
+
+    entrar(cliente, 'pedagoga@minasle.com')
+    corpo = cliente.get('/api/livros/duplicatas?limiar=0.9').get_json()
+    assert corpo['descartados'] == 0
+    mesclar = [par for par in corpo['duplicatas'] if par['mesclar_livro_id'] == 21]
+    assert mesclar and all(par['manter']['titulo'] == 'Dom Casmurro' for par in mesclar)
+    assert all(par['manter_livro_id'] < par['mesclar_livro_id'] for par in corpo['duplicatas'])
+    # As cinco cópias de cada título do conftest formam 10 pares entre si
+    assert corpo['total'] == 4 * 10 + len(mesclar)
+
+@pytest.mark.parametrize('limiar', ['0', '1.5'])
+def test_limiar_invalido(app, cliente, limiar):
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert cliente.get(f'/api/livros/duplicatas?limiar={limiar}').status_code == 400
@@ -0,0 +1,82 @@
+"""Estatísticas de gamificação por escola e a comparação entre escolas"""
+import pytest
+
+from src.models.minasle_models import db, Escola, Usuario
+
+from tests.conftest import entrar
+
+def ler(cliente, url):
+    resposta = cliente.get(url)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def escola(cliente, escola_id):
+    return ler(cliente, f'/api/gamificacao/estatisticas/escola/{escola_id}')['estatisticas']
+
+def comparar(cliente, escolas):
+    return ler(cliente, f'/api/gamificacao/estatisticas/escolas?escolas={escolas}')['escolas']
+
+def ler_livros(cliente, email, livros, concluidos=()):
+    entrar(cliente, email)
+    for livro_id in livros:
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        if livro_id in concluidos:
+            cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+
+@pytest.fixture
+def leituras(app, cliente):
+    """aluno1 conclui dois livros, aluno2 começa um; a pedagoga conclui um, mas não conta"""
+    ler_livros(cliente, 'aluno1@minasle.com', (1, 2), concluidos=(1, 2))
+    ler_livros(cliente, 'aluno2@minasle.com', (3,))
+    ler_livros(cliente, 'pedagoga@minasle.com', (4,), concluidos=(4,))
+
+@pytest.fixture
+def segunda_escola(app):
+    with app.app_context():
+        nova = Escola(nome='Escola Municipal Varginha', cidade='Varginha')
+        db.session.add(nova)
+        db.session.commit()
+        return nova.id
+
+def test_estatisticas_da_escola(app, cliente, leituras):
+    assert escola(cliente, 1) == {
+        'total_alunos': 5,
+        'alunos_ativos': 2,
+        'taxa_engajamento': 40.0,
+        'pontuacao_media': 66.67,
+        'livros_completos': 2
+    }
+
+def test_comparacao_mantem_a_ordem_pedida(app, cliente, leituras, segunda_escola):
+    escolas = comparar(cliente, f'{segunda_escola},1,{segunda_escola},99')
+    assert [item['escola_id'] for item in escolas] == [segunda_escola, 1, 99]
+    assert escolas[1]['livros_completos'] == 2
+    vazia = {'total_alunos': 0, 'alunos_ativos': 0, 'taxa_engajamento': 0, 'pontuacao_media': 0.0,
+             'livros_completos': 0}
+    assert {chave: escolas[0][chave] for chave in vazia} == vazia
+    assert {chave: escolas[2][chave] for chave in vazia} == vazia
+
+def test_estatisticas_acompanham_leituras_e_mudancas_de_escola(app, cliente, leituras, segunda_escola):
+    assert escola(cliente, 1)['livros_completos'] == 2
+
+    ler_livros(cliente, 'aluno2@minasle.com', (5,), concluidos=(5,))
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert escola(cliente, 1)['livros_completos'] == 3
+
+    with app.app_context():
+        db.session.get(Usuario, 2).escola_id = segunda_escola
+        db.session.commit()
+    origem, destino = comparar(cliente, f'1,{segunda_escola}')
+    assert (origem['total_alunos'], origem['alunos_ativos'], origem['livros_completos']) == (4, 1, 1)
+    assert (destino['total_alunos'], destino['alunos_ativos'], destino['livros_completos']) == (1, 1, 2)
+    assert destino['pontuacao_media'] == 100.0
+
+@pytest.mark.parametrize('consulta', ['', '?escolas=', '?escolas=1,a'])
+def test_lista_de_escolas_invalida(app, cliente, consulta):
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert cliente.get('/api/gamificacao/estatisticas/escolas' + consulta).status_code == 400
+
+def test_apenas_pedagogos(app, cliente):
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.get('/api/gamificacao/estatisticas/escola/1').status_code == 403
+    assert cliente.get('/api/gamificacao/estatisticas/escolas?escolas=1').status_code == 403
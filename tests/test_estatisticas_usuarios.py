@@ -0,0 +1,81 @@
+"""Resumo de leituras por usuário, servido pela chave primária"""
+import pytest
+
+from src.models.minasle_models import db, EstatisticaUsuario, Livro
+from src.services.estatisticas_usuarios import reparar_estatisticas_usuarios
+from src.services.progresso_pendente import buffer_progresso
+
+from tests.conftest import entrar
+
+def estatisticas(cliente):
+    resposta = cliente.get('/api/leituras/estatisticas')
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()['estatisticas']
+
+@pytest.fixture
+def aluno(cliente):
+    return entrar(cliente, 'aluno1@minasle.com')
+
+def test_usuario_sem_leituras_tem_resumo_zerado(app, cliente, aluno):
+    assert estatisticas(cliente) == {
+        'total_leituras': 0, 'leituras_completas': 0, 'pontuacao_total': 0,
+        'progresso_medio': 0.0, 'livros_regionais_completos': 0, 'taxa_conclusao': 0
+    }
+
+def test_resumo_acompanha_inicio_progresso_e_conclusao(app, cliente, aluno):
+    # Grande Sertão (1) é regional, O Cortiço (2) não
+    for livro_id in (1, 2, 3):
+        cliente.post('/api/leituras', json={'livro_id': livro_id})
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+    cliente.put('/api/leituras/2', json={'progresso': 100})
+    cliente.put('/api/leituras/3', json={'progresso': 40})
+
+    corpo = estatisticas(cliente)
+    assert corpo['total_leituras'] == 3
+    assert corpo['leituras_completas'] == 2
+    assert corpo['pontuacao_total'] == 200
+    assert corpo['progresso_medio'] == 80.0
+    assert corpo['livros_regionais_completos'] == 1
+    assert corpo['taxa_conclusao'] == 66.67
+
+    # Os outros alunos não são afetados
+    entrar(cliente, 'aluno2@minasle.com')
+    assert estatisticas(cliente)['total_leituras'] == 0
+
+def test_sincronizacao_e_gravacao_em_lote_mantem_o_resumo(app, cliente, aluno):
+    cliente.post('/api/leituras', json={'livro_id': 1})
+    cliente.post('/api/leituras/sync', json=[
+        {'livro_id': 2, 'progresso': 30, 'client_timestamp': '2024-03-01T10:00:00Z'}
+    ])
+    assert estatisticas(cliente)['progresso_medio'] == 15.0
+
+    app.config['PROGRESSO_WRITE_BEHIND'] = True
+    app.config['PROGRESSO_INTERVALO_MS'] = 60000
+    cliente.put('/api/leituras/1', json={'progresso': 50})
+    assert estatisticas(cliente)['progresso_medio'] == 15.0
+    buffer_progresso.gravar()
+    assert estatisticas(cliente)['progresso_medio'] == 40.0
+
+def test_mudar_obra_regional_corrige_quem_ja_concluiu(app, cliente, aluno):
+    cliente.post('/api/leituras', json={'livro_id': 2})
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+    assert estatisticas(cliente)['livros_regionais_completos'] == 0
+
+    with app.app_context():
+        db.session.get(Livro, 2).obra_regional = True
+        db.session.commit()
+    assert estatisticas(cliente)['livros_regionais_completos'] == 1
+
+def test_reparo_recalcula_a_partir_das_leituras(app, cliente, aluno):
+    cliente.post('/api/leituras', json={'livro_id': 1})
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+    with app.app_context():
+        resumo = db.session.get(EstatisticaUsuario, aluno['id'])
+        resumo.total_leituras = 7
+        resumo.pontuacao_total = 0
+        db.session.commit()
+        total_usuarios = reparar_estatisticas_usuarios()
+        assert total_usuarios == EstatisticaUsuario.query.count() > 1
+
+    corpo = estatisticas(cliente)
+    assert (corpo['total_leituras'], corpo['pontuacao_total'], corpo['livros_regionais_completos']) == (1, 100, 1)
@@ -0,0 +1,77 @@
+"""Contagens de facetas do catálogo"""
+import threading
+from src.models.minasle_models import db, Livro
+from src.services.facetas import IndiceFacetas
+
+def contagens(cliente, consulta=''):
+    corpo = cliente.get('/api/livros/facetas' + consulta).get_json()
+    assert corpo['sucesso']
+    return {faceta: {item['valor']: item['total'] for item in itens} for faceta, itens in corpo['facetas'].items()}, corpo['total']
+
+def test_contagens_do_catalogo_inteiro(app, cliente):
+    facetas, total = contagens(cliente)
+
+    assert total == 20
+    assert facetas['genero'] == {'Romance': 15, 'Poesia': 5}
+    assert facetas['obra_regional'] == {True: 10, False: 10}
+    assert facetas['autor']['Machado de Assis'] == 5
+    assert len(facetas['autor']) == 4
+
+def test_cada_faceta_ignora_o_proprio_filtro(app, cliente):
+    facetas, total = contagens(cliente, '?genero=poesia')
+
+    assert total == 5
+    # Os gêneros continuam listados para o usuário trocar de filtro
+    assert facetas['genero'] == {'Romance': 15, 'Poesia': 5}
+    assert facetas['autor'] == {'Carlos Drummond de Andrade': 5}
+    assert facetas['obra_regional'] == {True: 5}
+
+    facetas, total = contagens(cliente, '?obra_regional=true&autor=JOAO GUIMARAES ROSA')
+    assert total == 5
+    assert facetas['genero'] == {'Romance': 5}
+    assert facetas['obra_regional'] == {True: 5}
+
+def test_total_coincide_com_a_listagem(app, cliente):
+    for consulta in ('?genero=Romance', '?obra_regional=false', '?genero=Romance&obra_regional=true'):
+        _, total = contagens(cliente, consulta)
+        assert cliente.get('/api/livros' + consulta + '&total=true').get_json()['total'] == total
+
+def test_contagens_acompanham_alteracoes_do_catalogo(app, cliente):
+    contagens(cliente)
+
+    with app.app_context():
+        db.session.add(Livro(titulo='Vidas Secas', autor='Graciliano Ramos', genero='Romance'))
+        db.session.get(Livro, 4).genero = 'Crônica'
+        db.session.delete(db.session.get(Livro, 8))
+        db.session.commit()
+
+    facetas, total = contagens(cliente)
+    assert total == 20
+    assert facetas['genero'] == {'Romance': 16, 'Poesia': 3, 'Crônica': 1}
+    assert facetas['autor']['Graciliano Ramos'] == 1
+    assert facetas['autor']['Carlos Drummond de Andrade'] == 4
+
+def test_alteracao_confirmada_durante_a_carga_nao_se_perde(app, monkeypatch):
+    indice = IndiceFacetas()
+    novo = {'genero': 'Crônica', 'autor': 'Rubem Braga', 'obra_regional': False}
+    execute = db.session.execute
+    concorrentes = []
+
+    def execute_com_commit_no_meio(*args, **kwargs):
+        resultado = execute(*args, **kwargs)
+        # Um commit de outra requisição chega enquanto o índice é montado
+        concorrente = threading.Thread(target=indice.atualizar, args=({999: novo},))
+        concorrente.start()
+        concorrente.join(0.2)
+        concorrentes.append(concorrente)
+        return resultado
+
+    with app.app_context():
+        monkeypatch.setattr(db.session, 'execute', execute_com_commit_no_meio)
+        indice.carregar()
+        for concorrente in concorrentes:
+            concorrente.join()
+
+    facetas, total = indice.contar()
+    assert total == 21
+    assert {'valor': 'Rubem Braga', 'total': 1} in facetas['autor']
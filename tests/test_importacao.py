@@ -0,0 +1,113 @@
+"""Importação do catálogo em lote e contagens de trigramas"""
+import io
+import json
+from collections import Counter
+
+from sqlalchemy import select
+
+from src.models.minasle_models import db, FrequenciaTrigrama, Livro, TrigramaLivro
+from src.services.importacao import importar_catalogo
+
+from tests.conftest import entrar
+
+CSV = (
+    'titulo,autor,genero,obra_regional\n'
+    'Vidas Secas,Graciliano Ramos,Romance,sim\n'
+    'VIDAS SECAS,Graciliano Ramos,Romance,\n'  # repetida no mesmo lote
+    ',Sem Título,Romance,\n'
+    'Dom Casmurro,Machado de Assis,Romance,\n'  # já está no catálogo
+    'Angústia,Graciliano Ramos,Romance,0\n'
+    'Menino de Engenho,José Lins do Rego,Romance,\n'
+    'Angustia,Graciliano Ramos,Romance,\n'  # repetida em outro lote
+)
+
+def importar(app, texto, formato='csv', **opcoes):
+    with app.app_context():
+        return importar_catalogo(io.StringIO(texto), formato, **opcoes)
+
+def frequencias(app):
+    """Frequências gravadas e as contadas a partir das listas invertidas"""
+    with app.app_context():
+        gravadas = dict(db.session.execute(select(FrequenciaTrigrama.trigrama, FrequenciaTrigrama.livros)).all())
+        contadas = Counter(trigrama for trigrama, in db.session.execute(select(TrigramaLivro.trigrama)))
+    return gravadas, dict(contadas)
+
+def test_relatorio_conta_inseridos_duplicados_e_erros(app):
+    relatorio = importar(app, CSV, tamanho_lote=2)
+
+    assert relatorio['linhas'] == 7
+    assert relatorio['inseridos'] == 3
+    assert relatorio['duplicados'] == 3
+    assert relatorio['total_erros'] == 1
+    assert relatorio['erros'] == [{'linha': 4, 'erro': 'Título e autor são obrigatórios'}]
+
+    with app.app_context():
+        assert Livro.query.count() == 23
+        vidas_secas = Livro.query.filter_by(titulo='Vidas Secas').one()
+        assert vidas_secas.obra_regional is True
+
+def test_reimportar_o_arquivo_nao_duplica(app):
+    importar(app, CSV)
+    relatorio = importar(app, CSV)
+
+    assert relatorio['inseridos'] == 0
+    assert relatorio['duplicados'] == 6
+
+def test_jsonl_com_linhas_invalidas(app):
+    linhas = [
+        json.dumps({'titulo': 'Sagarana', 'autor': 'João Guimarães Rosa', 'obra_regional': True}),
+        '{quebrado',
+        '[1, 2]',
+        json.dumps({'titulo': 'x' * 301, 'autor': 'Alguém'}),
+    ]
+    relatorio = importar(app, '\n'.join(linhas), 'jsonl')
+
+    assert relatorio['inseridos'] == 1
+    assert relatorio['total_erros'] == 3
+    assert [erro['linha'] for erro in relatorio['erros']] == [2, 3, 4]
+
+def test_livros_importados_entram_nas_buscas(app, cliente):
+    importar(app, CSV)
+
+    assert [l['titulo'] for l in cliente.get('/api/livros?q=engenho').get_json()['livros']] == ['Menino de Engenho']
+    assert cliente.get('/api/livros?busca=angustia').get_json()['livros'][0]['titulo'] == 'Angústia'
+    assert cliente.get('/api/livros/facetas?autor=graciliano ramos').get_json()['total'] == 2
+
+def test_semelhantes_sao_importados_e_relatados(app):
+    relatorio = importar(app, 'titulo,autor\nDom Casmuro,Machado de Assis\n', verificar_semelhantes=True)
+
+    assert relatorio['inseridos'] == 1
+    assert relatorio['total_semelhantes'] == 1
+    assert relatorio['semelhantes'][0]['semelhante_a']['livro_id'] in (3, 7, 11, 15, 19)
+
+    # Sem pedir, a verificação não é feita
+    relatorio = importar(app, 'titulo,autor\nDom Casmurrro,Machado de Assis\n')
+    assert relatorio['inseridos'] == 1
+    assert relatorio['total_semelhantes'] == 0
+
+def test_frequencias_de_trigramas_acompanham_o_catalogo(app):
+    importar(app, CSV)
+    gravadas, contadas = frequencias(app)
+    assert gravadas == contadas
+
+    with app.app_context():
+        livro = Livro.query.filter_by(titulo='Vidas Secas').one()
+        livro.titulo = 'Caetés'
+        db.session.delete(Livro.query.filter_by(titulo='Menino de Engenho').one())
+        db.session.commit()
+
+    gravadas, contadas = frequencias(app)
+    assert gravadas == contadas
+    # Trigramas exclusivos dos livros alterados ou removidos não ficam zerados na tabela
+    assert 'eng' not in gravadas and 'vid' not in gravadas
+
+def test_importacao_exige_pedagogo(app, cliente):
+    arquivo = {'arquivo': (io.BytesIO(CSV.encode()), 'livros.csv')}
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.post('/api/livros/importar', data=arquivo).status_code == 403
+
+    entrar(cliente, 'pedagoga@minasle.com')
+    arquivo = {'arquivo': (io.BytesIO(CSV.encode()), 'livros.csv')}
+    resposta = cliente.post('/api/livros/importar', data=arquivo)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['relatorio']['inseridos'] == 3
@@ -0,0 +1,52 @@
+"""Paginação por cursor das listagens"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from src.models.minasle_models import db, Livro
+
+def percorrer(cliente, url):
+    """Segue o proximo_cursor até o fim; retorna os ids na ordem recebida e o corpo da primeira página"""
+    ids, cursor, primeira = [], None, None
+    while True:
+        corpo = cliente.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        primeira = primeira or corpo
+        ids += [livro['id'] for livro in corpo['livros']]
+        cursor = corpo['proximo_cursor']
+        if not cursor:
+            return ids, primeira
+
+def test_total_so_quando_pedido(app, cliente):
+    corpo = cliente.get('/api/livros?limit=5').get_json()
+    assert 'total' not in corpo
+    assert len(corpo['livros']) == 5
+
+    assert cliente.get('/api/livros?limit=5&total=true').get_json()['total'] == 20
+
+@pytest.mark.parametrize('ordenar', ['id', 'titulo', 'recentes', 'data_adicao', 'populares'])
+def test_paginas_nao_repetem_nem_pulam_livros(app, cliente, ordenar):
+    ids, primeira = percorrer(cliente, f'/api/livros?ordenar={ordenar}&limit=3&total=true')
+
+    assert primeira['total'] == 20
+    assert sorted(ids) == list(range(1, 21))
+
+def test_livros_sem_data_de_adicao_entram_na_paginacao(app, cliente):
+    with app.app_context():
+        db.session.get(Livro, 7).data_adicao = datetime(2001, 1, 1)
+        # Inserção direta, sem a data que o ORM preencheria
+        db.session.execute(text(
+            "INSERT INTO livros (titulo, autor, genero, obra_regional) VALUES ('Vidas Secas', 'Graciliano Ramos', 'Romance', 0)"
+        ))
+        db.session.commit()
+        assert db.session.query(Livro).filter(Livro.data_adicao.is_(None)).count() == 0
+
+    for direcao in ('asc', 'desc'):
+        ids, _ = percorrer(cliente, f'/api/livros?ordenar=data_adicao&direcao={direcao}&limit=4')
+        assert sorted(ids) == list(range(1, 22))
+    assert ids[-1] == 7
+
+def test_cursor_invalido(app, cliente):
+    assert cliente.get('/api/livros?cursor=nao-e-um-cursor').status_code == 400
+    assert cliente.get('/api/livros?ordenar=inexistente').status_code == 400
+    assert cliente.get('/api/livros?limit=0').status_code == 400
@@ -0,0 +1,102 @@
+"""Painel da turma do pedagogo: métricas por aluno, ordenações e paginação"""
+from datetime import datetime
+
+import pytest
+
+from src.models.minasle_models import db, AcompanhamentoPedagogico
+
+from tests.conftest import entrar
+
+def ler(cliente, consulta=''):
+    resposta = cliente.get('/api/pedagogo/turma' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def ids(cliente, consulta=''):
+    return [aluno['id'] for aluno in ler(cliente, consulta)['alunos']]
+
+def ler_livros(cliente, email, progressos):
+    entrar(cliente, email)
+    for livro_id, progresso in progressos:
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        if progresso:
+            cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': progresso})
+
+@pytest.fixture
+def turma(app, cliente):
+    """Alunos de ids 2 a 6; o 2 concluiu dois livros, o 3 leu metade de um,
+    o 4 concluiu um e começou outro, nesta ordem; o 5 e o 6 não leram"""
+    ler_livros(cliente, 'aluno1@minasle.com', [(1, 100), (2, 100)])
+    ler_livros(cliente, 'aluno2@minasle.com', [(3, 50)])
+    ler_livros(cliente, 'aluno3@minasle.com', [(1, 100), (4, 0)])
+    entrar(cliente, 'pedagoga@minasle.com')
+
+def test_metricas_de_cada_aluno(app, cliente, turma):
+    alunos = {aluno['id']: aluno for aluno in ler(cliente)['alunos']}
+    assert set(alunos) == {2, 3, 4, 5, 6}
+    resumo = {
+        aluno_id: (aluno['total_leituras'], aluno['leituras_completas'], aluno['leituras_em_andamento'],
+                   aluno['progresso_medio'], aluno['pontuacao_total'], aluno['total_conquistas'])
+        for aluno_id, aluno in alunos.items()
+    }
+    assert resumo == {
+        2: (2, 2, 0, 100.0, 200, 1),
+        3: (1, 0, 1, 50.0, 0, 0),
+        4: (2, 1, 1, 50.0, 100, 1),
+        5: (0, 0, 0, 0.0, 0, 0),
+        6: (0, 0, 0, 0.0, 0, 0),
+    }
+    assert alunos[5]['ultima_atividade'] is None
+    assert alunos[4]['ultima_atividade'] > alunos[3]['ultima_atividade'] > alunos[2]['ultima_atividade']
+
+@pytest.mark.parametrize('consulta, esperado', [
+    ('', [2, 3, 4, 5, 6]),
+    ('?direcao=desc', [6, 5, 4, 3, 2]),
+    # Métricas ordenam da maior para a menor, com empates pelo id na mesma direção
+    ('?ordenar=pontuacao_total', [2, 4, 6, 5, 3]),
+    ('?ordenar=pontuacao_total&direcao=asc', [3, 5, 6, 4, 2]),
+    ('?ordenar=total_leituras', [4, 2, 3, 6, 5]),
+    ('?ordenar=leituras_em_andamento', [4, 3, 6, 5, 2]),
+    ('?ordenar=progresso_medio', [2, 4, 3, 6, 5]),
+    ('?ordenar=total_conquistas', [4, 2, 6, 5, 3]),
+    # Quem nunca leu fica por último
+    ('?ordenar=ultima_atividade', [4, 3, 2, 6, 5]),
+    ('?ordenar=ultima_atividade&direcao=asc', [5, 6, 2, 3, 4]),
+])
+def test_ordenacoes(app, cliente, turma, consulta, esperado):
+    assert ids(cliente, consulta) == esperado
+
+@pytest.mark.parametrize('ordenar', ['nome', 'pontuacao_total', 'ultima_atividade'])
+def test_paginas_seguem_a_ordenacao_sem_repetir(app, cliente, turma, ordenar):
+    completa = ids(cliente, f'?ordenar={ordenar}')
+    percorridos, cursor = [], None
+    while True:
+        corpo = ler(cliente, f'?ordenar={ordenar}&limit=2&total=true' + (f'&cursor={cursor}' if cursor else ''))
+        assert corpo['total'] == 5
+        percorridos += [aluno['id'] for aluno in corpo['alunos']]
+        cursor = corpo['proximo_cursor']
+        if cursor is None:
+            break
+    assert percorridos == completa
+
+def test_inclusoes_e_campos(app, cliente, turma):
+    with app.app_context():
+        db.session.add_all([
+            AcompanhamentoPedagogico(aluno_id=2, pedagogo_id=1, data=datetime(2024, 3, 1), observacoes='antigo'),
+            AcompanhamentoPedagogico(aluno_id=2, pedagogo_id=1, data=datetime(2024, 4, 1), observacoes='recente'),
+        ])
+        db.session.commit()
+
+    alunos = {aluno['id']: aluno for aluno in ler(cliente)['alunos']}
+    assert alunos[2]['acompanhamento']['observacoes'] == 'recente'
+    assert alunos[3]['acompanhamento'] is None
+    assert [conquista['atividade']['nome'] for conquista in alunos[2]['conquistas']] == ['Primeira Leitura']
+
+    aluno, *_ = ler(cliente, '?include=&fields=id,pontuacao_total&ordenar=pontuacao_total')['alunos']
+    assert aluno == {'id': 2, 'pontuacao_total': 200}
+
+def test_parametros_invalidos_e_acesso(app, cliente, turma):
+    assert cliente.get('/api/pedagogo/turma?ordenar=email').status_code == 400
+    assert cliente.get('/api/pedagogo/turma?include=livros').status_code == 400
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.get('/api/pedagogo/turma').status_code == 403
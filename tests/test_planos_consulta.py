@@ -0,0 +1,214 @@
+"""Regressão de planos de consulta dos endpoints mais acessados
+
+Cada endpoint é chamado contra o banco populado; todas as consultas SELECT
+que ele executa são capturadas e passadas por EXPLAIN QUERY PLAN. O teste
+falha se alguma delas varrer uma tabela inteira ou ordenar em uma B-tree
+temporária.
+
+Todo passo SCAN conta como varredura, inclusive os que percorrem um índice
+inteiro (USING INDEX, USING COVERING INDEX). Uma varredura só é aceita
+quando é o percurso de uma página: a consulta tem ORDER BY atendido pelo
+próprio índice (sem B-tree temporária), LIMIT e nenhum filtro no WHERE,
+de modo que cada linha lida vai para a resposta e a leitura para assim
+que a página enche.
+"""
+import re
+
+import pytest
+from sqlalchemy import event
+
+from src.models.minasle_models import db
+from tests.conftest import entrar
+
+ALUNO = 'aluno1@minasle.com'
+PEDAGOGA = 'pedagoga@minasle.com'
+
+VARREDURA = re.compile(r'^SCAN ')
+
+def capturar_consultas(app, chamada):
+    """Executa `chamada` e retorna as consultas SELECT feitas, com seus parâmetros"""
+    consultas = []
+
+    def registrar(conn, cursor, sql, parametros, contexto, executemany):
+        if not executemany and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            consultas.append((sql, parametros))
+
+    with app.app_context():
+        motor = db.engine
+    event.listen(motor, 'before_cursor_execute', registrar)
+    try:
+        resposta = chamada()
+    finally:
+        event.remove(motor, 'before_cursor_execute', registrar)
+    assert resposta.status_code < 400, resposta.get_json()
+    return consultas
+
+def problemas_do_plano(app, sql, parametros):
+    with app.app_context(), db.engine.connect() as conexao:
+        plano = [linha[3] for linha in conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parametros)]
+
+    ordenacao_temporaria = [passo for passo in plano if 'TEMP B-TREE' in passo]
+    varreduras = [passo for passo in plano if VARREDURA.match(passo)]
+    if varreduras and not ordenacao_temporaria and percorre_uma_pagina(sql):
+        return []
+    return ordenacao_temporaria + varreduras
+
+def percorre_uma_pagina(sql):
+    """A consulta ordena, limita e não filtra: a varredura para na última linha da página"""
+    def tem(palavra):
+        return re.search(rf'\b{palavra}\b', sql, re.IGNORECASE) is not None
+    return tem('ORDER BY') and tem('LIMIT') and not tem('WHERE')
+
+def verificar(app, chamada):
+    consultas = capturar_consultas(app, chamada)
+    assert consultas, 'nenhuma consulta capturada'
+    falhas = []
+    for sql, parametros in consultas:
+        problemas = problemas_do_plano(app, sql, parametros)
+        if problemas:
+            falhas.append(f'{" ".join(sql.split())}\n    -> {problemas}')
+    assert not falhas, 'Consultas sem índice:\n' + '\n'.join(falhas)
+
+@pytest.fixture
+def aluno(cliente):
+    usuario = entrar(cliente, ALUNO)
+    for livro_id in (1, 2, 3):
+        cliente.post('/api/leituras', json={'livro_id': livro_id})
+    cliente.put('/api/leituras/1', json={'progresso': 100})
+    return usuario
+
+# O total do catálogo sem filtro conta todos os livros, o que por definição
+# percorre a tabela inteira; com filtro, a contagem usa índice.
+@pytest.mark.parametrize('url', [
+    '/api/livros',
+    '/api/livros?ordenar=titulo',
+    '/api/livros?ordenar=recentes',
+    '/api/livros?ordenar=populares',
+    '/api/livros?ordenar=data_adicao&direcao=desc',
+    '/api/livros?obra_regional=true&total=true',
+    '/api/livros/regionais',
+    '/api/livros/1',
+])
+def test_catalogo(app, cliente, url):
+    verificar(app, lambda: cliente.get(url))
+
+@pytest.mark.parametrize('url', [
+    '/api/leituras',
+    '/api/leituras?ordenar=data_inicio',
+    '/api/leituras?include=livro,conquistas',
+    '/api/leituras/estatisticas',
+    '/api/leituras/atividade',
+])
+def test_leituras_do_aluno(app, cliente, aluno, url):
+    verificar(app, lambda: cliente.get(url))
+
+def test_leituras_de_um_aluno_pelo_pedagogo(app, cliente, aluno):
+    entrar(cliente, PEDAGOGA)
+    verificar(app, lambda: cliente.get(f"/api/leituras/{aluno['id']}?ordenar=data_inicio&direcao=desc"))
+
+def test_iniciar_leitura(app, cliente, aluno):
+    verificar(app, lambda: cliente.post('/api/leituras', json={'livro_id': 4}))
+
+def test_atualizar_progresso(app, cliente, aluno):
+    verificar(app, lambda: cliente.put('/api/leituras/2', json={'progresso': 100}))
+
+def test_sincronizar_leituras(app, cliente, aluno):
+    operacoes = [
+        {'leitura_id': 2, 'progresso': 40, 'client_timestamp': '2024-03-01T10:00:00Z'},
+        {'livro_id': 5, 'progresso': 10, 'client_timestamp': '2024-03-01T10:05:00Z'},
+    ]
+    verificar(app, lambda: cliente.post('/api/leituras/sync', json=operacoes))
+
+def test_conquistas_do_usuario(app, cliente, aluno):
+    verificar(app, lambda: cliente.get(f"/api/gamificacao/conquistas/{aluno['id']}"))
+
+@pytest.mark.parametrize('url', [
+    '/api/gamificacao/ranking',
+    '/api/gamificacao/ranking/posicao?vizinhos=2',
+    '/api/gamificacao/ranking?escopo=escola&id=1',
+    '/api/gamificacao/ranking?periodo=semana',
+    '/api/gamificacao/ranking?periodo=mes&escopo=escola&id=1',
+    '/api/gamificacao/ranking/posicao?escopo=cidade&id=Pouso Alegre',
+])
+def test_ranking(app, cliente, aluno, url):
+    # A montagem inicial lê a tabela inteira uma única vez; as consultas de
+    # cada requisição depois dela é que não podem varrer tabelas
+    cliente.get('/api/gamificacao/ranking')
+    verificar(app, lambda: cliente.get(url))
+
+@pytest.mark.parametrize('corpo', [
+    {'atividade_id': 1, 'escola_id': 1},
+    {'atividade_id': 1, 'usuario_ids': [2, 3, 4]},
+])
+def test_conceder_conquista_em_lote(app, cliente, corpo):
+    entrar(cliente, PEDAGOGA)
+    verificar(app, lambda: cliente.post('/api/gamificacao/conquistas/lote', json=corpo))
+
+@pytest.mark.parametrize('url', [
+    '/api/gamificacao/estatisticas/escola/1',
+    '/api/gamificacao/estatisticas/escolas?escolas=1,2,3',
+    '/api/gamificacao/estatisticas/rede',
+    '/api/gamificacao/estatisticas/rede?estado=Minas Gerais&incluir=escolas',
+    '/api/gamificacao/estatisticas/rede?estado=Minas Gerais&cidade=Pouso Alegre',
+    '/api/gamificacao/estatisticas/rede?escola_id=1',
+    '/api/gamificacao/estatisticas/rede?escola_id=1&limit=2',
+])
+def test_estatisticas_escolas(app, cliente, aluno, url):
+    entrar(cliente, PEDAGOGA)
+    verificar(app, lambda: cliente.get(url))
+
+@pytest.mark.parametrize('url', [
+    '/api/pedagogo/turma',
+    '/api/pedagogo/turma?ordenar=ultima_atividade&limit=2',
+])
+def test_painel_turma(app, cliente, aluno, url):
+    entrar(cliente, PEDAGOGA)
+    verificar(app, lambda: cliente.get(url))
+
+def test_login(app, cliente):
+    verificar(app, lambda: cliente.post('/api/login', json={'email': ALUNO, 'senha': 'senha123'}))
+
+@pytest.mark.parametrize('sql, aceita', [
+    # Percurso de uma página pelo índice da ordenação
+    ('SELECT id, titulo FROM livros ORDER BY titulo LIMIT 10', True),
+    ('SELECT id FROM livros ORDER BY id LIMIT 10', True),
+    # O mesmo percurso com um filtro pode ler a tabela inteira antes de encher a página
+    ('SELECT id, titulo FROM livros WHERE autor LIKE \'%a%\' ORDER BY titulo LIMIT 10', False),
+    # LIMIT sem ordenação ou com ordenação temporária não basta
+    ('SELECT id FROM livros WHERE autor = \'x\' LIMIT 10', False),
+    ('SELECT id FROM livros ORDER BY autor LIMIT 10', False),
+    # Varreduras de índice inteiro também contam
+    ('SELECT count(*) FROM livros', False),
+    ('SELECT titulo FROM livros', False),
+    ('SELECT id FROM livros WHERE obra_regional = 1', True),
+])
+def test_verificador_de_planos(app, sql, aceita):
+    assert (problemas_do_plano(app, sql, ()) == []) is aceita
+
+def indices_por_tabela(app):
+    """Colunas de cada índice do banco, agrupadas por tabela"""
+    with app.app_context(), db.engine.connect() as conexao:
+        tabelas = [nome for nome, in conexao.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        return {
+            tabela: {
+                indice[1]: tuple(coluna[2] for coluna in conexao.exec_driver_sql(f'PRAGMA index_info("{indice[1]}")'))
+                for indice in conexao.exec_driver_sql(f'PRAGMA index_list("{tabela}")')
+            }
+            for tabela in tabelas
+        }
+
+def test_nenhum_indice_e_prefixo_de_outro(app):
+    for tabela, indices in indices_por_tabela(app).items():
+        for nome, colunas in indices.items():
+            for outro, colunas_outro in indices.items():
+                assert outro == nome or colunas_outro[:len(colunas)] != colunas, (tabela, nome, outro)
+
+def test_indices_redundantes_de_bancos_antigos_sao_removidos(app):
+    with app.app_context():
+        with db.engine.begin() as conexao:
+            conexao.exec_driver_sql('CREATE INDEX ix_leituras_usuario_id ON leituras (usuario_id)')
+        db.create_all()
+
+    assert 'ix_leituras_usuario_id' not in indices_por_tabela(app)['leituras']
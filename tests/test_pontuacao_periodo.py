@@ -0,0 +1,104 @@
+"""Pontos por dia, semana e mês e o ranking de um período"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from src.models.minasle_models import db, Leitura, PontuacaoPeriodo
+from src.services.atividade_leitura import hoje
+from src.services.pontuacao_periodo import (
+    compactar_pontuacoes, fim_periodo, inicio_periodo, registrar_pontos, reparar_pontuacoes_periodo
+)
+
+from tests.conftest import entrar
+
+def ler_ranking(cliente, consulta):
+    resposta = cliente.get('/api/gamificacao/ranking' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def pontos(cliente, consulta):
+    return [(item['usuario_id'], item['pontuacao']) for item in ler_ranking(cliente, consulta)['ranking']]
+
+def concluir(cliente, email, livro_id):
+    usuario = entrar(cliente, email)
+    leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+    cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    return usuario['id'], leitura['id']
+
+def baldes(app, usuario_id):
+    with app.app_context():
+        return {
+            (balde.granularidade, balde.inicio.isoformat()): balde.pontos
+            for balde in PontuacaoPeriodo.query.filter_by(usuario_id=usuario_id)
+        }
+
+def test_inicio_e_fim_dos_periodos():
+    quarta = date(2024, 2, 28)
+    assert inicio_periodo('dia', quarta) == quarta
+    assert inicio_periodo('semana', quarta) == date(2024, 2, 26)
+    assert fim_periodo('semana', date(2024, 2, 26)) == date(2024, 3, 3)
+    assert inicio_periodo('mes', quarta) == date(2024, 2, 1)
+    assert fim_periodo('mes', date(2024, 2, 1)) == date(2024, 2, 29)
+    assert fim_periodo('mes', date(2024, 12, 1)) == date(2024, 12, 31)
+
+def test_conclusao_soma_nos_tres_periodos_em_curso(app, cliente):
+    aluno, _ = concluir(cliente, 'aluno1@minasle.com', 1)
+    outro, _ = concluir(cliente, 'aluno2@minasle.com', 2)
+    concluir(cliente, 'aluno2@minasle.com', 3)
+
+    for periodo in ('dia', 'semana', 'mes'):
+        assert pontos(cliente, f'?periodo={periodo}') == [(outro, 200), (aluno, 100)]
+
+    corpo = ler_ranking(cliente, '?periodo=semana')
+    inicio = inicio_periodo('semana', hoje())
+    assert corpo['periodo'] == {'granularidade': 'semana', 'inicio': inicio.isoformat(),
+                                'fim': (inicio + timedelta(days=6)).isoformat()}
+    assert pontos(cliente, '?periodo=mes&escopo=escola&id=1&limit=1') == [(outro, 200)]
+    assert pontos(cliente, '?periodo=mes&escopo=cidade&id=Varginha') == []
+
+def test_pontos_contam_no_mes_da_conclusao(app, cliente):
+    aluno, leitura_id = concluir(cliente, 'aluno1@minasle.com', 1)
+    with app.app_context():
+        db.session.get(Leitura, leitura_id).data_conclusao = datetime(2024, 3, 15, 15, 0)
+        db.session.commit()
+
+    assert pontos(cliente, '?periodo=2024-03') == [(aluno, 100)]
+    assert pontos(cliente, '?periodo=mes') == []
+    # Os pontos saem dos baldes de agora; de março fica só o mês, pois
+    # baldes de dia e semana fora da retenção não são criados
+    assert {balde: valor for balde, valor in baldes(app, aluno).items() if valor} == {('mes', '2024-03-01'): 100}
+
+def test_leitura_desfeita_desconta_os_pontos(app, cliente):
+    aluno, leitura_id = concluir(cliente, 'aluno1@minasle.com', 1)
+    with app.app_context():
+        db.session.delete(db.session.get(Leitura, leitura_id))
+        db.session.commit()
+    assert set(baldes(app, aluno).values()) == {0}
+    assert pontos(cliente, '?periodo=dia') == []
+
+def test_compactacao_descarta_dias_e_semanas_antigos(app, cliente):
+    aluno, _ = concluir(cliente, 'aluno1@minasle.com', 1)
+    referencia = hoje()
+    with app.app_context():
+        compactar_pontuacoes(db.session.connection(), referencia + timedelta(days=400))
+        db.session.commit()
+    assert {granularidade for granularidade, _ in baldes(app, aluno)} == {'mes'}
+    assert pontos(cliente, '?periodo=mes') == [(aluno, 100)]
+
+def test_reparo_recompoe_os_baldes_a_partir_das_leituras(app, cliente):
+    aluno, _ = concluir(cliente, 'aluno1@minasle.com', 1)
+    concluir(cliente, 'aluno1@minasle.com', 2)
+    with app.app_context():
+        registrar_pontos(db.session.connection(), [(aluno, datetime.utcnow(), 999)])
+        db.session.commit()
+        reparar_pontuacoes_periodo()
+        por_mes = db.session.query(func.sum(PontuacaoPeriodo.pontos)).filter_by(granularidade='mes').scalar()
+        assert por_mes == db.session.query(func.sum(Leitura.pontuacao)).scalar() == 200
+    assert pontos(cliente, '?periodo=dia') == [(aluno, 200)]
+
+@pytest.mark.parametrize('periodo', ['ano', '2024-13', '2024-3'])
+def test_periodo_invalido(app, cliente, periodo):
+    resposta = cliente.get(f'/api/gamificacao/ranking?periodo={periodo}')
+    assert resposta.status_code == 400
+    assert 'periodo inválido' in resposta.get_json()['erro']
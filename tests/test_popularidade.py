@@ -0,0 +1,86 @@
+"""Contadores de popularidade dos livros e as ordenações populares e recentes"""
+from datetime import datetime
+
+import pytest
+
+from src.models.minasle_models import db, EstatisticaLivro, Livro
+from src.services.estatisticas_livros import reparar_estatisticas_livros
+
+from tests.conftest import entrar
+
+def ler(app, livro_id):
+    with app.app_context():
+        return db.session.get(EstatisticaLivro, livro_id).to_dict()
+
+def ler_livros(cliente, url):
+    resposta = cliente.get(url)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()['livros']
+
+@pytest.fixture
+def leituras(app, cliente):
+    """Três leitores de Dom Casmurro (id 3), um dele concluído, e um de O Cortiço (id 2)"""
+    for aluno in (1, 2, 3):
+        entrar(cliente, f'aluno{aluno}@minasle.com')
+        leitura = cliente.post('/api/leituras', json={'livro_id': 3}).get_json()['leitura']
+        if aluno == 1:
+            cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    cliente.post('/api/leituras', json={'livro_id': 2})
+
+def test_contadores_acompanham_as_leituras(app, cliente, leituras):
+    assert ler(app, 3) == {'leitores': 3, 'conclusoes': 1, 'progresso_medio': 33.33}
+    assert ler(app, 2) == {'leitores': 1, 'conclusoes': 0, 'progresso_medio': 0}
+    assert ler(app, 1) == {'leitores': 0, 'conclusoes': 0, 'progresso_medio': 0}
+
+def test_populares_ordena_por_leitores_e_conclusoes(app, cliente, leituras):
+    livros = ler_livros(cliente, '/api/livros?ordenar=populares&limit=3')
+
+    assert [livro['id'] for livro in livros] == [3, 2, 20]
+    assert livros[0]['estatisticas']['leitores'] == 3
+
+def test_populares_na_busca_aproximada_com_livro_sem_contadores(app, cliente):
+    with app.app_context():
+        db.session.delete(db.session.get(EstatisticaLivro, 3))
+        db.session.commit()
+
+    livros = ler_livros(cliente, '/api/livros?ordenar=populares&busca=dom casmurro')
+
+    assert 3 in [livro['id'] for livro in livros]
+    assert next(livro for livro in livros if livro['id'] == 3)['estatisticas'] == {
+        'leitores': 0, 'conclusoes': 0, 'progresso_medio': 0
+    }
+
+def test_populares_sai_do_cache_ate_a_proxima_leitura(app, cliente, leituras):
+    primeira = cliente.get('/api/livros?ordenar=populares&limit=2')
+    etag = primeira.headers['ETag']
+    assert cliente.get('/api/livros?ordenar=populares&limit=2',
+                       headers={'If-None-Match': etag}).status_code == 304
+
+    # Mudanças só de progresso também alteram o progresso médio da resposta
+    cliente.put('/api/leituras/4', json={'progresso': 40})
+    segunda = cliente.get('/api/livros?ordenar=populares&limit=2', headers={'If-None-Match': etag})
+    assert segunda.status_code == 200
+    assert segunda.get_json()['livros'][1]['estatisticas']['progresso_medio'] == 40
+
+    # As demais listagens continuam guardadas
+    etag_ids = cliente.get('/api/livros?limit=2').headers['ETag']
+    cliente.post('/api/leituras', json={'livro_id': 4})
+    assert cliente.get('/api/livros?limit=2', headers={'If-None-Match': etag_ids}).status_code == 304
+    assert [livro['id'] for livro in ler_livros(cliente, '/api/livros?ordenar=populares&limit=3')] == [3, 4, 2]
+
+def test_recentes_traz_os_livros_mais_novos_primeiro(app, cliente):
+    with app.app_context():
+        db.session.get(Livro, 5).data_adicao = datetime(2030, 1, 1)
+        db.session.commit()
+
+    livros = ler_livros(cliente, '/api/livros?ordenar=recentes&limit=2')
+    assert livros[0]['id'] == 5
+
+def test_reparo_recalcula_os_contadores(app, cliente, leituras):
+    with app.app_context():
+        db.session.get(EstatisticaLivro, 3).leitores = 99
+        db.session.commit()
+        assert reparar_estatisticas_livros() == 20
+
+    assert ler(app, 3)['leitores'] == 3
+    assert ler_livros(cliente, '/api/livros?ordenar=populares&limit=1')[0]['estatisticas']['leitores'] == 3
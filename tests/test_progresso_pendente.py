@@ -0,0 +1,91 @@
+"""Progresso de leitura em modo write-behind"""
+import pytest
+
+from src.models.minasle_models import db, EstatisticaLivro, EventoLeitura, Leitura, SincronizacaoLeitura
+from src.services.progresso_pendente import buffer_progresso
+
+from tests.conftest import entrar
+
+@pytest.fixture
+def aluno(app, cliente):
+    app.config['PROGRESSO_WRITE_BEHIND'] = True
+    # O prazo não vence durante o teste: a gravação é chamada explicitamente
+    app.config['PROGRESSO_INTERVALO_MS'] = 60000
+    usuario = entrar(cliente, 'aluno1@minasle.com')
+    for livro_id in (1, 2, 3):
+        cliente.post('/api/leituras', json={'livro_id': livro_id})
+    yield usuario
+    buffer_progresso.gravar()
+
+def gravado(app, leitura_id):
+    with app.app_context():
+        return db.session.get(Leitura, leitura_id).progresso
+
+def progressos(cliente, url):
+    return {leitura['id']: leitura['progresso'] for leitura in cliente.get(url).get_json()['leituras']}
+
+def test_progresso_fica_no_buffer_e_aparece_nas_listagens(app, cliente, aluno):
+    resposta = cliente.put('/api/leituras/1', json={'progresso': 30})
+    assert resposta.get_json()['leitura']['progresso'] == 30
+    assert gravado(app, 1) == 0
+
+    assert progressos(cliente, '/api/leituras') == {1: 30, 2: 0, 3: 0}
+    assert progressos(cliente, f"/api/leituras/{aluno['id']}") == {1: 30, 2: 0, 3: 0}
+    assert cliente.post('/api/leituras', json={'livro_id': 1}).get_json()['leitura']['progresso'] == 30
+
+def test_gravacao_em_lote_atualiza_leitura_contadores_e_momento(app, cliente, aluno):
+    cliente.put('/api/leituras/1', json={'progresso': 10})
+    cliente.put('/api/leituras/1', json={'progresso': 30})
+    cliente.put('/api/leituras/2', json={'progresso': 50})
+    with app.app_context():
+        eventos_antes = EventoLeitura.query.count()
+
+    buffer_progresso.gravar()
+
+    assert buffer_progresso.pendente(1) is None
+    assert (gravado(app, 1), gravado(app, 2)) == (30, 50)
+    with app.app_context():
+        assert db.session.get(EstatisticaLivro, 1).soma_progresso == 30
+        # Só o último valor de cada leitura vira evento
+        assert EventoLeitura.query.count() == eventos_antes + 2
+        assert {registro.leitura_id for registro in SincronizacaoLeitura.query} == {1, 2}
+    assert progressos(cliente, '/api/leituras') == {1: 30, 2: 50, 3: 0}
+
+def test_sincronizacao_descarta_operacoes_anteriores_a_gravacao(app, cliente, aluno):
+    cliente.put('/api/leituras/1', json={'progresso': 30})
+    buffer_progresso.gravar()
+
+    resultado, = cliente.post('/api/leituras/sync', json=[
+        {'leitura_id': 1, 'progresso': 10, 'client_timestamp': '2000-01-01T00:00:00Z'}
+    ]).get_json()['resultados']
+    assert resultado['status'] == 'obsoleto'
+    assert gravado(app, 1) == 30
+
+def test_conclusao_e_gravada_na_hora_e_nao_volta_atras(app, cliente, aluno):
+    cliente.put('/api/leituras/1', json={'progresso': 90})
+    corpo = cliente.put('/api/leituras/1', json={'progresso': 100}).get_json()
+    assert corpo['leitura']['data_conclusao'] is not None
+    assert buffer_progresso.pendente(1) is None
+
+    # Um valor que chegasse ao buffer depois da conclusão não a desfaz
+    buffer_progresso.registrar(app, 1, 40)
+    buffer_progresso.gravar()
+    assert gravado(app, 1) == 100
+
+def test_limite_de_pendentes_antecipa_a_gravacao(app, cliente, aluno):
+    app.config['PROGRESSO_MAXIMO_PENDENTES'] = 2
+    cliente.put('/api/leituras/1', json={'progresso': 20})
+    assert gravado(app, 1) == 0
+
+    cliente.put('/api/leituras/2', json={'progresso': 40})
+    assert (gravado(app, 1), gravado(app, 2)) == (20, 40)
+
+def test_gravacao_invalida_o_cache_de_populares(app, cliente, aluno):
+    etag = cliente.get('/api/livros?ordenar=populares&limit=3').headers['ETag']
+    cliente.put('/api/leituras/1', json={'progresso': 60})
+    buffer_progresso.gravar()
+
+    resposta = cliente.get('/api/livros?ordenar=populares&limit=3', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    medias = {livro['id']: livro['estatisticas']['progresso_medio'] for livro in resposta.get_json()['livros']}
+    assert medias[1] == 60
@@ -0,0 +1,84 @@
+"""Instantâneos estáticos do catálogo"""
+import gzip
+import json
+import os
+import threading
+
+from src.models.minasle_models import db, Livro
+from src.services.publicacao_catalogo import VERSOES_MANTIDAS, publicar_catalogo
+
+from tests.conftest import entrar
+
+def manifesto(app):
+    with open(os.path.join(app.static_folder, 'catalogo', 'manifest.json'), encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def ler(app, arquivo):
+    with open(os.path.join(app.static_folder, arquivo), 'rb') as conteudo:
+        return conteudo.read()
+
+def publicar(app, cliente):
+    entrar(cliente, 'pedagoga@minasle.com')
+    resposta = cliente.post('/api/livros/catalogo/publicar')
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()['manifesto']
+
+def test_publicacao_exige_pedagogo(app, cliente):
+    assert cliente.post('/api/livros/catalogo/publicar').status_code == 403
+    entrar(cliente, 'aluno1@minasle.com')
+    assert cliente.post('/api/livros/catalogo/publicar').status_code == 403
+
+def test_instantaneo_traz_o_catalogo_inteiro_e_o_gzip_equivalente(app, cliente):
+    atual = publicar(app, cliente)
+    assert manifesto(app) == atual
+
+    corpo = ler(app, atual['livros']['arquivo'])
+    assert gzip.decompress(ler(app, atual['livros']['arquivo'] + '.gz')) == corpo
+    livros = json.loads(corpo)['livros']
+    assert [livro['id'] for livro in livros] == list(range(1, 21))
+    assert atual['livros']['versao'] in atual['livros']['arquivo']
+
+    regionais = json.loads(ler(app, atual['regionais']['arquivo']))['livros']
+    assert atual['regionais']['total'] == len(regionais) == 10
+    assert all(livro['obra_regional'] for livro in regionais)
+
+def test_mesmo_conteudo_mantem_a_versao(app, cliente):
+    assert publicar(app, cliente)['versao'] == publicar(app, cliente)['versao']
+
+def test_alteracao_publica_nova_versao_e_descarta_antigas(app, cliente):
+    versoes = [publicar(app, cliente)['versao']]
+    for i in range(VERSOES_MANTIDAS + 1):
+        with app.app_context():
+            db.session.get(Livro, 1).titulo = f'Grande Sertão {i}'
+            db.session.commit()
+        # Sem atraso configurado, o commit já publica a nova versão
+        versoes.append(manifesto(app)['versao'])
+
+    assert len(set(versoes)) == len(versoes)
+    atual = manifesto(app)
+    assert json.loads(ler(app, atual['livros']['arquivo']))['livros'][0]['titulo'] == f'Grande Sertão {VERSOES_MANTIDAS}'
+
+    arquivos = [nome for nome in os.listdir(os.path.join(app.static_folder, 'catalogo'))
+                if nome.startswith('livros.') and nome.endswith('.json')]
+    assert len(arquivos) == VERSOES_MANTIDAS
+
+def test_publicacoes_simultaneas_nao_se_atropelam(app, cliente):
+    erros = []
+
+    def publicar_em_paralelo():
+        try:
+            with app.app_context():
+                publicar_catalogo(app.static_folder)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=publicar_em_paralelo) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert erros == []
+    atual = manifesto(app)
+    assert len(json.loads(ler(app, atual['livros']['arquivo']))['livros']) == 20
+    assert not [nome for nome in os.listdir(os.path.join(app.static_folder, 'catalogo')) if nome.endswith('.tmp')]
@@ -0,0 +1,174 @@
+"""Ranking de pontuação em memória e a posição de cada aluno"""
+import pytest
+
+from src.models.minasle_models import db, ClubeLeitura, Escola, Leitura, MembroClube, Usuario
+from src.services import ranking
+from src.services.ranking import ranking_pontuacao
+
+from tests.conftest import entrar
+
+def ler_ranking(cliente, consulta=''):
+    resposta = cliente.get('/api/gamificacao/ranking' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return [(item['posicao'], item['usuario_id'], item['pontuacao']) for item in resposta.get_json()['ranking']]
+
+def ler_posicao(cliente, consulta=''):
+    resposta = cliente.get('/api/gamificacao/ranking/posicao' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def ler(cliente, email, livros, concluidos=()):
+    """Entra como o aluno, inicia as leituras dos livros e conclui as de `concluidos`"""
+    usuario = entrar(cliente, email)
+    for livro_id in livros:
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        if livro_id in concluidos:
+            cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    return usuario['id']
+
+@pytest.fixture
+def alunos(cliente):
+    """aluno1 com 200 pontos, aluno2 com 100, aluno3 com uma leitura sem pontos; aluno4 sem leituras"""
+    return (
+        ler(cliente, 'aluno1@minasle.com', (1, 2), concluidos=(1, 2)),
+        ler(cliente, 'aluno2@minasle.com', (1,), concluidos=(1,)),
+        ler(cliente, 'aluno3@minasle.com', (3,)),
+    )
+
+def test_ranking_ordena_por_pontos(app, cliente, alunos):
+    primeiro, segundo, terceiro = alunos
+    assert ler_ranking(cliente) == [(1, primeiro, 200), (2, segundo, 100), (3, terceiro, 0)]
+    assert ler_ranking(cliente, '?limit=2') == [(1, primeiro, 200), (2, segundo, 100)]
+
+    corpo = cliente.get('/api/gamificacao/ranking').get_json()
+    assert corpo['escopo'] == 'geral'
+    assert corpo['ranking'][0]['nome'] == 'Aluno 1'
+
+def test_posicao_e_vizinhos(app, cliente, alunos):
+    primeiro, segundo, terceiro = alunos
+    entrar(cliente, 'aluno2@minasle.com')
+    corpo = ler_posicao(cliente, '?vizinhos=1')
+    assert (corpo['posicao'], corpo['pontuacao'], corpo['total_participantes']) == (2, 100, 3)
+    assert [item['usuario_id'] for item in corpo['vizinhos']] == [primeiro, segundo, terceiro]
+
+    assert [item['usuario_id'] for item in ler_posicao(cliente, '?vizinhos=0')['vizinhos']] == [segundo]
+
+def test_ranking_acompanha_os_commits_sem_remontar(app, cliente, alunos):
+    primeiro, segundo, terceiro = alunos
+    ler_ranking(cliente)
+    classificacoes = ranking_pontuacao._classificacoes
+
+    # aluno3 empata com aluno1: o desempate é pelo id
+    entrar(cliente, 'aluno3@minasle.com')
+    cliente.put('/api/leituras/4', json={'progresso': 100})
+    cliente.post('/api/leituras', json={'livro_id': 4})
+    cliente.put('/api/leituras/5', json={'progresso': 100})
+
+    assert ler_ranking(cliente) == [(1, primeiro, 200), (2, terceiro, 200), (3, segundo, 100)]
+    assert ranking_pontuacao._classificacoes is classificacoes
+
+    # Uma leitura removida tira os pontos dela
+    with app.app_context():
+        db.session.delete(db.session.get(Leitura, 1))
+        db.session.commit()
+    assert ler_ranking(cliente) == [(1, terceiro, 200), (2, primeiro, 100), (3, segundo, 100)]
+
+def test_commit_durante_a_montagem_nao_se_perde(app, cliente, alunos, monkeypatch):
+    aluno4 = entrar(cliente, 'aluno4@minasle.com')['id']
+    leitura = cliente.post('/api/leituras', json={'livro_id': 5}).get_json()['leitura']
+    ranking_pontuacao.descartar()
+    participantes = ranking._participantes
+
+    def participantes_com_commit_no_meio(*args):
+        resultado = participantes(*args)
+        # A leitura é concluída depois que a montagem leu as pontuações
+        cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+        return resultado
+
+    monkeypatch.setattr(ranking, '_participantes', participantes_com_commit_no_meio)
+    with app.app_context():
+        ranking_pontuacao.topo(10)
+    monkeypatch.undo()
+
+    assert [pontos for _, usuario_id, pontos in ler_ranking(cliente) if usuario_id == aluno4] == [100]
+
+def test_aluno_sem_leituras_e_acesso(app, cliente, alunos):
+    primeiro, _, _ = alunos
+    entrar(cliente, 'aluno4@minasle.com')
+    assert cliente.get('/api/gamificacao/ranking/posicao').status_code == 404
+    assert cliente.get(f'/api/gamificacao/ranking/posicao?usuario_id={primeiro}').status_code == 403
+
+    # Pedagogos não entram no ranking, mas consultam qualquer aluno
+    entrar(cliente, 'pedagoga@minasle.com')
+    assert ler_posicao(cliente, f'?usuario_id={primeiro}')['posicao'] == 1
+    assert cliente.get('/api/gamificacao/ranking/posicao').status_code == 404
+
+@pytest.fixture
+def rede(app, alunos):
+    """aluno2 numa segunda escola, em Varginha; aluno1 e aluno3 num clube de leitura"""
+    primeiro, segundo, terceiro = alunos
+    with app.app_context():
+        escola = Escola(nome='Escola Municipal Varginha', cidade='Varginha')
+        db.session.add(escola)
+        db.session.flush()
+        db.session.get(Usuario, segundo).escola_id = escola.id
+        clube = ClubeLeitura(nome='Clube do Sertão', pedagogo_id=1)
+        db.session.add(clube)
+        db.session.flush()
+        db.session.add_all([MembroClube(clube_id=clube.id, usuario_id=primeiro),
+                            MembroClube(clube_id=clube.id, usuario_id=terceiro)])
+        db.session.commit()
+        return escola.id, clube.id
+
+def test_ranking_por_escola_cidade_e_clube(app, cliente, alunos, rede):
+    primeiro, segundo, terceiro = alunos
+    escola_id, clube_id = rede
+
+    assert ler_ranking(cliente, '?escopo=escola&id=1') == [(1, primeiro, 200), (2, terceiro, 0)]
+    assert ler_ranking(cliente, f'?escopo=escola&id={escola_id}') == [(1, segundo, 100)]
+    assert ler_ranking(cliente, '?escopo=cidade&id=Varginha') == [(1, segundo, 100)]
+    assert ler_ranking(cliente, f'?escopo=clube&id={clube_id}') == [(1, primeiro, 200), (2, terceiro, 0)]
+    assert ler_ranking(cliente, '?escopo=cidade&id=Lavras') == []
+
+    entrar(cliente, 'aluno3@minasle.com')
+    corpo = ler_posicao(cliente, f'?escopo=clube&id={clube_id}')
+    assert (corpo['escopo'], corpo['id'], corpo['posicao'], corpo['total_participantes']) == ('clube', clube_id, 2, 2)
+
+def test_escopos_acompanham_pontos_e_membros(app, cliente, alunos, rede):
+    primeiro, segundo, terceiro = alunos
+    escola_id, clube_id = rede
+    ler_ranking(cliente, f'?escopo=clube&id={clube_id}')
+
+    # Pontos novos mudam a ordem em todos os escopos do aluno
+    entrar(cliente, 'aluno3@minasle.com')
+    for livro_id in (4, 5, 6):
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    assert ler_ranking(cliente, f'?escopo=clube&id={clube_id}') == [(1, terceiro, 300), (2, primeiro, 200)]
+    assert ler_ranking(cliente, '?escopo=escola&id=1') == [(1, terceiro, 300), (2, primeiro, 200)]
+
+    # Entrar no clube ou mudar de escola reposiciona o aluno
+    with app.app_context():
+        db.session.add(MembroClube(clube_id=clube_id, usuario_id=segundo))
+        db.session.get(Usuario, primeiro).escola_id = escola_id
+        db.session.commit()
+    assert [item[1] for item in ler_ranking(cliente, f'?escopo=clube&id={clube_id}')] == [terceiro, primeiro, segundo]
+    assert [item[1] for item in ler_ranking(cliente, f'?escopo=escola&id={escola_id}')] == [primeiro, segundo]
+    assert [item[1] for item in ler_ranking(cliente, '?escopo=cidade&id=Varginha')] == [primeiro, segundo]
+
+    # Mudar a cidade da escola remonta as classificações
+    with app.app_context():
+        db.session.get(Escola, escola_id).cidade = 'Lavras'
+        db.session.commit()
+    assert ler_ranking(cliente, '?escopo=cidade&id=Varginha') == []
+    assert [item[1] for item in ler_ranking(cliente, '?escopo=cidade&id=Lavras')] == [primeiro, segundo]
+
+@pytest.mark.parametrize('consulta, erro', [
+    ('?escopo=estado&id=MG', 'escopo inválido'),
+    ('?escopo=escola', 'obrigatório'),
+    ('?escopo=clube&id=abc', 'número inteiro'),
+])
+def test_escopo_invalido(app, cliente, consulta, erro):
+    resposta = cliente.get('/api/gamificacao/ranking' + consulta)
+    assert resposta.status_code == 400
+    assert erro in resposta.get_json()['erro']
@@ -0,0 +1,120 @@
+"""Totais da rede por estado, cidade e escola, mantidos a cada leitura e mudança de escola"""
+import pytest
+
+from src.models.minasle_models import db, Escola, ResumoRede, Usuario
+from src.services.resumos_rede import reparar_resumos_rede
+
+from tests.conftest import entrar
+
+def ler(cliente, consulta=''):
+    resposta = cliente.get('/api/gamificacao/estatisticas/rede' + consulta)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def nos(app):
+    with app.app_context():
+        return {
+            (no.nivel, no.estado, no.cidade, no.escola_id): (no.total_escolas, no.total_alunos, no.alunos_ativos,
+                                                              no.leituras_completas, no.pontuacao_total)
+            for no in ResumoRede.query
+        }
+
+def alterar(app, modelo, id, **campos):
+    with app.app_context():
+        objeto = db.session.get(modelo, id)
+        for campo, valor in campos.items():
+            setattr(objeto, campo, valor)
+        db.session.commit()
+
+@pytest.fixture
+def rede(app, cliente):
+    """Escola 1 em Pouso Alegre e uma segunda em Varginha; aluno1 concluiu dois livros"""
+    entrar(cliente, 'aluno1@minasle.com')
+    for livro_id in (1, 2):
+        leitura = cliente.post('/api/leituras', json={'livro_id': livro_id}).get_json()['leitura']
+        cliente.put(f"/api/leituras/{leitura['id']}", json={'progresso': 100})
+    with app.app_context():
+        escola = Escola(nome='Escola Municipal Varginha', cidade='Varginha')
+        db.session.add(escola)
+        db.session.commit()
+        escola_id = escola.id
+    entrar(cliente, 'pedagoga@minasle.com')
+    return escola_id
+
+MG = 'Minas Gerais'
+
+def test_totais_por_nivel(app, cliente, rede):
+    assert nos(app) == {
+        ('estado', MG, '', 0): (2, 5, 1, 2, 200),
+        ('cidade', MG, 'Pouso Alegre', 0): (1, 5, 1, 2, 200),
+        ('cidade', MG, 'Varginha', 0): (1, 0, 0, 0, 0),
+        ('escola', MG, 'Pouso Alegre', 1): (1, 5, 1, 2, 200),
+        ('escola', MG, 'Varginha', rede): (1, 0, 0, 0, 0),
+    }
+    estado, = ler(cliente)['estados']
+    assert (estado['estado'], estado['total_escolas'], estado['taxa_engajamento']) == (MG, 2, 20.0)
+    assert [cidade['cidade'] for cidade in ler(cliente, f'?estado={MG}')['cidades']] == ['Pouso Alegre', 'Varginha']
+
+def test_aluno_que_muda_de_escola_leva_os_totais(app, cliente, rede):
+    alterar(app, Usuario, 2, escola_id=rede)
+    totais = nos(app)
+    assert totais[('escola', MG, 'Pouso Alegre', 1)] == (1, 4, 0, 0, 0)
+    assert totais[('cidade', MG, 'Pouso Alegre', 0)] == (1, 4, 0, 0, 0)
+    assert totais[('escola', MG, 'Varginha', rede)] == (1, 1, 1, 2, 200)
+    assert totais[('cidade', MG, 'Varginha', 0)] == (1, 1, 1, 2, 200)
+    assert totais[('estado', MG, '', 0)] == (2, 5, 1, 2, 200)
+
+    # Leituras novas somam na escola nova
+    entrar(cliente, 'aluno1@minasle.com')
+    cliente.post('/api/leituras', json={'livro_id': 3})
+    cliente.put('/api/leituras/3', json={'progresso': 100})
+    assert nos(app)[('escola', MG, 'Varginha', rede)] == (1, 1, 1, 3, 300)
+    assert nos(app)[('escola', MG, 'Pouso Alegre', 1)] == (1, 4, 0, 0, 0)
+
+    # Quem deixa de ser aluno sai dos totais
+    alterar(app, Usuario, 2, tipo_usuario='pedagogo')
+    assert nos(app)[('estado', MG, '', 0)] == (2, 4, 0, 0, 0)
+
+def test_estatisticas_da_escola_vem_do_no_da_escola(app, cliente, rede):
+    alterar(app, Usuario, 2, escola_id=rede)
+    with app.app_context():
+        # Um nó alterado à mão mostra que a resposta não recalcula a partir dos alunos
+        db.session.query(ResumoRede).filter_by(nivel='escola', escola_id=rede).update({'leituras_completas': 7})
+        db.session.commit()
+    estatisticas = cliente.get(f'/api/gamificacao/estatisticas/escola/{rede}').get_json()['estatisticas']
+    assert (estatisticas['total_alunos'], estatisticas['livros_completos']) == (1, 7)
+    varginha, = cliente.get(f'/api/gamificacao/estatisticas/escolas?escolas={rede}').get_json()['escolas']
+    assert varginha['livros_completos'] == 7
+
+def test_cidade_e_estado_sem_escolas_sao_apagados(app, cliente, rede):
+    alterar(app, Escola, rede, cidade='Lavras')
+    assert ('cidade', MG, 'Varginha', 0) not in nos(app)
+    assert nos(app)[('cidade', MG, 'Lavras', 0)] == (1, 0, 0, 0, 0)
+    assert cliente.get(f'/api/gamificacao/estatisticas/rede?estado={MG}&cidade=Varginha').status_code == 404
+
+    alterar(app, Escola, rede, estado='São Paulo', cidade='Campinas')
+    assert ('cidade', MG, 'Lavras', 0) not in nos(app)
+    assert nos(app)[('estado', 'São Paulo', '', 0)] == (1, 0, 0, 0, 0)
+    assert nos(app)[('estado', MG, '', 0)] == (1, 5, 1, 2, 200)
+    assert [estado['estado'] for estado in ler(cliente)['estados']] == [MG, 'São Paulo']
+
+    with app.app_context():
+        db.session.delete(db.session.get(Escola, rede))
+        db.session.commit()
+    assert [estado['estado'] for estado in ler(cliente)['estados']] == [MG]
+    assert set(nos(app)) == {('estado', MG, '', 0), ('cidade', MG, 'Pouso Alegre', 0), ('escola', MG, 'Pouso Alegre', 1)}
+
+def test_reparo_chega_aos_mesmos_totais(app, cliente, rede):
+    alterar(app, Usuario, 3, escola_id=rede)
+    alterar(app, Escola, rede, cidade='Lavras')
+    incrementais = nos(app)
+    with app.app_context():
+        assert reparar_resumos_rede() == 2
+    assert nos(app) == incrementais
+
+def test_escola_da_rede_pagina_os_alunos(app, cliente, rede):
+    corpo = ler(cliente, '?escola_id=1&limit=2')
+    assert corpo['resumo']['nome'] == 'Escola Estadual Tiradentes'
+    assert [aluno['id'] for aluno in corpo['alunos']] == [2, 3]
+    assert corpo['alunos'][0]['leituras_completas'] == 2
+    assert cliente.get('/api/gamificacao/estatisticas/rede?escola_id=99').status_code == 404
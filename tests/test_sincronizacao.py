@@ -0,0 +1,99 @@
+"""Sincronização em lote do progresso de clientes offline (última escrita vence)"""
+import pytest
+
+from src.models.minasle_models import db, Leitura
+
+from tests.conftest import entrar
+
+@pytest.fixture
+def aluno(cliente):
+    usuario = entrar(cliente, 'aluno1@minasle.com')
+    cliente.post('/api/leituras', json={'livro_id': 1})
+    return usuario
+
+def sincronizar(cliente, *operacoes):
+    resposta = cliente.post('/api/leituras/sync', json=list(operacoes))
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+def status(corpo):
+    return [resultado['status'] for resultado in corpo['resultados']]
+
+def ler(app, leitura_id):
+    with app.app_context():
+        return db.session.get(Leitura, leitura_id)
+
+def test_operacao_mais_recente_vence_qualquer_que_seja_a_ordem(app, cliente, aluno):
+    corpo = sincronizar(
+        cliente,
+        {'leitura_id': 1, 'progresso': 60, 'client_timestamp': '2024-03-01T10:10:00Z'},
+        {'leitura_id': 1, 'progresso': 20, 'client_timestamp': '2024-03-01T10:00:00Z'},
+        {'leitura_id': 1, 'progresso': 40, 'client_timestamp': '2024-03-01T10:05:00Z'},
+    )
+
+    assert status(corpo) == ['aplicado', 'substituido', 'substituido']
+    assert ler(app, 1).progresso == 60
+
+def test_operacoes_anteriores_a_ultima_aplicada_sao_obsoletas(app, cliente, aluno):
+    sincronizar(cliente, {'leitura_id': 1, 'progresso': 50, 'client_timestamp': '2024-03-01T10:00:00Z'})
+
+    corpo = sincronizar(
+        cliente,
+        {'leitura_id': 1, 'progresso': 30, 'client_timestamp': '2024-03-01T09:00:00Z'},
+        # Milissegundos desde a época: 2024-03-01T11:00:00Z
+        {'leitura_id': 1, 'progresso': 70, 'client_timestamp': 1709290800000},
+    )
+    assert status(corpo) == ['obsoleto', 'aplicado']
+    assert ler(app, 1).progresso == 70
+
+    corpo = sincronizar(cliente, {'leitura_id': 1, 'progresso': 10, 'client_timestamp': '2024-03-01T11:00:00Z'})
+    assert status(corpo) == ['obsoleto']
+
+def test_livro_sem_leitura_cria_a_leitura(app, cliente, aluno):
+    corpo = sincronizar(cliente, {'livro_id': 2, 'progresso': 15, 'client_timestamp': '2024-03-01T10:00:00Z'})
+
+    assert status(corpo) == ['aplicado']
+    leitura_id = corpo['resultados'][0]['leitura_id']
+    assert ler(app, leitura_id).livro_id == 2
+    assert ler(app, leitura_id).progresso == 15
+
+def test_conclusao_so_quando_o_progresso_final_e_100(app, cliente, aluno):
+    corpo = sincronizar(
+        cliente,
+        {'leitura_id': 1, 'progresso': 100, 'client_timestamp': '2024-03-01T10:00:00Z'},
+        {'leitura_id': 1, 'progresso': 80, 'client_timestamp': '2024-03-01T10:05:00Z'},
+    )
+    assert status(corpo) == ['substituido', 'aplicado']
+    leitura = ler(app, 1)
+    assert leitura.progresso == 80
+    assert leitura.data_conclusao is None
+    assert leitura.pontuacao == 0
+
+    sincronizar(cliente, {'leitura_id': 1, 'progresso': 100, 'client_timestamp': '2024-03-01T10:10:00Z'})
+    leitura = ler(app, 1)
+    assert leitura.data_conclusao is not None
+    assert leitura.pontuacao == 100
+
+@pytest.mark.parametrize('operacao, erro', [
+    ({'leitura_id': True, 'progresso': 10, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'inteiros'),
+    ({'livro_id': False, 'progresso': 10, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'inteiros'),
+    ({'progresso': 10, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'leitura_id ou livro_id'),
+    ({'leitura_id': 1, 'progresso': 101, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'Progresso'),
+    ({'leitura_id': 1, 'progresso': True, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'Progresso'),
+    ({'leitura_id': 1, 'progresso': 10, 'client_timestamp': 'ontem'}, 'client_timestamp'),
+    ({'leitura_id': 99, 'progresso': 10, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'Leitura não encontrada'),
+    ({'livro_id': 999, 'progresso': 10, 'client_timestamp': '2024-03-01T10:00:00Z'}, 'Livro não encontrado'),
+])
+def test_operacoes_invalidas_sao_rejeitadas_uma_a_uma(app, cliente, aluno, operacao, erro):
+    corpo = sincronizar(cliente, operacao, {'leitura_id': 1, 'progresso': 5, 'client_timestamp': '2024-03-01T10:00:00Z'})
+
+    assert status(corpo) == ['erro', 'aplicado']
+    assert erro in corpo['resultados'][0]['erro']
+    assert ler(app, 1).progresso == 5
+
+def test_leitura_de_outro_aluno_nao_e_alterada(app, cliente, aluno):
+    entrar(cliente, 'aluno2@minasle.com')
+    corpo = sincronizar(cliente, {'leitura_id': 1, 'progresso': 90, 'client_timestamp': '2024-03-01T10:00:00Z'})
+
+    assert status(corpo) == ['erro']
+    assert ler(app, 1).progresso == 0
@@ -0,0 +1,69 @@
+"""Sugestões por prefixo (/livros/sugestoes) e a manutenção do índice em memória"""
+import pytest
+
+from src.models.minasle_models import db, Livro
+from src.services import sugestoes
+from tests.conftest import entrar
+
+def sugerir(cliente, prefixo):
+    resposta = cliente.get(f'/api/livros/sugestoes?prefixo={prefixo}&limite=50')
+    assert resposta.status_code == 200
+    return resposta.get_json()['sugestoes']
+
+def test_sugere_pelo_inicio_de_qualquer_palavra_do_titulo_ou_autor(app, cliente):
+    assert {s['titulo'] for s in sugerir(cliente, 'sert')} == {'Grande Sertão: Veredas'}
+    assert {s['titulo'] for s in sugerir(cliente, 'veredas')} == {'Grande Sertão: Veredas'}
+    assert {s['titulo'] for s in sugerir(cliente, 'guimaraes')} == {'Grande Sertão: Veredas'}
+    assert sugerir(cliente, 'xyz') == []
+
+def test_mais_lidos_primeiro_atualizado_a_cada_leitura(app, cliente):
+    # Dom Casmurro tem os ids 3, 7, 11, 15 e 19; sem leitores, o desempate é o id
+    assert [s['id'] for s in sugerir(cliente, 'dom')] == [3, 7, 11, 15, 19]
+
+    entrar(cliente, 'aluno1@minasle.com')
+    cliente.post('/api/leituras', json={'livro_id': 15})
+    entrar(cliente, 'aluno2@minasle.com')
+    cliente.post('/api/leituras', json={'livro_id': 15})
+    cliente.post('/api/leituras', json={'livro_id': 19})
+
+    encontrados = sugerir(cliente, 'dom')
+    assert [s['id'] for s in encontrados] == [15, 19, 3, 7, 11]
+    assert [s['popularidade'] for s in encontrados[:2]] == [2, 1]
+
+def test_livros_inseridos_editados_e_removidos_depois_da_carga(app, cliente):
+    sugerir(cliente, 'dom')
+
+    with app.app_context():
+        livro = Livro(titulo='Memórias Póstumas de Brás Cubas', autor='Machado de Assis', genero='Romance')
+        db.session.add(livro)
+        db.session.commit()
+        livro_id = livro.id
+    assert [s['id'] for s in sugerir(cliente, 'bras')] == [livro_id]
+
+    with app.app_context():
+        db.session.get(Livro, livro_id).titulo = 'Quincas Borba'
+        db.session.commit()
+    assert sugerir(cliente, 'bras') == []
+    assert [s['id'] for s in sugerir(cliente, 'quincas')] == [livro_id]
+    # As chaves do autor, que não mudou, continuam lá uma única vez
+    assert [s['id'] for s in sugerir(cliente, 'machado')].count(livro_id) == 1
+
+    with app.app_context():
+        db.session.delete(db.session.get(Livro, livro_id))
+        db.session.commit()
+    assert sugerir(cliente, 'quincas') == []
+
+@pytest.mark.parametrize('maximo_pontual', [0, 10000])
+def test_atualizacao_pontual_e_em_lote_chegam_ao_mesmo_indice(app, cliente, monkeypatch, maximo_pontual):
+    monkeypatch.setattr(sugestoes, 'MAXIMO_ALTERACOES_PONTUAIS', maximo_pontual)
+    sugerir(cliente, 'dom')
+
+    with app.app_context():
+        db.session.add_all(Livro(titulo=f'Dom Quixote {i}', autor='Cervantes', genero='Romance') for i in range(30))
+        db.session.delete(db.session.get(Livro, 3))
+        db.session.commit()
+
+    prefixos = ['dom', 'quixote', 'cervantes', 'casmurro', 'o', 'sentimento']
+    incremental = {prefixo: sugerir(cliente, prefixo) for prefixo in prefixos}
+    sugestoes.indice_sugestoes.descartar()
+    assert {prefixo: sugerir(cliente, prefixo) for prefixo in prefixos} == incremental